@@ -0,0 +1,79 @@
+"""
+Cache do contexto do dashboard
+
+O contexto calculado para (usuário, ano, mês) fica no cache do Django sob
+uma chave que inclui a versão dos dados do usuário (transacoes.versao).
+Gravações em transações, categorias e recorrências, e as importações OFX,
+geram uma versão nova, de modo que uma entrada em cache nunca é servida
+depois de uma alteração; sem alterações, a visita seguinte ao dashboard
+não consulta o banco.
+
+Com um backend na memória do processo (LocMemCache) as versões
+incrementadas pelo run_jobs ou pelo cron não chegam ao servidor web, e o
+cache fica desligado.
+"""
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+
+from transacoes.contadores import Contadores
+from transacoes.versao import versao_dados
+
+# Segundos que um contexto fica em cache (a versão já cuida da invalidação)
+DASHBOARD_CACHE_SEGUNDOS = 3600
+
+# Contadores do processo atual
+_estatisticas = Contadores('acertos', 'falhas')
+
+
+def chave_dashboard(usuario_id, ano, mes, usar_ultimo_mes=False):
+    versao = versao_dados(usuario_id)
+    sufixo = ':ultimo' if usar_ultimo_mes else ''
+    return f'dashboard:{usuario_id}:{versao}:{ano}-{mes}{sufixo}'
+
+
+def cache_compartilhado():
+    """Indica se o cache padrão é visto por todos os processos"""
+    return not isinstance(caches['default'], LocMemCache)
+
+
+def contexto_em_cache(usuario_id, ano, mes, calcular, usar_ultimo_mes=False):
+    """
+    Contexto do dashboard em cache, calculado com calcular() na falta
+
+    Args:
+        calcular: Função sem argumentos que devolve o contexto (apenas
+            valores serializáveis; querysets devem estar avaliados)
+    """
+    if not cache_compartilhado():
+        return calcular()
+
+    chave = chave_dashboard(usuario_id, ano, mes, usar_ultimo_mes)
+    contexto = cache.get(chave)
+    if contexto is not None:
+        _estatisticas.somar(acertos=1)
+        return contexto
+
+    _estatisticas.somar(falhas=1)
+    contexto = calcular()
+    cache.set(chave, contexto, getattr(
+        settings, 'DASHBOARD_CACHE_SEGUNDOS', DASHBOARD_CACHE_SEGUNDOS))
+    return contexto
+
+
+def estatisticas_cache_dashboard():
+    """
+    Acertos e falhas do cache desde o início do processo
+
+    Returns:
+        dict: Contadores e 'taxa_acerto' (0 a 1)
+    """
+    dados = _estatisticas.valores()
+    consultas = dados['acertos'] + dados['falhas']
+    dados['taxa_acerto'] = dados['acertos'] / consultas if consultas else 0.0
+    return dados
+
+
+def zerar_estatisticas_dashboard():
+    """Zera os contadores (usado nos testes)"""
+    _estatisticas.zerar()
@@ -1,3 +1,219 @@
-from django.test import TestCase
+from datetime import date
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from dateutil.relativedelta import relativedelta
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from transacoes.models import Categoria, Transacao, TransacaoRecorrente
+from transacoes.utils import salvar_transacoes_ofx
+from .cache import estatisticas_cache_dashboard, zerar_estatisticas_dashboard
+from .views import calcular_historico_meses
+
+
+class HistoricoMesesTest(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('teste', password='senha')
+        self.receita = Categoria.objects.create(
+            nome='Salário', tipo='RECEITA', usuario=self.usuario)
+        self.despesa = Categoria.objects.create(
+            nome='Alimentação', tipo='DESPESA', usuario=self.usuario)
+
+    def criar_transacoes(self, meses):
+        inicio = timezone.localdate().replace(day=1)
+        for i in range(meses):
+            data = inicio - relativedelta(months=i)
+            for j in range(5):
+                Transacao.objects.create(
+                    descricao=f'Salário {i}-{j}', valor=Decimal('100.00'),
+                    tipo='RECEITA', data=data, categoria=self.receita,
+                    usuario=self.usuario)
+                Transacao.objects.create(
+                    descricao=f'Mercado {i}-{j}', valor=Decimal('40.00'),
+                    tipo='DESPESA', data=data, categoria=self.despesa,
+                    usuario=self.usuario)
+
+    def test_historico_tem_doze_meses_consecutivos(self):
+        self.criar_transacoes(3)
+
+        historico = calcular_historico_meses(self.usuario)
+
+        inicio = timezone.localdate().replace(day=1)
+        esperados = [
+            (inicio - relativedelta(months=i)).strftime('%m/%Y')
+            for i in reversed(range(12))
+        ]
+        self.assertEqual([item['mes'] for item in historico], esperados)
+        self.assertEqual(historico[-1]['receitas'], 500.0)
+        self.assertEqual(historico[-1]['despesas'], 200.0)
+        self.assertEqual(historico[-1]['saldo'], 300.0)
+        self.assertEqual(historico[0]['receitas'], 0.0)
+
+    def test_historico_usa_uma_consulta(self):
+        self.criar_transacoes(12)
+
+        with self.assertNumQueries(1):
+            calcular_historico_meses(self.usuario)
+
+    def test_dashboard_respeita_orcamento_de_consultas(self):
+        self.criar_transacoes(12)
+        self.client.login(username='teste', password='senha')
+
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(reverse('dashboard:home'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(len(consultas), 12)
+
+    def test_dashboard_filtra_mes_por_faixa_de_datas(self):
+        self.criar_transacoes(2)
+        self.client.login(username='teste', password='senha')
+
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(
+                reverse('dashboard:home'), {'mes': 13, 'ano': 2024})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['mes_atual'], timezone.localdate().month)
+        self.assertEqual(len(response.context['transacoes_recentes']), 10)
+        sql = ' '.join(c['sql'] for c in consultas)
+        self.assertNotIn('django_date_extract', sql)
+
+
+class DashboardCacheTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        zerar_estatisticas_dashboard()
+        self.usuario = User.objects.create_user('teste', password='senha')
+        self.despesa = Categoria.objects.create(
+            nome='Alimentação', tipo='DESPESA', usuario=self.usuario)
+        self.hoje = timezone.localdate()
+        self.criar(Decimal('40.00'))
+        self.client.login(username='teste', password='senha')
+
+    def criar(self, valor, descricao='Mercado'):
+        return Transacao.objects.create(
+            descricao=descricao, valor=valor, tipo='DESPESA', data=self.hoje,
+            categoria=self.despesa, usuario=self.usuario)
+
+    def despesas_no_dashboard(self):
+        response = self.client.get(reverse('dashboard:home'))
+        self.assertEqual(response.status_code, 200)
+        return response.context['despesas_total']
+
+    def test_segunda_visita_nao_consulta_os_dados(self):
+        self.assertEqual(self.despesas_no_dashboard(), Decimal('40.00'))
+
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(self.despesas_no_dashboard(), Decimal('40.00'))
+
+        # Restam apenas sessão e usuário
+        self.assertFalse([
+            c['sql'] for c in consultas if 'transacoes_' in c['sql']])
+        estatisticas = estatisticas_cache_dashboard()
+        self.assertEqual(estatisticas['acertos'], 1)
+        self.assertEqual(estatisticas['falhas'], 1)
+
+    def test_alteracoes_invalidam_o_contexto(self):
+        self.despesas_no_dashboard()
+
+        transacao = self.criar(Decimal('10.00'))
+        self.assertEqual(self.despesas_no_dashboard(), Decimal('50.00'))
+
+        transacao.delete()
+        self.assertEqual(self.despesas_no_dashboard(), Decimal('40.00'))
+
+        self.despesa.nome = 'Supermercado'
+        self.despesa.save()
+        response = self.client.get(reverse('dashboard:home'))
+        self.assertEqual(
+            response.context['despesas_categoria'][0]['categoria__nome'],
+            'Supermercado')
+
+        TransacaoRecorrente.objects.create(
+            descricao='Aluguel', valor=Decimal('900'), tipo='DESPESA',
+            categoria=self.despesa, usuario=self.usuario,
+            tipo_recorrencia='MENSAL', dia_vencimento=28,
+            data_inicio=self.hoje.replace(day=1))
+        response = self.client.get(reverse('dashboard:home'))
+        self.assertTrue(response.context['tem_previstas'])
+        self.assertEqual(estatisticas_cache_dashboard()['acertos'], 0)
+
+    def test_importacao_ofx_invalida_o_contexto(self):
+        self.despesas_no_dashboard()
+
+        salvar_transacoes_ofx([{
+            'descricao': 'Farmácia', 'valor': 25.0, 'tipo': 'DESPESA',
+            'data': self.hoje.isoformat(), 'categoria_id': self.despesa.id,
+            'identificador_ofx': 'conta_1',
+        }], self.usuario, None, 'extrato.ofx')
+
+        self.assertEqual(self.despesas_no_dashboard(), Decimal('65.00'))
+
+    def test_versao_alterada_por_outro_processo(self):
+        self.despesas_no_dashboard()
+
+        # Instância própria do backend, como a do run_jobs ou do cron
+        outro_processo = caches.create_connection('default')
+        self.assertIsNot(outro_processo, caches['default'])
+        with mock.patch('transacoes.versao.cache', outro_processo):
+            self.criar(Decimal('10.00'))
+
+        self.assertEqual(self.despesas_no_dashboard(), Decimal('50.00'))
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_cache_desligado_na_memoria_do_processo(self):
+        self.despesas_no_dashboard()
+
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(self.despesas_no_dashboard(), Decimal('40.00'))
+
+        self.assertTrue([
+            c['sql'] for c in consultas if 'transacoes_' in c['sql']])
+        self.assertEqual(estatisticas_cache_dashboard()['acertos'], 0)
+
+
+class ProjecaoFluxoCaixaTest(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('teste', password='senha')
+        despesa = Categoria.objects.create(
+            nome='Moradia', tipo='DESPESA', usuario=self.usuario)
+        TransacaoRecorrente.objects.create(
+            descricao='Aluguel', valor=Decimal('900'), tipo='DESPESA',
+            categoria=despesa, usuario=self.usuario,
+            tipo_recorrencia='ANUAL', dia_vencimento=31,
+            data_inicio=date(2020, 12, 1))
+        self.client.login(username='teste', password='senha')
+
+    def projecao(self, **parametros):
+        return self.client.get(reverse('dashboard:projecao'), parametros)
+
+    def test_ano_fora_do_intervalo(self):
+        for parametros in ({'ano': 0}, {'ano': 10000}, {'ano': -1},
+                           {'ano': 9999, 'mes': 12, 'meses': 2},
+                           {'ano': 9998, 'mes': 1, 'meses': 25}):
+            with self.subTest(**parametros):
+                self.assertEqual(
+                    self.projecao(**parametros).status_code, 400)
+
+    def test_horizonte_ate_o_ultimo_ano(self):
+        response = self.projecao(ano=9998, mes=12, meses=13)
+
+        self.assertEqual(response.status_code, 200)
+        meses = response.json()['meses']
+        self.assertEqual((meses[0]['mes'], meses[-1]['mes']),
+                         ('12/9998', '12/9999'))
+        self.assertEqual(meses[-1]['despesas'], 900.0)
+
+        response = self.projecao(ano=1, mes=1, meses=1)
+        self.assertEqual(response.status_code, 200)
@@ -5,6 +5,7 @@ app_name = 'dashboard'
 
 urlpatterns = [
     path('', views.home_view, name='home'),
+    path('projecao/', views.projecao_fluxo_caixa, name='projecao'),
     path('consolidar/<int:recorrente_id>/<int:mes>/<int:ano>/',
          views.consolidar_transacao_prevista, name='consolidar_prevista'),
 ]
@@ -1,108 +1,96 @@
 from django.shortcuts import render
+from django.http import JsonResponse
 from django.contrib.auth.decorators import login_required
-from django.db.models import Sum, Count
+from django.db.models import Sum, Count, Case, When
 from django.utils import timezone
-from datetime import datetime, timedelta
-from transacoes.models import Transacao, Categoria, TransacaoRecorrente
+from dateutil.relativedelta import relativedelta
+from transacoes.models import (
+    Transacao, Categoria, TransacaoRecorrente, ResumoMensal
+)
+from transacoes.periodo import Periodo
+from transacoes.previsao import projetar_recorrencias
+from transacoes.utils import inserir_transacoes
+from .cache import contexto_em_cache
+from datetime import MAXYEAR, MINYEAR
+from decimal import Decimal
 import json
-import calendar
+
+# Maior horizonte aceito pela projeção de fluxo de caixa
+PROJECAO_MAX_MESES = 60
 
 
 def calcular_transacoes_previstas(usuario, mes, ano):
     """Calcula transações recorrentes previstas para um mês específico"""
-    # Busca todas as transações recorrentes ativas do usuário
-    recorrentes = TransacaoRecorrente.objects.filter(
+    return projetar_recorrencias(usuario, ano, mes, meses=1)[0]['transacoes']
+
+
+def calcular_historico_meses(usuario, quantidade=12):
+    """
+    Calcula receitas e despesas dos últimos meses em uma única consulta
+    ao resumo mensal
+
+    Args:
+        usuario: Usuário proprietário das transações
+        quantidade: Quantidade de meses, incluindo o atual
+
+    Returns:
+        list: Um item por mês, do mais antigo para o atual
+    """
+    inicio_mes_atual = timezone.localdate().replace(day=1)
+    inicio = inicio_mes_atual - relativedelta(months=quantidade - 1)
+    meses = [inicio + relativedelta(months=i) for i in range(quantidade)]
+
+    totais = {}
+    for item in ResumoMensal.objects.filter(
         usuario=usuario,
-        ativa=True
-    )
-
-    transacoes_previstas = []
-
-    for recorrente in recorrentes:
-        # Verifica se deve gerar para este mês
-        data_mes = datetime(ano, mes, 1).date()
-
-        # Verifica se está dentro do período de vigência
-        if data_mes < recorrente.data_inicio:
-            continue
-
-        if recorrente.data_fim and data_mes > recorrente.data_fim:
-            continue
-
-        # Calcula se deve gerar baseado na recorrência
-        deve_gerar = False
-
-        if recorrente.tipo_recorrencia == 'MENSAL':
-            deve_gerar = True
-        elif recorrente.tipo_recorrencia == 'BIMESTRAL':
-            # A cada 2 meses a partir da data de início
-            diff_meses = (ano - recorrente.data_inicio.year) * \
-                12 + (mes - recorrente.data_inicio.month)
-            deve_gerar = diff_meses % 2 == 0
-        elif recorrente.tipo_recorrencia == 'TRIMESTRAL':
-            # A cada 3 meses
-            diff_meses = (ano - recorrente.data_inicio.year) * \
-                12 + (mes - recorrente.data_inicio.month)
-            deve_gerar = diff_meses % 3 == 0
-        elif recorrente.tipo_recorrencia == 'SEMESTRAL':
-            # A cada 6 meses
-            diff_meses = (ano - recorrente.data_inicio.year) * \
-                12 + (mes - recorrente.data_inicio.month)
-            deve_gerar = diff_meses % 6 == 0
-        elif recorrente.tipo_recorrencia == 'ANUAL':
-            # Todo ano no mesmo mês da data de início
-            deve_gerar = mes == recorrente.data_inicio.month
-
-        if deve_gerar:
-            # Verifica se já existe transação real para este período
-            identificador = f"recorrente_{recorrente.id}_{mes}_{ano}"
-            transacao_existe = Transacao.objects.filter(
-                usuario=usuario,
-                identificador_ofx=identificador
-            ).exists()
-
-            if not transacao_existe:
-                # Calcula a data prevista
-                ultimo_dia_mes = calendar.monthrange(ano, mes)[1]
-                dia_ajustado = min(recorrente.dia_vencimento, ultimo_dia_mes)
-                data_prevista = datetime(ano, mes, dia_ajustado).date()
-
-                transacoes_previstas.append({
-                    'descricao': f"{recorrente.descricao} (Prevista)",
-                    'valor': recorrente.valor,
-                    'tipo': recorrente.tipo,
-                    'data': data_prevista,
-                    'categoria': recorrente.categoria,
-                    'conta_bancaria': recorrente.conta_bancaria,
-                    'recorrente_id': recorrente.id,
-                    'eh_prevista': True
-                })
-
-    return transacoes_previstas
+        ano__gte=inicio.year,
+        ano__lte=inicio_mes_atual.year
+    ).values('ano', 'mes').annotate(
+        receitas=Sum(Case(When(tipo='RECEITA', then='total'))),
+        despesas=Sum(Case(When(tipo='DESPESA', then='total')))
+    ).order_by():
+        totais[(item['ano'], item['mes'])] = item
+
+    # Preenche os meses sem transações
+    historico_meses = []
+    for data_mes in meses:
+        item = totais.get((data_mes.year, data_mes.month), {})
+        receitas_mes = item.get('receitas') or 0
+        despesas_mes = item.get('despesas') or 0
 
+        historico_meses.append({
+            'mes': data_mes.strftime('%m/%Y'),
+            'receitas': float(receitas_mes),
+            'despesas': float(despesas_mes),
+            'saldo': float(receitas_mes - despesas_mes)
+        })
 
-@login_required
-def home_view(request):
-    """Dashboard principal com resumo financeiro"""
-    # Filtros de período
-    mes_atual = timezone.now().month
-    ano_atual = timezone.now().year
+    return historico_meses
 
-    # Parâmetros de filtro da URL
-    mes = int(request.GET.get('mes', mes_atual))
-    ano = int(request.GET.get('ano', ano_atual))
 
+def calcular_contexto_dashboard(usuario, ano, mes, usar_ultimo_mes=False):
+    """
+    Valores do dashboard para o mês, prontos para o cache
+
+    Args:
+        usar_ultimo_mes: Sem transações no mês, mostra o último mês que
+            tiver transações
+
+    Returns:
+        dict: Contexto do template, sem querysets pendentes
+    """
     # Se não houver transações no mês atual, mostra o último mês com transações
-    transacoes_teste = Transacao.objects.filter(
-        usuario=request.user,
-        data__month=mes,
-        data__year=ano
+    transacoes_teste = ResumoMensal.objects.filter(
+        usuario=usuario,
+        ano=ano,
+        mes=mes,
+        quantidade__gt=0
     ).exists()
 
-    if not transacoes_teste and not request.GET.get('mes'):
+    if not transacoes_teste and usar_ultimo_mes:
         # Busca o último mês com transações
         ultima_transacao = Transacao.objects.filter(
-            usuario=request.user
+            usuario=usuario
         ).order_by('-data').first()
 
         if ultima_transacao:
@@ -111,22 +99,29 @@ def home_view(request):
 
     # Query base filtrada por usuário e período
     transacoes_base = Transacao.objects.filter(
-        usuario=request.user,
-        data__month=mes,
-        data__year=ano
-    )
+        usuario=usuario
+    ).no_mes(ano, mes)
+
+    # Receitas e despesas por categoria, lidas do resumo mensal
+    resumo_mes = list(ResumoMensal.objects.filter(
+        usuario=usuario,
+        ano=ano,
+        mes=mes,
+        quantidade__gt=0
+    ).values(
+        'tipo', 'categoria__nome', 'categoria__cor', 'total'
+    ).order_by('-total'))
+
+    receitas_categoria = [r for r in resumo_mes if r['tipo'] == 'RECEITA']
+    despesas_categoria = [r for r in resumo_mes if r['tipo'] == 'DESPESA']
 
     # Cálculos financeiros das transações reais
-    receitas_total = transacoes_base.filter(tipo='RECEITA').aggregate(
-        total=Sum('valor'))['total'] or 0
-    despesas_total = transacoes_base.filter(tipo='DESPESA').aggregate(
-        total=Sum('valor'))['total'] or 0
+    receitas_total = sum(r['total'] for r in receitas_categoria)
+    despesas_total = sum(r['total'] for r in despesas_categoria)
     saldo_mes = receitas_total - despesas_total
 
     # Calcula transações previstas (recorrentes não consolidadas)
-    transacoes_previstas = calcular_transacoes_previstas(
-        request.user, mes, ano
-    )
+    transacoes_previstas = calcular_transacoes_previstas(usuario, mes, ano)
 
     # Separa receitas e despesas previstas
     receitas_previstas = [
@@ -136,26 +131,18 @@ def home_view(request):
 
     # Totais das transações previstas
     receitas_previstas_total = sum(
-        float(t['valor']) for t in receitas_previstas)
+        (t['valor'] for t in receitas_previstas), Decimal('0'))
     despesas_previstas_total = sum(
-        float(t['valor']) for t in despesas_previstas)
+        (t['valor'] for t in despesas_previstas), Decimal('0'))
 
     # Totais projetados (reais + previstas)
     receitas_projetadas = receitas_total + receitas_previstas_total
     despesas_projetadas = despesas_total + despesas_previstas_total
     saldo_projetado = receitas_projetadas - despesas_projetadas
 
-    # Receitas e despesas por categoria
-    receitas_categoria = transacoes_base.filter(tipo='RECEITA').values(
-        'categoria__nome', 'categoria__cor').annotate(
-        total=Sum('valor')).order_by('-total')
-
-    despesas_categoria = transacoes_base.filter(tipo='DESPESA').values(
-        'categoria__nome', 'categoria__cor').annotate(
-        total=Sum('valor')).order_by('-total')
-
     # Transações recentes
-    transacoes_recentes = transacoes_base.order_by('-data', '-criado_em')[:10]
+    transacoes_recentes = list(transacoes_base.select_related(
+        'categoria').order_by('-data', '-criado_em')[:10])
 
     # Dados para gráficos (JSON)
     receitas_chart_data = {
@@ -171,32 +158,9 @@ def home_view(request):
     }
 
     # Histórico dos últimos 12 meses
-    historico_meses = []
-    for i in range(12):
-        data_mes = timezone.now() - timedelta(days=30*i)
-        transacoes_mes = Transacao.objects.filter(
-            usuario=request.user,
-            data__month=data_mes.month,
-            data__year=data_mes.year
-        )
-        receitas_mes = transacoes_mes.filter(tipo='RECEITA').aggregate(
-            total=Sum('valor'))['total'] or 0
-        despesas_mes = transacoes_mes.filter(tipo='DESPESA').aggregate(
-            total=Sum('valor'))['total'] or 0
-
-        historico_meses.append({
-            'mes': data_mes.strftime('%m/%Y'),
-            'receitas': float(receitas_mes),
-            'despesas': float(despesas_mes),
-            'saldo': float(receitas_mes - despesas_mes)
-        })
+    historico_meses = calcular_historico_meses(usuario)
 
-    historico_meses.reverse()
-
-    # Verifica se estamos mostrando dados do mês atual ou de outro período
-    mostrando_mes_atual = (mes == mes_atual and ano == ano_atual)
-
-    context = {
+    return {
         'receitas_total': receitas_total,
         'despesas_total': despesas_total,
         'saldo_mes': saldo_mes,
@@ -208,7 +172,6 @@ def home_view(request):
         'historico_meses': json.dumps(historico_meses),
         'mes_atual': mes,
         'ano_atual': ano,
-        'mostrando_mes_atual': mostrando_mes_atual,
         # Dados das transações previstas
         'receitas_previstas': receitas_previstas,
         'despesas_previstas': despesas_previstas,
@@ -218,18 +181,99 @@ def home_view(request):
         'despesas_projetadas': despesas_projetadas,
         'saldo_projetado': saldo_projetado,
         'tem_previstas': len(transacoes_previstas) > 0,
+    }
+
+
+@login_required
+def home_view(request):
+    """Dashboard principal com resumo financeiro"""
+    # Filtros de período
+    hoje = timezone.localdate()
+    mes_atual = hoje.month
+    ano_atual = hoje.year
+
+    # Parâmetros de filtro da URL (mês inválido volta para o atual)
+    mes = int(request.GET.get('mes', mes_atual))
+    ano = int(request.GET.get('ano', ano_atual))
+    try:
+        Periodo.mes(ano, mes)
+    except ValueError:
+        mes, ano = mes_atual, ano_atual
+
+    # Os valores calculados ficam em cache até a próxima alteração dos dados
+    usar_ultimo_mes = not request.GET.get('mes')
+    context = dict(contexto_em_cache(
+        request.user.pk, ano, mes,
+        lambda: calcular_contexto_dashboard(
+            request.user, ano, mes, usar_ultimo_mes),
+        usar_ultimo_mes
+    ))
+
+    # Verifica se estamos mostrando dados do mês atual ou de outro período
+    context.update({
+        'mostrando_mes_atual': (
+            context['mes_atual'] == mes_atual
+            and context['ano_atual'] == ano_atual),
         'meses': [
             (1, 'Janeiro'), (2, 'Fevereiro'), (3, 'Março'),
             (4, 'Abril'), (5, 'Maio'), (6, 'Junho'),
             (7, 'Julho'), (8, 'Agosto'), (9, 'Setembro'),
             (10, 'Outubro'), (11, 'Novembro'), (12, 'Dezembro')
         ],
-        'anos': range(2020, timezone.now().year + 2)
-    }
+        'anos': range(2020, ano_atual + 2)
+    })
 
     return render(request, 'dashboard/home.html', context)
 
 
+@login_required
+def projecao_fluxo_caixa(request):
+    """Projeção mês a mês das recorrências não consolidadas em JSON"""
+    hoje = timezone.localdate()
+
+    try:
+        mes = int(request.GET.get('mes', hoje.month))
+        ano = int(request.GET.get('ano', hoje.year))
+        meses = int(request.GET.get('meses', 12))
+    except ValueError:
+        return JsonResponse({'erro': 'Parâmetros inválidos'}, status=400)
+
+    if not 1 <= mes <= 12 or not 1 <= meses <= PROJECAO_MAX_MESES:
+        return JsonResponse({'erro': 'Parâmetros inválidos'}, status=400)
+
+    # O horizonte inteiro precisa caber nos anos aceitos por date()
+    ultimo_ano = ano + (mes + meses - 2) // 12
+    if ano < MINYEAR or ultimo_ano > MAXYEAR:
+        return JsonResponse({'erro': 'Parâmetros inválidos'}, status=400)
+
+    projecao = projetar_recorrencias(request.user, ano, mes, meses)
+
+    saldo_acumulado = Decimal('0')
+    resultado = []
+    for item in projecao:
+        saldo_acumulado += item['saldo']
+        resultado.append({
+            'mes': f"{item['mes']:02d}/{item['ano']}",
+            'receitas': float(item['receitas']),
+            'despesas': float(item['despesas']),
+            'saldo': float(item['saldo']),
+            'saldo_acumulado': float(saldo_acumulado),
+            'transacoes': [
+                {
+                    'descricao': t['descricao'],
+                    'valor': float(t['valor']),
+                    'tipo': t['tipo'],
+                    'data': t['data'].isoformat(),
+                    'categoria': t['categoria'].nome,
+                    'recorrente_id': t['recorrente_id'],
+                }
+                for t in item['transacoes']
+            ]
+        })
+
+    return JsonResponse({'meses': resultado})
+
+
 @login_required
 def consolidar_transacao_prevista(request, recorrente_id, mes, ano):
     """Consolida uma transação prevista criando a transação real"""
@@ -245,11 +289,11 @@ def consolidar_transacao_prevista(request, recorrente_id, mes, ano):
             usuario=request.user
         )
 
-        # Gera a transação para o mês especificado
+        # Gera a transação para o mês especificado; um envio repetido do
+        # formulário é ignorado pela restrição de unicidade
         transacao = recorrente.gerar_transacao_mes(mes, ano)
 
-        if transacao:
-            transacao.save()
+        if transacao and inserir_transacoes([transacao]):
             messages.success(
                 request,
                 f'Transação "{recorrente.descricao}" consolidada com sucesso!'
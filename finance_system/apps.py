@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class FinanceSystemConfig(AppConfig):
+    name = 'finance_system'
+    verbose_name = 'Configuração do projeto'
+
+    def ready(self):
+        from . import banco  # noqa: F401
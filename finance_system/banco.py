@@ -0,0 +1,43 @@
+"""
+Ajustes aplicados a cada nova conexão com o banco
+
+Complementa o perfil de banco escolhido em settings (DB_ENGINE): os PRAGMAs
+do SQLite valem por conexão e não podem ir em DATABASES['OPTIONS'].
+"""
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+MODOS_JOURNAL = {'DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF'}
+MODOS_SYNCHRONOUS = {'OFF', 'NORMAL', 'FULL', 'EXTRA'}
+
+
+@receiver(connection_created)
+def configurar_conexao_sqlite(sender, connection, **kwargs):
+    """
+    Ajusta cada nova conexão SQLite para acesso concorrente
+
+    Em WAL as leituras (dashboard) não bloqueiam a gravação de uma
+    importação e vice-versa; synchronous=NORMAL é seguro em WAL e evita um
+    fsync por commit; o busy timeout faz escritores concorrentes esperarem
+    a vez em vez de falharem com "database is locked".
+    """
+    if connection.vendor != 'sqlite':
+        return
+
+    journal = getattr(settings, 'SQLITE_JOURNAL_MODE', 'WAL').upper()
+    synchronous = getattr(settings, 'SQLITE_SYNCHRONOUS', 'NORMAL').upper()
+    if journal not in MODOS_JOURNAL or synchronous not in MODOS_SYNCHRONOUS:
+        raise ImproperlyConfigured(
+            f'SQLITE_JOURNAL_MODE/SQLITE_SYNCHRONOUS inválidos: '
+            f'{journal}/{synchronous}')
+
+    busy_timeout = int(getattr(settings, 'SQLITE_BUSY_TIMEOUT_MS', 20000))
+    mmap_size = int(getattr(settings, 'SQLITE_MMAP_SIZE', 0))
+
+    conexao = connection.connection
+    conexao.execute(f'PRAGMA journal_mode={journal}')
+    conexao.execute(f'PRAGMA synchronous={synchronous}')
+    conexao.execute(f'PRAGMA busy_timeout={busy_timeout}')
+    conexao.execute(f'PRAGMA mmap_size={mmap_size}')
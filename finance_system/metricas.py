@@ -0,0 +1,190 @@
+"""
+Métricas do processo no formato texto do Prometheus
+
+Cada requisição registra, por view, a duração total, o tempo gasto no banco
+e a quantidade de consultas em histogramas mantidos na memória do processo
+(ver finance_system.middleware). Os contadores de importação, ChatGPT e
+caches vêm dos próprios módulos, que já mantêm suas estatísticas.
+
+Os valores são do processo que atende /metrics: com vários processos, cada
+um expõe os seus, e o que roda em jobs (python manage.py run_jobs) só
+aparece aqui com JOBS_ASSINCRONOS=False.
+"""
+import threading
+from bisect import bisect_left
+
+from dashboard.cache import estatisticas_cache_dashboard
+from transacoes.cache_categorizacao import estatisticas_cache
+from transacoes.chatgpt_service import estatisticas_chatgpt
+from transacoes.utils import estatisticas_importacao
+
+# Limites dos buckets (segundos e quantidade de consultas)
+BUCKETS_SEGUNDOS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_CONSULTAS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+class Histograma:
+    """Histograma acumulado no estilo do Prometheus"""
+
+    def __init__(self, limites):
+        self.limites = limites
+        self.contagens = [0] * (len(limites) + 1)
+        self.soma = 0
+        self.total = 0
+
+    def observar(self, valor):
+        self.contagens[bisect_left(self.limites, valor)] += 1
+        self.soma += valor
+        self.total += 1
+
+    def acumulados(self):
+        """Pares (limite, observações <= limite), terminando em +Inf"""
+        acumulado = 0
+        for limite, contagem in zip(
+                self.limites + (float('inf'),), self.contagens):
+            acumulado += contagem
+            yield limite, acumulado
+
+
+# Histogramas por view: nome -> (duração, banco, consultas)
+_requisicoes = {}
+_lock = threading.Lock()
+
+
+def registrar_requisicao(view, segundos, segundos_banco, consultas):
+    """Soma uma requisição aos histogramas da view"""
+    with _lock:
+        histogramas = _requisicoes.get(view)
+        if histogramas is None:
+            histogramas = _requisicoes[view] = (
+                Histograma(BUCKETS_SEGUNDOS),
+                Histograma(BUCKETS_SEGUNDOS),
+                Histograma(BUCKETS_CONSULTAS),
+            )
+        duracao, banco, quantidade = histogramas
+        duracao.observar(segundos)
+        banco.observar(segundos_banco)
+        quantidade.observar(consultas)
+
+
+def zerar_metricas():
+    """Descarta os histogramas (usado nos testes)"""
+    with _lock:
+        _requisicoes.clear()
+
+
+def _rotulos(**rotulos):
+    if not rotulos:
+        return ''
+    pares = ','.join(
+        '{}="{}"'.format(nome, str(valor).replace('\\', '\\\\')
+                         .replace('"', '\\"').replace('\n', '\\n'))
+        for nome, valor in rotulos.items()
+    )
+    return '{' + pares + '}'
+
+
+def _numero(valor):
+    if valor == float('inf'):
+        return '+Inf'
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+def _linhas_histograma(nome, ajuda, histogramas):
+    yield f'# HELP {nome} {ajuda}'
+    yield f'# TYPE {nome} histogram'
+    for view, histograma in histogramas:
+        for limite, acumulado in histograma.acumulados():
+            rotulos = _rotulos(view=view, le=_numero(limite))
+            yield f'{nome}_bucket{rotulos} {acumulado}'
+        yield f'{nome}_sum{_rotulos(view=view)} {_numero(histograma.soma)}'
+        yield f'{nome}_count{_rotulos(view=view)} {histograma.total}'
+
+
+def _linhas_contador(nome, ajuda, valores, tipo='counter'):
+    """valores: lista de (dict de rótulos, valor)"""
+    yield f'# HELP {nome} {ajuda}'
+    yield f'# TYPE {nome} {tipo}'
+    for rotulos, valor in valores:
+        yield f'{nome}{_rotulos(**rotulos)} {_numero(valor)}'
+
+
+def texto_prometheus():
+    """Todas as métricas do processo no formato texto do Prometheus"""
+    with _lock:
+        views = sorted(_requisicoes.items())
+        # Cópia dos valores para não segurar o lock enquanto formata
+        duracoes = [(view, _copiar(h[0])) for view, h in views]
+        bancos = [(view, _copiar(h[1])) for view, h in views]
+        consultas = [(view, _copiar(h[2])) for view, h in views]
+
+    linhas = []
+    linhas += _linhas_histograma(
+        'mymoney_requisicao_segundos',
+        'Duração das requisições por view', duracoes)
+    linhas += _linhas_histograma(
+        'mymoney_requisicao_banco_segundos',
+        'Tempo gasto no banco por requisição, por view', bancos)
+    linhas += _linhas_histograma(
+        'mymoney_requisicao_consultas',
+        'Consultas ao banco por requisição, por view', consultas)
+
+    importacao = estatisticas_importacao()
+    linhas += _linhas_contador(
+        'mymoney_extrato_lancamentos_lidos_total',
+        'Lançamentos lidos de extratos OFX e CSV',
+        [({}, importacao['lancamentos_lidos'])])
+    linhas += _linhas_contador(
+        'mymoney_transacoes_inseridas_total',
+        'Transações gravadas pelas importações e gravações em lote',
+        [({}, importacao['transacoes_inseridas'])])
+
+    chatgpt = estatisticas_chatgpt()
+    linhas += _linhas_contador(
+        'mymoney_chatgpt_lotes_total',
+        'Lotes enviados ao ChatGPT, por resultado', [
+            ({'resultado': 'sucesso'},
+             chatgpt['lotes'] - chatgpt['lotes_com_falha']),
+            ({'resultado': 'falha'}, chatgpt['lotes_com_falha']),
+        ])
+    linhas += _linhas_contador(
+        'mymoney_chatgpt_requisicoes_total',
+        'Requisições respondidas pelo ChatGPT',
+        [({}, chatgpt['requisicoes'])])
+    linhas += _linhas_contador(
+        'mymoney_chatgpt_tokens_total', 'Tokens consumidos no ChatGPT', [
+            ({'tipo': 'prompt'}, chatgpt['tokens_prompt']),
+            ({'tipo': 'resposta'}, chatgpt['tokens_resposta']),
+        ])
+
+    categorizacao = estatisticas_cache()
+    linhas += _linhas_contador(
+        'mymoney_cache_categorizacao_total',
+        'Consultas ao cache de categorização, por resultado', [
+            ({'resultado': 'acerto_memoria'}, categorizacao['acertos_lru']),
+            ({'resultado': 'acerto_banco'}, categorizacao['acertos_banco']),
+            ({'resultado': 'falha'}, categorizacao['falhas']),
+        ])
+    linhas += _linhas_contador(
+        'mymoney_cache_categorizacao_entradas',
+        'Sugestões guardadas na memória do processo',
+        [({}, categorizacao['entradas_lru'])], tipo='gauge')
+
+    dashboard = estatisticas_cache_dashboard()
+    linhas += _linhas_contador(
+        'mymoney_cache_dashboard_total',
+        'Consultas ao cache do dashboard, por resultado', [
+            ({'resultado': 'acerto'}, dashboard['acertos']),
+            ({'resultado': 'falha'}, dashboard['falhas']),
+        ])
+
+    return '\n'.join(linhas) + '\n'
+
+
+def _copiar(histograma):
+    copia = Histograma(histograma.limites)
+    copia.contagens = list(histograma.contagens)
+    copia.soma = histograma.soma
+    copia.total = histograma.total
+    return copia
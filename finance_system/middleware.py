@@ -0,0 +1,65 @@
+"""
+Middleware de medição das requisições
+
+Mede a duração de cada requisição e, com connection.execute_wrapper(), a
+quantidade de consultas e o tempo gasto no banco. Os valores vão para os
+histogramas de finance_system.metricas, agrupados pelo nome da URL, e para
+o cabeçalho Server-Timing, exibido nas ferramentas de desenvolvedor do
+navegador.
+
+Em respostas em streaming (exportações) apenas a preparação da resposta é
+medida; o conteúdo é gerado depois que o middleware termina.
+"""
+import time
+
+from django.conf import settings
+from django.db import connection
+
+from .metricas import registrar_requisicao
+
+
+class MedidorConsultas:
+    """Wrapper de execute que conta as consultas e soma o tempo gasto"""
+
+    def __init__(self):
+        self.consultas = 0
+        self.segundos = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.segundos += time.perf_counter() - inicio
+            self.consultas += 1
+
+
+class MetricasMiddleware:
+    """Registra duração, consultas e tempo de banco de cada requisição"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        medidor = MedidorConsultas()
+        inicio = time.perf_counter()
+        with connection.execute_wrapper(medidor):
+            response = self.get_response(request)
+        segundos = time.perf_counter() - inicio
+
+        # Nome da URL (ex.: transacoes:lista), não o caminho, para que
+        # /transacoes/1/editar/ e /transacoes/2/editar/ fiquem juntos
+        resolver_match = getattr(request, 'resolver_match', None)
+        view = resolver_match.view_name if resolver_match else 'nao_resolvida'
+
+        registrar_requisicao(
+            view, segundos, medidor.segundos, medidor.consultas)
+
+        if getattr(settings, 'SERVER_TIMING', True):
+            response['Server-Timing'] = (
+                f'app;dur={segundos * 1000:.1f}, '
+                f'db;dur={medidor.segundos * 1000:.1f};'
+                f'desc="{medidor.consultas} consultas"'
+            )
+
+        return response
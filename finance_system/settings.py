@@ -1,4 +1,5 @@
 
+import tempfile
 from pathlib import Path
 from decouple import config
 
@@ -28,12 +29,14 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     # Apps do projeto
+    'finance_system.apps.FinanceSystemConfig',
     'usuarios',
     'transacoes',
     'dashboard',
 ]
 
 MIDDLEWARE = [
+    'finance_system.middleware.MetricasMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -66,12 +69,59 @@ WSGI_APPLICATION = 'finance_system.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Perfil escolhido por DB_ENGINE no .env: sqlite (padrão) ou postgresql
+
+DB_ENGINE = config('DB_ENGINE', default='sqlite')
+
+# Segundos que uma conexão é reaproveitada entre requisições
+DB_CONN_MAX_AGE = config('DB_CONN_MAX_AGE', default=60, cast=int)
+
+if DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': config('DB_NAME', default='mymoney'),
+            'USER': config('DB_USER', default='mymoney'),
+            'PASSWORD': config('DB_PASSWORD', default=''),
+            'HOST': config('DB_HOST', default='localhost'),
+            'PORT': config('DB_PORT', default='5432'),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+        }
     }
-}
+
+    # Pool de conexões do psycopg (pip install "psycopg[binary,pool]").
+    # O pool substitui as conexões persistentes: CONN_MAX_AGE fica em 0
+    if config('DB_POOL', default=False, cast=bool):
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': config('DB_POOL_MIN', default=2, cast=int),
+            'max_size': config('DB_POOL_MAX', default=10, cast=int),
+            'timeout': config('DB_POOL_TIMEOUT', default=10, cast=int),
+        }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': config('DB_NAME', default=str(BASE_DIR / 'db.sqlite3')),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'OPTIONS': {
+                # Transações de escrita pedem o lock no BEGIN e esperam o
+                # busy timeout, em vez de falharem ao promover a leitura
+                'transaction_mode': config(
+                    'SQLITE_TRANSACTION_MODE', default='IMMEDIATE'),
+            },
+        }
+    }
+
+# PRAGMAs aplicados a cada nova conexão SQLite (finance_system.banco)
+SQLITE_JOURNAL_MODE = config('SQLITE_JOURNAL_MODE', default='WAL')
+SQLITE_SYNCHRONOUS = config('SQLITE_SYNCHRONOUS', default='NORMAL')
+SQLITE_BUSY_TIMEOUT_MS = config(
+    'SQLITE_BUSY_TIMEOUT_MS', default=20000, cast=int)
+SQLITE_MMAP_SIZE = config(
+    'SQLITE_MMAP_SIZE', default=256 * 1024 * 1024, cast=int)
 
 
 # Password validation
@@ -134,3 +184,72 @@ CHATGPT_ENABLED = bool(OPENAI_API_KEY)
 CHATGPT_MODEL = 'gpt-3.5-turbo'
 CHATGPT_MAX_TOKENS = 1000
 CHATGPT_TEMPERATURE = 0.3
+
+# Envio paralelo dos lotes ao ChatGPT (asyncio + openai.AsyncOpenAI)
+CHATGPT_ASYNC = config('CHATGPT_ASYNC', default=True, cast=bool)
+CHATGPT_CONCORRENCIA = config('CHATGPT_CONCORRENCIA', default=4, cast=int)
+CHATGPT_REQUISICOES_POR_MINUTO = config(
+    'CHATGPT_REQUISICOES_POR_MINUTO', default=60, cast=int)
+CHATGPT_MAX_TENTATIVAS = config('CHATGPT_MAX_TENTATIVAS', default=4, cast=int)
+
+# Lotes montados pelo orçamento de tokens do prompt
+CHATGPT_TOKENS_PROMPT = config('CHATGPT_TOKENS_PROMPT', default=1500, cast=int)
+CHATGPT_MAX_LINHAS_LOTE = config(
+    'CHATGPT_MAX_LINHAS_LOTE', default=50, cast=int)
+
+# Importação OFX
+OFX_BULK_BATCH_SIZE = config('OFX_BULK_BATCH_SIZE', default=500, cast=int)
+OFX_STAGING_VALIDADE_HORAS = config(
+    'OFX_STAGING_VALIDADE_HORAS', default=24, cast=int)
+# Processos de leitura da importação em lote (0 = um por CPU)
+OFX_LOTE_PROCESSOS = config('OFX_LOTE_PROCESSOS', default=0, cast=int)
+# Limites de um ZIP: arquivos OFX e soma dos tamanhos descompactados
+OFX_ZIP_MAX_ARQUIVOS = config('OFX_ZIP_MAX_ARQUIVOS', default=1000, cast=int)
+OFX_ZIP_MAX_BYTES = config(
+    'OFX_ZIP_MAX_BYTES', default=200 * 1024 * 1024, cast=int)
+
+# Jobs em segundo plano (python manage.py run_jobs)
+JOBS_ASSINCRONOS = config('JOBS_ASSINCRONOS', default=True, cast=bool)
+JOB_TIMEOUT_MINUTOS = config('JOB_TIMEOUT_MINUTOS', default=30, cast=int)
+JOB_SINAL_VIDA_SEGUNDOS = config(
+    'JOB_SINAL_VIDA_SEGUNDOS', default=30, cast=int)
+JOB_MAX_TENTATIVAS = config('JOB_MAX_TENTATIVAS', default=3, cast=int)
+
+# Cache do Django compartilhado por todos os processos do servidor (web,
+# run_jobs e cron), que guardam nele a versão dos dados de cada usuário.
+# Com um backend na memória do processo o cache do dashboard fica desligado.
+CACHES = {
+    'default': {
+        'BACKEND': config(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': config(
+            'CACHE_LOCATION',
+            default=str(Path(tempfile.gettempdir()) / 'mymoney_cache')),
+    }
+}
+
+# Os testes usam um cache próprio, em um diretório temporário
+TEST_RUNNER = 'finance_system.testes.ExecutorTestes'
+
+# Contexto do dashboard em cache, invalidado a cada alteração dos dados
+DASHBOARD_CACHE_SEGUNDOS = config(
+    'DASHBOARD_CACHE_SEGUNDOS', default=3600, cast=int)
+
+# Cache de categorização (sugestões do ChatGPT por descrição normalizada)
+CATEGORIZACAO_CACHE_DIAS = config(
+    'CATEGORIZACAO_CACHE_DIAS', default=90, cast=int)
+CATEGORIZACAO_CACHE_LRU = config(
+    'CATEGORIZACAO_CACHE_LRU', default=5000, cast=int)
+CATEGORIZACAO_CACHE_MAX_POR_USUARIO = config(
+    'CATEGORIZACAO_CACHE_MAX_POR_USUARIO', default=5000, cast=int)
+
+# Classificador treinado com o histórico de cada usuário
+CLASSIFICADOR_CONFIANCA_MINIMA = config(
+    'CLASSIFICADOR_CONFIANCA_MINIMA', default=0.9, cast=float)
+CLASSIFICADOR_MINIMO_EXEMPLOS = config(
+    'CLASSIFICADOR_MINIMO_EXEMPLOS', default=30, cast=int)
+
+# Cabeçalho Server-Timing com o tempo total e o de banco de cada requisição
+# (as métricas agregadas ficam em /metrics, acessível só para staff)
+SERVER_TIMING = config('SERVER_TIMING', default=True, cast=bool)
@@ -0,0 +1,30 @@
+"""
+Executor dos testes com cache próprio
+
+O cache configurado é compartilhado com o servidor de desenvolvimento e
+os jobs; os testes usam um cache em arquivo em um diretório temporário,
+criado para a execução e removido no final, de modo que cache.clear() não
+apaga o cache do servidor.
+"""
+import shutil
+import tempfile
+
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class ExecutorTestes(DiscoverRunner):
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._diretorio_cache = tempfile.mkdtemp(prefix='mymoney_cache_testes_')
+        self._cache_testes = override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': self._diretorio_cache,
+        }})
+        self._cache_testes.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._cache_testes.disable()
+        shutil.rmtree(self._diretorio_cache, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,95 @@
+import threading
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, connections
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from dashboard.cache import zerar_estatisticas_dashboard
+from transacoes.utils import estatisticas_importacao, registrar_importacao
+from .banco import configurar_conexao_sqlite
+from .metricas import zerar_metricas
+
+
+class ConexaoSQLiteTest(TestCase):
+
+    @override_settings(SQLITE_BUSY_TIMEOUT_MS=1234, SQLITE_SYNCHRONOUS='FULL')
+    def test_pragmas_aplicados_em_cada_conexao(self):
+        # Uma conexão nova dispara connection_created
+        nova = connections.create_connection('default')
+        try:
+            with nova.cursor() as cursor:
+                cursor.execute('PRAGMA busy_timeout')
+                self.assertEqual(cursor.fetchone()[0], 1234)
+                cursor.execute('PRAGMA synchronous')
+                self.assertEqual(cursor.fetchone()[0], 2)
+        finally:
+            nova.close()
+
+    def test_modo_invalido_recusado(self):
+        with override_settings(SQLITE_JOURNAL_MODE='WAL; DROP TABLE x'):
+            with self.assertRaises(ImproperlyConfigured):
+                configurar_conexao_sqlite(connection.__class__, connection)
+
+
+class MetricasTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        zerar_metricas()
+        zerar_estatisticas_dashboard()
+        self.usuario = User.objects.create_user('teste', password='senha')
+        self.client.login(username='teste', password='senha')
+
+    def test_resposta_traz_server_timing(self):
+        response = self.client.get(reverse('dashboard:home'))
+
+        cabecalho = response['Server-Timing']
+        self.assertRegex(
+            cabecalho, r'^app;dur=[\d.]+, db;dur=[\d.]+;desc="\d+ consultas"$')
+        self.assertNotIn('desc="0 consultas"', cabecalho)
+
+    def test_metricas_so_para_staff(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.client.logout()
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+
+    def test_contadores_entre_threads(self):
+        antes = estatisticas_importacao()['lancamentos_lidos']
+
+        def registrar():
+            for _ in range(5000):
+                registrar_importacao(lidos=1)
+
+        threads = [threading.Thread(target=registrar) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(
+            estatisticas_importacao()['lancamentos_lidos'] - antes, 40000)
+
+    def test_metricas_no_formato_prometheus(self):
+        self.client.get(reverse('dashboard:home'))
+        self.client.get(reverse('dashboard:home'))
+        self.usuario.is_staff = True
+        self.usuario.save()
+
+        response = self.client.get('/metrics')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        texto = response.content.decode()
+        self.assertIn(
+            'mymoney_requisicao_segundos_count{view="dashboard:home"} 2',
+            texto)
+        self.assertIn(
+            'mymoney_requisicao_consultas_bucket'
+            '{view="dashboard:home",le="+Inf"} 2', texto)
+        self.assertIn(
+            'mymoney_cache_dashboard_total{resultado="acerto"} 1', texto)
+        self.assertIn('# TYPE mymoney_chatgpt_lotes_total counter', texto)
+        self.assertIn('mymoney_extrato_lancamentos_lidos_total', texto)
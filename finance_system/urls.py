@@ -20,12 +20,15 @@ from django.conf import settings
 from django.conf.urls.static import static
 from usuarios.views import home_view
 
+from .views import metricas
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', home_view, name='home'),
     path('usuarios/', include('usuarios.urls')),
     path('dashboard/', include('dashboard.urls')),
     path('transacoes/', include('transacoes.urls')),
+    path('metrics', metricas, name='metricas'),
 ]
 
 # Servir arquivos de mídia em desenvolvimento
@@ -0,0 +1,12 @@
+from django.http import HttpResponse, HttpResponseForbidden
+
+from .metricas import texto_prometheus
+
+
+def metricas(request):
+    """Métricas do processo no formato texto do Prometheus (só staff)"""
+    if not (request.user.is_active and request.user.is_staff):
+        return HttpResponseForbidden()
+    return HttpResponse(
+        texto_prometheus(),
+        content_type='text/plain; version=0.0.4; charset=utf-8')
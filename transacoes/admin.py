@@ -1,6 +1,8 @@
 from django.contrib import admin
 from .models import (
-    Categoria, ContaBancaria, Transacao, TransacaoRecorrente, ImportacaoOFX
+    Categoria, CategorizacaoCache, ClassificadorCategoria, ContaBancaria,
+    Transacao,
+    TransacaoRecorrente, ImportacaoOFX, ResumoMensal
 )
 
 
@@ -21,12 +23,19 @@ class CategoriaAdmin(admin.ModelAdmin):
 class ContaBancariaAdmin(admin.ModelAdmin):
     list_display = [
         'nome', 'banco', 'agencia', 'conta',
-        'saldo_inicial', 'usuario', 'ativa'
+        'saldo_inicial', 'saldo', 'usuario', 'ativa'
     ]
     list_filter = ['banco', 'ativa', 'usuario']
     search_fields = ['nome', 'banco']
     list_per_page = 50
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_saldo()
+
+    @admin.display(description='Saldo atual', ordering='saldo')
+    def saldo(self, obj):
+        return obj.saldo
+
     def save_model(self, request, obj, form, change):
         if not obj.pk:
             obj.usuario = request.user
@@ -91,10 +100,46 @@ class ImportacaoOFXAdmin(admin.ModelAdmin):
     list_display = [
         'arquivo_nome', 'data_importacao', 'usuario',
         'total_transacoes', 'transacoes_importadas',
-        'transacoes_duplicadas', 'sucesso'
+        'transacoes_duplicadas', 'chatgpt_requisicoes',
+        'chatgpt_tokens_prompt', 'chatgpt_tokens_resposta', 'sucesso'
     ]
     list_filter = ['sucesso', 'data_importacao', 'usuario']
     search_fields = ['arquivo_nome']
     date_hierarchy = 'data_importacao'
     readonly_fields = ['data_importacao']
     list_per_page = 50
+
+
+@admin.register(ResumoMensal)
+class ResumoMensalAdmin(admin.ModelAdmin):
+    list_display = [
+        'ano', 'mes', 'categoria', 'tipo', 'total', 'quantidade', 'usuario'
+    ]
+    list_filter = ['tipo', 'ano', 'usuario']
+    list_select_related = ['categoria']
+    readonly_fields = [
+        'usuario', 'ano', 'mes', 'categoria', 'tipo', 'total', 'quantidade'
+    ]
+    list_per_page = 50
+
+
+@admin.register(CategorizacaoCache)
+class CategorizacaoCacheAdmin(admin.ModelAdmin):
+    list_display = [
+        'descricao_normalizada', 'tipo', 'categoria', 'confianca', 'acertos',
+        'usado_em', 'usuario'
+    ]
+    list_filter = ['tipo', 'usuario']
+    list_select_related = ['categoria', 'usuario']
+    search_fields = ['descricao_normalizada']
+    readonly_fields = ['chave', 'acertos', 'usado_em', 'criado_em',
+                       'atualizado_em']
+    list_per_page = 50
+
+
+@admin.register(ClassificadorCategoria)
+class ClassificadorCategoriaAdmin(admin.ModelAdmin):
+    list_display = ['usuario', 'exemplos', 'ultima_transacao_id',
+                    'atualizado_em']
+    exclude = ['dados']
+    readonly_fields = ['exemplos', 'ultima_transacao_id', 'atualizado_em']
@@ -0,0 +1,238 @@
+"""
+Busca textual nas descrições das transações
+
+No SQLite as descrições ficam em uma tabela virtual FTS5 (conteúdo
+externo, tokenizer unicode61 sem acentos e índices de prefixo), mantida
+por triggers em transacoes_transacao: inserções via save(), bulk_create e
+o INSERT ... SELECT do staging entram no índice sem código adicional. No
+PostgreSQL um índice GIN sobre to_tsvector('simple', unaccent(descricao))
+tem o mesmo papel.
+
+Cada palavra buscada é tratada como prefixo ("merc" encontra "Mercado",
+"farmacia" encontra "FARMÁCIA"). Categorias são poucas por usuário e são
+resolvidas em Python, sem JOIN na consulta das transações.
+"""
+import re
+import unicodedata
+
+from django.db import connections, router
+from django.db.models import BooleanField, F, FloatField, Q
+from django.db.models.expressions import RawSQL
+
+from .models import Categoria, Transacao
+
+TABELA_BUSCA = 'transacoes_busca'
+INDICE_GIN = 'transacao_busca_gin'
+FUNCAO_UNACCENT = 'transacoes_unaccent'
+
+# Palavras consideradas da busca (o restante é ignorado)
+MAX_TERMOS = 8
+
+_disponivel = {}
+
+
+def normalizar_termo(texto):
+    """Texto em minúsculas e sem acentos"""
+    texto = unicodedata.normalize('NFKD', texto or '')
+    return ''.join(c for c in texto if not unicodedata.combining(c)).lower()
+
+
+def termos_busca(busca):
+    """Palavras da busca, normalizadas"""
+    return re.findall(r'\w+', normalizar_termo(busca))[:MAX_TERMOS]
+
+
+def _conexao():
+    return connections[router.db_for_write(Transacao)]
+
+
+def criar_indice_busca(conexao=None):
+    """
+    Cria (ou recria) o índice de busca e, no SQLite, os triggers
+
+    Alterações de schema que recriam transacoes_transacao no SQLite
+    descartam os triggers; o comando reconstruir_busca os recria.
+    """
+    conexao = conexao or _conexao()
+    tabela = Transacao._meta.db_table
+
+    with conexao.cursor() as cursor:
+        if conexao.vendor == 'sqlite':
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABELA_BUSCA} USING fts5("
+                f"descricao, content='{tabela}', content_rowid='id', "
+                f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+            )
+            for sufixo in ('ai', 'ad', 'au'):
+                cursor.execute(f'DROP TRIGGER IF EXISTS {TABELA_BUSCA}_{sufixo}')
+            cursor.execute(
+                f'CREATE TRIGGER {TABELA_BUSCA}_ai AFTER INSERT ON {tabela} '
+                f'BEGIN INSERT INTO {TABELA_BUSCA}(rowid, descricao) '
+                f'VALUES (new.id, new.descricao); END'
+            )
+            cursor.execute(
+                f'CREATE TRIGGER {TABELA_BUSCA}_ad AFTER DELETE ON {tabela} '
+                f'BEGIN INSERT INTO {TABELA_BUSCA}({TABELA_BUSCA}, rowid, '
+                f"descricao) VALUES ('delete', old.id, old.descricao); END"
+            )
+            cursor.execute(
+                f'CREATE TRIGGER {TABELA_BUSCA}_au AFTER UPDATE OF descricao '
+                f'ON {tabela} BEGIN '
+                f'INSERT INTO {TABELA_BUSCA}({TABELA_BUSCA}, rowid, descricao) '
+                f"VALUES ('delete', old.id, old.descricao); "
+                f'INSERT INTO {TABELA_BUSCA}(rowid, descricao) '
+                f'VALUES (new.id, new.descricao); END'
+            )
+            cursor.execute(
+                f"INSERT INTO {TABELA_BUSCA}({TABELA_BUSCA}) VALUES ('rebuild')")
+
+        elif conexao.vendor == 'postgresql':
+            cursor.execute('CREATE EXTENSION IF NOT EXISTS unaccent')
+            # unaccent() não é IMMUTABLE e não pode ser usada em índices
+            cursor.execute(
+                f'CREATE OR REPLACE FUNCTION {FUNCAO_UNACCENT}(text) '
+                f'RETURNS text LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT '
+                f"AS $$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$"
+            )
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS {INDICE_GIN} ON {tabela} '
+                f"USING GIN (to_tsvector('simple', {FUNCAO_UNACCENT}(descricao)))"
+            )
+
+    _disponivel.pop(conexao.alias, None)
+
+
+def remover_indice_busca(conexao=None):
+    """Remove o índice de busca (reversão da migração)"""
+    conexao = conexao or _conexao()
+
+    with conexao.cursor() as cursor:
+        if conexao.vendor == 'sqlite':
+            for sufixo in ('ai', 'ad', 'au'):
+                cursor.execute(f'DROP TRIGGER IF EXISTS {TABELA_BUSCA}_{sufixo}')
+            cursor.execute(f'DROP TABLE IF EXISTS {TABELA_BUSCA}')
+        elif conexao.vendor == 'postgresql':
+            cursor.execute(f'DROP INDEX IF EXISTS {INDICE_GIN}')
+            cursor.execute(f'DROP FUNCTION IF EXISTS {FUNCAO_UNACCENT}(text)')
+
+    _disponivel.pop(conexao.alias, None)
+
+
+def reconstruir_indice_busca(conexao=None):
+    """Recria triggers e repopula o índice a partir das transações"""
+    conexao = conexao or _conexao()
+    criar_indice_busca(conexao)
+    if conexao.vendor == 'postgresql':
+        with conexao.cursor() as cursor:
+            cursor.execute(f'REINDEX INDEX {INDICE_GIN}')
+
+
+def indice_disponivel(conexao=None):
+    """Indica se o índice (e, no SQLite, o trigger de inserção) existe"""
+    conexao = conexao or _conexao()
+    if conexao.alias not in _disponivel:
+        with conexao.cursor() as cursor:
+            if conexao.vendor == 'sqlite':
+                cursor.execute(
+                    "SELECT COUNT(*) FROM sqlite_master WHERE name IN (%s, %s)",
+                    [TABELA_BUSCA, f'{TABELA_BUSCA}_ai'])
+                _disponivel[conexao.alias] = cursor.fetchone()[0] == 2
+            elif conexao.vendor == 'postgresql':
+                cursor.execute(
+                    'SELECT COUNT(*) FROM pg_indexes WHERE indexname = %s',
+                    [INDICE_GIN])
+                _disponivel[conexao.alias] = cursor.fetchone()[0] == 1
+            else:
+                _disponivel[conexao.alias] = False
+    return _disponivel[conexao.alias]
+
+
+def _condicao_indice(termos, conexao):
+    """SQL (e parâmetros) que testa a descrição da linha externa no índice"""
+    tabela = conexao.ops.quote_name(Transacao._meta.db_table)
+    if conexao.vendor == 'sqlite':
+        expressao = ' AND '.join(f'"{termo}"*' for termo in termos)
+        return (
+            f'{tabela}.id IN (SELECT rowid FROM {TABELA_BUSCA} '
+            f'WHERE {TABELA_BUSCA} MATCH %s)',
+            [expressao]
+        )
+
+    expressao = ' & '.join(f'{termo}:*' for termo in termos)
+    return (
+        f"to_tsvector('simple', {FUNCAO_UNACCENT}({tabela}.descricao)) "
+        f"@@ to_tsquery('simple', %s)",
+        [expressao]
+    )
+
+
+def _relevancia(termos, conexao):
+    """Expressão de relevância; maior é melhor nos dois bancos"""
+    tabela = conexao.ops.quote_name(Transacao._meta.db_table)
+    if conexao.vendor == 'sqlite':
+        # bm25() é negativo: quanto menor, mais relevante
+        return RawSQL(
+            f'(SELECT -bm25({TABELA_BUSCA}) FROM {TABELA_BUSCA} '
+            f'WHERE {TABELA_BUSCA} MATCH %s AND rowid = {tabela}.id)',
+            [' AND '.join(f'"{termo}"*' for termo in termos)],
+            output_field=FloatField()
+        )
+
+    return RawSQL(
+        f"ts_rank(to_tsvector('simple', {FUNCAO_UNACCENT}({tabela}.descricao)), "
+        f"to_tsquery('simple', %s))",
+        [' & '.join(f'{termo}:*' for termo in termos)],
+        output_field=FloatField()
+    )
+
+
+def categorias_correspondentes(usuario, busca):
+    """Ids das categorias do usuário cujo nome contém a busca (sem acentos)"""
+    alvo = normalizar_termo(busca).strip()
+    if not alvo:
+        return []
+    return [
+        categoria_id for categoria_id, nome in
+        Categoria.objects.filter(usuario=usuario).values_list('id', 'nome')
+        if alvo in normalizar_termo(nome)
+    ]
+
+
+def filtrar_busca(transacoes, usuario, busca):
+    """
+    Restringe as transações às que correspondem à busca
+
+    Sem o índice (outro banco, ou migração não aplicada) usa icontains.
+    """
+    termos = termos_busca(busca)
+    if not termos:
+        return transacoes
+
+    categorias = categorias_correspondentes(usuario, busca)
+    conexao = connections[transacoes.db]
+
+    if indice_disponivel(conexao):
+        sql, parametros = _condicao_indice(termos, conexao)
+        condicao = Q(RawSQL(sql, parametros, output_field=BooleanField()))
+    else:
+        condicao = Q(descricao__icontains=busca)
+
+    if categorias:
+        condicao |= Q(categoria_id__in=categorias)
+    return transacoes.filter(condicao)
+
+
+def ordenar_por_relevancia(transacoes, busca):
+    """
+    Anota 'relevancia' e ordena pelas mais relevantes
+
+    Transações encontradas apenas pela categoria ficam por último.
+    """
+    termos = termos_busca(busca)
+    conexao = connections[transacoes.db]
+    if not termos or not indice_disponivel(conexao):
+        return transacoes
+
+    return transacoes.annotate(
+        relevancia=_relevancia(termos, conexao)
+    ).order_by(F('relevancia').desc(nulls_last=True), '-data', '-id')
@@ -0,0 +1,285 @@
+"""
+Cache das categorias sugeridas pelo ChatGPT
+
+As sugestões são guardadas em CategorizacaoCache, por (usuario, tipo, hash
+da descrição normalizada), e consultadas em lote antes de montar os
+prompts. Um LRU em memória evita ir ao banco para os estabelecimentos
+mais frequentes do processo.
+"""
+import hashlib
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Count, F
+from django.utils import timezone
+
+from .contadores import Contadores
+from .models import CategorizacaoCache
+
+# Dias que uma sugestão permanece válida
+CATEGORIZACAO_CACHE_DIAS = 90
+
+# Entradas mantidas no LRU em memória (por processo)
+CATEGORIZACAO_CACHE_LRU = 5000
+
+# Entradas mantidas por usuário no banco (as menos usadas são removidas)
+CATEGORIZACAO_CACHE_MAX_POR_USUARIO = 5000
+
+# Chaves por consulta IN na busca em lote
+CACHE_CHUNK_SIZE = 500
+
+PARCELA = re.compile(
+    r'\b(?:parc(?:ela)?\.?\s*)?\d{1,2}\s*(?:/|de)\s*\d{1,2}\b')
+DATA = re.compile(r'\b\d{1,4}[/.-]\d{1,2}(?:[/.-]\d{2,4})?\b')
+HORA = re.compile(r'\b\d{1,2}:\d{2}(?::\d{2})?\b')
+CARTAO_MASCARADO = re.compile(r'[*x#]{2,}[\s*x#]*\d+|[*#]{2,}')
+NUMERO_LONGO = re.compile(r'\b\w*\d{3,}\w*\b')
+NAO_ALFANUMERICO = re.compile(r'[^a-z0-9]+')
+
+
+def normalizar_descricao(descricao):
+    """
+    Reduz a descrição ao nome do estabelecimento
+
+    Remove acentos, datas, horas, números de cartão, identificadores
+    numéricos e sufixos de parcela, de modo que 'UBER *TRIP 12/03' e
+    'Uber *trip 15/04' resultem na mesma chave.
+    """
+    texto = unicodedata.normalize('NFKD', descricao or '')
+    texto = ''.join(c for c in texto if not unicodedata.combining(c)).lower()
+
+    for padrao in (PARCELA, DATA, HORA, CARTAO_MASCARADO, NUMERO_LONGO):
+        texto = padrao.sub(' ', texto)
+
+    return NAO_ALFANUMERICO.sub(' ', texto).strip()[:200]
+
+
+def chave_descricao(normalizada):
+    """Hash da descrição normalizada usado como chave do cache"""
+    return hashlib.sha1(normalizada.encode('utf-8')).hexdigest()
+
+
+def validade_cache():
+    """Tempo que uma sugestão permanece válida"""
+    return timedelta(days=getattr(
+        settings, 'CATEGORIZACAO_CACHE_DIAS', CATEGORIZACAO_CACHE_DIAS))
+
+
+class CacheLRU:
+    """Dicionário limitado que descarta a entrada usada há mais tempo"""
+
+    def __init__(self, tamanho):
+        self.tamanho = tamanho
+        self._dados = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obter(self, chave):
+        with self._lock:
+            valor = self._dados.get(chave)
+            if valor is not None:
+                self._dados.move_to_end(chave)
+            return valor
+
+    def guardar(self, chave, valor):
+        with self._lock:
+            self._dados[chave] = valor
+            self._dados.move_to_end(chave)
+            while len(self._dados) > self.tamanho:
+                self._dados.popitem(last=False)
+
+    def remover(self, chave):
+        with self._lock:
+            self._dados.pop(chave, None)
+
+    def limpar(self):
+        with self._lock:
+            self._dados.clear()
+
+    def __len__(self):
+        return len(self._dados)
+
+
+_lru = CacheLRU(getattr(
+    settings, 'CATEGORIZACAO_CACHE_LRU', CATEGORIZACAO_CACHE_LRU))
+
+# Contadores do processo atual
+_estatisticas = Contadores('acertos_lru', 'acertos_banco', 'falhas')
+
+
+def estatisticas_cache():
+    """
+    Acertos e falhas do cache desde o início do processo
+
+    Returns:
+        dict: Contadores e 'taxa_acerto' (0 a 1)
+    """
+    dados = _estatisticas.valores()
+    consultas = sum(dados.values())
+    acertos = dados['acertos_lru'] + dados['acertos_banco']
+    dados['taxa_acerto'] = acertos / consultas if consultas else 0.0
+    dados['entradas_lru'] = len(_lru)
+    return dados
+
+
+def zerar_cache_memoria():
+    """Esvazia o LRU e os contadores (usado nos testes)"""
+    _lru.limpar()
+    _estatisticas.zerar()
+
+
+def buscar_no_cache(usuario, transacoes):
+    """
+    Procura as sugestões já conhecidas para as transações
+
+    Consulta primeiro o LRU e depois o banco, em lote, apenas para as
+    chaves que faltaram. As entradas encontradas têm acertos e usado_em
+    atualizados com um único UPDATE.
+
+    Args:
+        usuario: Usuário que está importando
+        transacoes: Lista de dicionários com 'descricao' e 'tipo'
+
+    Returns:
+        dict: {indice: (categoria_id, confianca)} das transações encontradas
+    """
+    limite = timezone.now() - validade_cache()
+    encontrados = {}
+    ids_usados = set()
+    pendentes = {}
+
+    for indice, transacao in enumerate(transacoes):
+        chave = (usuario.id, transacao['tipo'],
+                 chave_descricao(normalizar_descricao(transacao['descricao'])))
+        valor = _lru.obter(chave)
+        if valor is not None and valor[3] >= limite:
+            cache_id, categoria_id, confianca, _ = valor
+            encontrados[indice] = (categoria_id, confianca)
+            ids_usados.add(cache_id)
+            _estatisticas.somar(acertos_lru=1)
+        else:
+            pendentes.setdefault(chave, []).append(indice)
+
+    chaves = list({chave[2] for chave in pendentes})
+    for inicio in range(0, len(chaves), CACHE_CHUNK_SIZE):
+        entradas = CategorizacaoCache.objects.filter(
+            usuario=usuario,
+            chave__in=chaves[inicio:inicio + CACHE_CHUNK_SIZE],
+            atualizado_em__gte=limite
+        ).values_list(
+            'id', 'tipo', 'chave', 'categoria_id', 'confianca',
+            'atualizado_em'
+        )
+
+        for cache_id, tipo, chave, categoria_id, confianca, atualizado_em \
+                in entradas:
+            indices = pendentes.pop((usuario.id, tipo, chave), None)
+            if indices is None:
+                continue
+            _lru.guardar((usuario.id, tipo, chave),
+                         (cache_id, categoria_id, confianca, atualizado_em))
+            for indice in indices:
+                encontrados[indice] = (categoria_id, confianca)
+            ids_usados.add(cache_id)
+            _estatisticas.somar(acertos_banco=len(indices))
+
+    _estatisticas.somar(falhas=sum(len(i) for i in pendentes.values()))
+
+    if ids_usados:
+        CategorizacaoCache.objects.filter(id__in=ids_usados).update(
+            acertos=F('acertos') + 1, usado_em=timezone.now())
+
+    return encontrados
+
+
+def gravar_no_cache(usuario, transacoes):
+    """
+    Guarda as sugestões do ChatGPT para as próximas importações
+
+    Apenas as transações categorizadas pelo ChatGPT (com 'confianca_ia')
+    são gravadas; a mesma chave repetida no lote fica com a última sugestão.
+
+    Returns:
+        int: Quantidade de entradas gravadas ou atualizadas
+    """
+    agora = timezone.now()
+    entradas = {}
+
+    for transacao in transacoes:
+        if not transacao.get('melhorada_chatgpt') or \
+                'confianca_ia' not in transacao:
+            continue
+
+        normalizada = normalizar_descricao(transacao['descricao'])
+        if not normalizada:
+            continue
+
+        chave = chave_descricao(normalizada)
+        entradas[(transacao['tipo'], chave)] = CategorizacaoCache(
+            usuario=usuario,
+            tipo=transacao['tipo'],
+            chave=chave,
+            descricao_normalizada=normalizada,
+            categoria_id=transacao['categoria_id'],
+            confianca=transacao['confianca_ia'] or 0,
+            usado_em=agora
+        )
+
+    if not entradas:
+        return 0
+
+    CategorizacaoCache.objects.bulk_create(
+        list(entradas.values()),
+        batch_size=CACHE_CHUNK_SIZE,
+        update_conflicts=True,
+        unique_fields=['usuario', 'tipo', 'chave'],
+        update_fields=[
+            'categoria', 'confianca', 'descricao_normalizada', 'usado_em',
+            'atualizado_em'
+        ]
+    )
+
+    # Entradas expiradas que ainda estejam no LRU são recarregadas do banco
+    for tipo, chave in entradas:
+        _lru.remover((usuario.id, tipo, chave))
+
+    return len(entradas)
+
+
+def limpar_cache_expirado(usuario=None, maximo_por_usuario=None):
+    """
+    Remove as entradas vencidas e, por usuário, as menos usadas acima do limite
+
+    Returns:
+        tuple: (entradas vencidas removidas, entradas excedentes removidas)
+    """
+    maximo_por_usuario = maximo_por_usuario or getattr(
+        settings, 'CATEGORIZACAO_CACHE_MAX_POR_USUARIO',
+        CATEGORIZACAO_CACHE_MAX_POR_USUARIO)
+
+    entradas = CategorizacaoCache.objects.all()
+    if usuario is not None:
+        entradas = entradas.filter(usuario=usuario)
+
+    vencidas, _ = entradas.filter(
+        atualizado_em__lt=timezone.now() - validade_cache()).delete()
+
+    excedentes = 0
+    usuarios = entradas.values('usuario').annotate(
+        total=Count('id')).filter(total__gt=maximo_por_usuario)
+    for item in usuarios:
+        ids = list(
+            entradas.filter(usuario_id=item['usuario'])
+            .order_by('-usado_em')
+            .values_list('id', flat=True)[maximo_por_usuario:]
+        )
+        for inicio in range(0, len(ids), CACHE_CHUNK_SIZE):
+            removidas, _ = CategorizacaoCache.objects.filter(
+                id__in=ids[inicio:inicio + CACHE_CHUNK_SIZE]).delete()
+            excedentes += removidas
+
+    _lru.limpar()
+    return vencidas, excedentes
@@ -0,0 +1,125 @@
+"""
+Categorização automática por palavras-chave, compilada por usuário
+"""
+import re
+from .models import Categoria
+
+# Palavras-chave para categorização automática, em ordem de prioridade
+PALAVRAS_CHAVE = {
+    'Alimentação': ['supermercado', 'mercado', 'padaria', 'restaurante', 'lanchonete', 'delivery', 'ifood'],
+    'Transporte': ['combustivel', 'gasolina', 'uber', '99', 'taxi', 'onibus', 'metro', 'posto'],
+    'Saúde': ['farmacia', 'hospital', 'clinica', 'medico', 'consulta', 'drogaria'],
+    'Lazer': ['cinema', 'show', 'teatro', 'parque', 'viagem', 'netflix', 'spotify'],
+    'Moradia': ['condominio', 'agua', 'luz', 'gas', 'telefone', 'internet', 'aluguel'],
+    'Salário': ['salario', 'ordenado', 'pagamento', 'vencimento'],
+    'Educação': ['escola', 'faculdade', 'curso', 'livro', 'material escolar'],
+}
+
+CATEGORIAS_PADRAO = {
+    'DESPESA': 'Outras Despesas',
+    'RECEITA': 'Outras Receitas',
+}
+
+
+class CategorizadorAutomatico:
+    """
+    Classifica descrições nas categorias ativas de um usuário
+
+    As categorias são carregadas uma única vez e todas as palavras-chave de
+    cada tipo são compiladas em uma única expressão regular, de modo que cada
+    descrição é classificada em uma passada, sem consultas ao banco. Cada
+    importação cria o seu e o repassa adiante, para que alterações nas
+    categorias valham a partir da importação seguinte.
+    """
+
+    def __init__(self, usuario):
+        self.usuario = usuario
+        self._padroes = {}
+        self._outros = {}
+        self._padrao_criada = {}
+
+        categorias = list(
+            Categoria.objects.filter(usuario=usuario, ativa=True)
+            .order_by('id')
+        )
+
+        for tipo, _ in Categoria.TIPOS_CATEGORIA:
+            do_tipo = [c for c in categorias if c.tipo == tipo]
+            self._padroes[tipo] = self._compilar(do_tipo)
+            self._outros[tipo] = next(
+                (c for c in do_tipo if 'outros' in c.nome.lower()), None)
+
+    @staticmethod
+    def _compilar(categorias):
+        """
+        Compila as palavras-chave cujas categorias existem para o usuário
+
+        Returns:
+            tuple: (regex, {palavra: (prioridade, categoria)}) ou None
+        """
+        palavras = {}
+
+        for prioridade, (nome, lista) in enumerate(PALAVRAS_CHAVE.items()):
+            nome_lower = nome.lower()
+            categoria = next(
+                (c for c in categorias if c.nome.lower() == nome_lower), None)
+            if categoria is None:
+                # Tenta buscar com nomes similares
+                categoria = next(
+                    (c for c in categorias if nome_lower in c.nome.lower()),
+                    None)
+            if categoria is None:
+                continue
+
+            for palavra in lista:
+                palavras.setdefault(palavra, (prioridade, categoria))
+
+        if not palavras:
+            return None
+
+        # O lookahead encontra palavras sobrepostas; a alternância segue a
+        # ordem de prioridade para palavras que começam na mesma posição
+        ordenadas = sorted(palavras, key=lambda p: palavras[p][0])
+        regex = re.compile(
+            '(?=(' + '|'.join(re.escape(p) for p in ordenadas) + '))')
+        return regex, palavras
+
+    def categorizar(self, descricao, tipo):
+        """
+        Retorna a categoria mais adequada para a descrição
+
+        Args:
+            descricao: Descrição da transação
+            tipo: Tipo da transação (RECEITA/DESPESA)
+
+        Returns:
+            Categoria: Categoria encontrada ou categoria padrão
+        """
+        padrao = self._padroes.get(tipo)
+
+        if padrao:
+            regex, palavras = padrao
+            encontradas = [
+                palavras[m.group(1)] for m in regex.finditer(descricao.lower())
+            ]
+            if encontradas:
+                return min(encontradas, key=lambda p: p[0])[1]
+
+        return self.categoria_padrao(tipo)
+
+    def categoria_padrao(self, tipo):
+        """Retorna a categoria "Outros" do tipo, criando-a se necessário"""
+        if self._outros.get(tipo):
+            return self._outros[tipo]
+
+        if tipo not in self._padrao_criada:
+            categoria, created = Categoria.objects.get_or_create(
+                nome=CATEGORIAS_PADRAO.get(tipo, CATEGORIAS_PADRAO['RECEITA']),
+                tipo=tipo,
+                usuario=self.usuario,
+                defaults={'ativa': True, 'cor': '#6c757d'}
+            )
+            self._padrao_criada[tipo] = categoria
+
+        return self._padrao_criada[tipo]
+
@@ -1,13 +1,53 @@
 """
 Serviço para integração com ChatGPT para categorização de transações
 """
+import asyncio
 import json
 import logging
+import random
+import time
 from django.conf import settings
+from .cache_categorizacao import (
+    buscar_no_cache, estatisticas_cache, gravar_no_cache
+)
+from .classificador import classificar_com_modelo
+from .contadores import Contadores
 from .models import Categoria
+from .prompt_categorizacao import (
+    MENSAGEM_SISTEMA, dividir_faltantes, interpretar_resposta, montar_lotes
+)
 
 logger = logging.getLogger(__name__)
 
+# Padrões do modo assíncrono (sobrescritos pelo settings)
+CHATGPT_CONCORRENCIA = 4
+CHATGPT_REQUISICOES_POR_MINUTO = 60
+CHATGPT_MAX_TENTATIVAS = 4
+CHATGPT_ESPERA_BASE = 1.0
+
+# Regras específicas melhoradas usadas sem o ChatGPT
+REGRAS_MELHORADAS = {
+    'DESPESA': {
+        'mercado': ['supermercado', 'mercado', 'emporio', 'atacadao', 'extra', 'carrefour', 'pao de acucar'],
+        'combustivel': ['posto', 'gasolina', 'etanol', 'diesel', 'shell', 'petrobras', 'ipiranga'],
+        'farmacia': ['farmacia', 'drogaria', 'drogasil', 'pacheco', 'ultrafarma'],
+        'restaurante': ['restaurante', 'lanchonete', 'pizzaria', 'hamburger', 'mcdonald', 'burger king'],
+        'transporte': ['uber', '99', 'taxi', 'onibus', 'metro', 'trem', 'pedagio'],
+        'saude': ['hospital', 'clinica', 'laboratorio', 'exame', 'consulta', 'medico'],
+        'educacao': ['escola', 'faculdade', 'universidade', 'curso', 'aula', 'mensalidade'],
+        'lazer': ['cinema', 'teatro', 'show', 'parque', 'netflix', 'spotify', 'amazon prime'],
+        'moradia': ['condominio', 'aluguel', 'iptu', 'agua', 'luz', 'gas', 'internet', 'telefone'],
+        'vestuario': ['loja', 'roupa', 'calcado', 'sapato', 'tenis', 'camisa', 'vestido'],
+        'tecnologia': ['informatica', 'computador', 'celular', 'tablet', 'software', 'hardware']
+    },
+    'RECEITA': {
+        'salario': ['salario', 'ordenado', 'pagamento', 'vencimento', 'folha'],
+        'freelance': ['freelance', 'consultoria', 'servico', 'trabalho extra'],
+        'investimento': ['dividendo', 'juros', 'rendimento', 'aplicacao', 'poupanca'],
+        'venda': ['venda', 'comissao', 'bonificacao', 'premio']
+    }
+}
+
 # Importação condicional do OpenAI
 try:
     import openai
@@ -18,13 +58,18 @@ except ImportError:
         "OpenAI library not installed. ChatGPT integration disabled.")
 
 
-def categorizar_transacoes_chatgpt(transacoes, usuario):
+def categorizar_transacoes_chatgpt(transacoes, usuario, consumo=None):
     """
     Usa ChatGPT para melhorar a categorização das transações
 
+    O classificador treinado com o histórico do usuário é aplicado antes;
+    apenas as transações em que ele tem pouca confiança seguem para o
+    cache/ChatGPT ou para as regras locais.
+
     Args:
         transacoes: Lista de transações para categorizar
         usuario: Usuário proprietário das transações
+        consumo: ConsumoChatGPT que acumula requisições e tokens (opcional)
 
     Returns:
         list: Lista de transações com categorias melhoradas
@@ -35,159 +80,396 @@ def categorizar_transacoes_chatgpt(transacoes, usuario):
         ativa=True
     ).values('id', 'nome', 'tipo', 'cor'))
 
+    # As funções abaixo alteram os próprios dicionários das transações
+    pendentes = classificar_com_modelo(usuario, transacoes, categorias_usuario)
+    if not pendentes:
+        return transacoes
+
     # Verifica se ChatGPT está habilitado e disponível
     if (settings.CHATGPT_ENABLED and OPENAI_AVAILABLE and
             settings.OPENAI_API_KEY):
         try:
-            transacoes = categorizar_com_chatgpt_real(
-                transacoes, categorias_usuario)
+            categorizar_com_cache(
+                pendentes, usuario, categorias_usuario, consumo)
             logger.info(
-                f"ChatGPT categorization completed for {len(transacoes)} transactions")
+                f"ChatGPT categorization completed for {len(pendentes)} transactions")
         except Exception as e:
             logger.error(f"ChatGPT categorization failed: {str(e)}")
             # Fallback para categorização local
-            transacoes = categorizar_com_regras_locais(
-                transacoes, categorias_usuario)
+            categorizar_com_regras_locais(pendentes, categorias_usuario)
     else:
         # Usa categorização local melhorada
-        transacoes = categorizar_com_regras_locais(
-            transacoes, categorias_usuario)
+        categorizar_com_regras_locais(pendentes, categorias_usuario)
 
     return transacoes
 
 
-def categorizar_com_chatgpt_real(transacoes, categorias_usuario):
+def categorizar_com_cache(transacoes, usuario, categorias_usuario,
+                          consumo=None):
+    """
+    Aplica as sugestões já conhecidas e envia ao ChatGPT apenas o restante
+
+    As sugestões novas do ChatGPT são gravadas no cache para as próximas
+    importações.
+    """
+    categorias_map = {cat['id']: cat for cat in categorias_usuario}
+    encontrados = buscar_no_cache(usuario, transacoes)
+
+    pendentes = []
+    for indice, transacao in enumerate(transacoes):
+        sugestao = encontrados.get(indice)
+        categoria = categorias_map.get(sugestao[0]) if sugestao else None
+        if categoria is None:
+            # Sem sugestão ou categoria desativada desde então
+            pendentes.append(transacao)
+            continue
+
+        transacao['categoria_id'] = categoria['id']
+        transacao['categoria_nome'] = categoria['nome']
+        transacao['categoria_cor'] = categoria['cor']
+        transacao['melhorada_chatgpt'] = True
+        transacao['confianca_ia'] = sugestao[1]
+
+    if pendentes:
+        # As funções abaixo alteram os próprios dicionários das transações
+        if usar_modo_assincrono():
+            asyncio.run(categorizar_com_chatgpt_async(
+                pendentes, categorias_usuario, consumo=consumo))
+        else:
+            categorizar_com_chatgpt_real(
+                pendentes, categorias_usuario, consumo=consumo)
+        gravar_no_cache(usuario, pendentes)
+
+    estatisticas = estatisticas_cache()
+    logger.info(
+        f"Categorization cache: {len(transacoes) - len(pendentes)} hits, "
+        f"{len(pendentes)} sent to ChatGPT "
+        f"(process hit rate {estatisticas['taxa_acerto']:.0%})")
+
+    return transacoes
+
+
+def usar_modo_assincrono():
+    """
+    Indica se os lotes podem ser enviados em paralelo com asyncio
+
+    asyncio.run() não pode ser chamado de dentro de um event loop já em
+    execução (ex.: view assíncrona); nesse caso usa o modo sequencial.
+    """
+    if not getattr(settings, 'CHATGPT_ASYNC', True):
+        return False
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return True
+    return False
+
+
+# Contadores do processo atual (todas as importações)
+_estatisticas = Contadores(
+    'lotes', 'lotes_com_falha', 'requisicoes', 'tokens_prompt',
+    'tokens_resposta')
+
+
+def estatisticas_chatgpt():
+    """Lotes enviados, falhas e consumo do ChatGPT desde o início do processo"""
+    return _estatisticas.valores()
+
+
+def zerar_estatisticas_chatgpt():
+    """Zera os contadores (usado nos testes)"""
+    _estatisticas.zerar()
+
+
+class ConsumoChatGPT:
+    """Requisições e tokens gastos com o ChatGPT durante uma importação"""
+
+    def __init__(self, requisicoes=0, tokens_prompt=0, tokens_resposta=0):
+        self.requisicoes = requisicoes
+        self.tokens_prompt = tokens_prompt
+        self.tokens_resposta = tokens_resposta
+
+    def registrar(self, response):
+        """Soma o uso informado pela resposta da API"""
+        self.requisicoes += 1
+        _estatisticas.somar(requisicoes=1)
+        uso = getattr(response, 'usage', None)
+        if uso is not None:
+            tokens_prompt = getattr(uso, 'prompt_tokens', 0) or 0
+            tokens_resposta = getattr(uso, 'completion_tokens', 0) or 0
+            self.tokens_prompt += tokens_prompt
+            self.tokens_resposta += tokens_resposta
+            _estatisticas.somar(
+                tokens_prompt=tokens_prompt, tokens_resposta=tokens_resposta)
+
+    def como_dict(self):
+        return {
+            'requisicoes': self.requisicoes,
+            'tokens_prompt': self.tokens_prompt,
+            'tokens_resposta': self.tokens_resposta,
+        }
+
+
+def parametros_requisicao(lote):
+    """Argumentos de chat.completions.create para um lote"""
+    return {
+        'model': settings.CHATGPT_MODEL,
+        'messages': [
+            {
+                "role": "system",
+                "content": MENSAGEM_SISTEMA
+            },
+            {
+                "role": "user",
+                "content": lote.prompt
+            }
+        ],
+        'max_tokens': lote.max_tokens,
+        'temperature': settings.CHATGPT_TEMPERATURE,
+        'response_format': {"type": "json_object"}
+    }
+
+
+def aplicar_resposta(lote, response, categorias_usuario):
+    """
+    Aplica a resposta do ChatGPT às transações do lote
+
+    Returns:
+        list: Novos lotes com as transações que faltaram na resposta
+    """
+    escolha = response.choices[0]
+    respostas, faltantes = interpretar_resposta(lote, escolha.message.content)
+
+    for posicao, (categoria, confianca) in respostas.items():
+        transacao = lote.transacoes[posicao]
+        if categoria is None:
+            # Mantém categoria original se não encontrou sugestão válida
+            transacao['melhorada_chatgpt'] = False
+            transacao['confianca_ia'] = 0.0
+            continue
+
+        transacao['categoria_id'] = categoria['id']
+        transacao['categoria_nome'] = categoria['nome']
+        transacao['categoria_cor'] = categoria['cor']
+        transacao['melhorada_chatgpt'] = True
+        transacao['confianca_ia'] = confianca
+
+    if not faltantes:
+        return []
+
+    logger.warning(
+        f"Incomplete ChatGPT response ({len(faltantes)} of {len(lote)} "
+        f"missing, finish_reason={getattr(escolha, 'finish_reason', None)})")
+
+    novos = dividir_faltantes(lote, faltantes, categorias_usuario)
+    if not novos:
+        categorizar_com_regras_locais(faltantes, categorias_usuario)
+    return novos
+
+
+def categorizar_com_chatgpt_real(transacoes, categorias_usuario, consumo=None,
+                                 max_linhas=None):
     """
     Implementação real da categorização usando ChatGPT
     """
     # Configura o cliente OpenAI
     client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
+    consumo = consumo if consumo is not None else ConsumoChatGPT()
 
-    # Prepara dados para o ChatGPT
-    categorias_por_tipo = {}
-    for cat in categorias_usuario:
-        tipo = cat['tipo']
-        if tipo not in categorias_por_tipo:
-            categorias_por_tipo[tipo] = []
-        categorias_por_tipo[tipo].append({
-            'id': cat['id'],
-            'nome': cat['nome']
-        })
-
-    # Processa transações em lotes (máximo 10 por vez)
-    batch_size = 10
-    transacoes_processadas = []
+    # Lotes de um tipo cada, dentro do orçamento de tokens
+    fila, sem_categoria = montar_lotes(
+        transacoes, categorias_usuario, max_linhas=max_linhas)
+    categorizar_com_regras_locais(sem_categoria, categorias_usuario)
 
-    for i in range(0, len(transacoes), batch_size):
-        batch = transacoes[i:i + batch_size]
-
-        # Prepara prompt para o lote
-        prompt = criar_prompt_categorizacao(batch, categorias_por_tipo)
+    numero = 0
+    while fila:
+        lote = fila.pop(0)
+        numero += 1
+        _estatisticas.somar(lotes=1)
 
         try:
             # Chama ChatGPT
             response = client.chat.completions.create(
-                model=settings.CHATGPT_MODEL,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "Você é um assistente especializado em categorização de transações financeiras. Analise cada transação e sugira a categoria mais apropriada baseada na descrição e no tipo (receita/despesa)."
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                max_tokens=settings.CHATGPT_MAX_TOKENS,
-                temperature=settings.CHATGPT_TEMPERATURE,
-                response_format={"type": "json_object"}
-            )
-
-            # Processa resposta
-            resultado = json.loads(response.choices[0].message.content)
-            batch_processado = aplicar_categorizacao_chatgpt(
-                batch, resultado, categorias_usuario)
-            transacoes_processadas.extend(batch_processado)
+                **parametros_requisicao(lote))
+            consumo.registrar(response)
+
+            # Processa resposta; o que faltar volta para a fila
+            fila.extend(aplicar_resposta(lote, response, categorias_usuario))
 
         except Exception as e:
-            logger.error(
-                f"Error processing batch {i//batch_size + 1}: {str(e)}")
+            logger.error(f"Error processing batch {numero}: {str(e)}")
+            _estatisticas.somar(lotes_com_falha=1)
             # Fallback para regras locais neste lote
-            batch_local = categorizar_com_regras_locais(
-                batch, categorias_usuario)
-            transacoes_processadas.extend(batch_local)
+            categorizar_com_regras_locais(lote.transacoes, categorias_usuario)
 
-    return transacoes_processadas
+    return transacoes
 
 
-def criar_prompt_categorizacao(transacoes, categorias_por_tipo):
-    """
-    Cria o prompt para enviar ao ChatGPT
+class LimitadorTaxa:
     """
-    prompt = """
-Analise as seguintes transações financeiras e sugira a categoria mais apropriada para cada uma.
-
-CATEGORIAS DISPONÍVEIS:
-"""
+    Token bucket para as requisições ao ChatGPT
 
-    for tipo, categorias in categorias_por_tipo.items():
-        prompt += f"\n{tipo}:\n"
-        for cat in categorias:
-            prompt += f"  - {cat['nome']} (ID: {cat['id']})\n"
-
-    prompt += "\nTRANSAÇÕES PARA CATEGORIZAR:\n"
-
-    for i, transacao in enumerate(transacoes):
-        prompt += f"{i+1}. Descrição: '{transacao['descricao']}', Tipo: {transacao['tipo']}, Valor: R$ {transacao['valor']:.2f}\n"
-
-    prompt += """
-INSTRUÇÕES:
-- Para cada transação, retorne apenas o ID da categoria mais apropriada
-- Se não houver categoria adequada, retorne null
-- Considere o contexto brasileiro (nomes de empresas, bancos, etc.)
-- Seja preciso na categorização baseada na descrição
-
-Responda no formato JSON:
-{
-  "categorizacoes": [
-    {"transacao_index": 0, "categoria_id": 123, "confianca": 0.95},
-    {"transacao_index": 1, "categoria_id": null, "confianca": 0.0}
-  ]
-}
-"""
-
-    return prompt
+    Permite rajadas de até `capacidade` requisições e repõe `taxa` fichas
+    por segundo; cada requisição consome uma ficha.
+    """
 
+    def __init__(self, taxa, capacidade=None):
+        self.taxa = taxa
+        self.capacidade = capacidade or max(1, taxa)
+        self.fichas = self.capacidade
+        self.atualizado = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def aguardar(self):
+        """Espera até haver uma ficha disponível e a consome"""
+        async with self._lock:
+            while True:
+                agora = time.monotonic()
+                self.fichas = min(
+                    self.capacidade,
+                    self.fichas + (agora - self.atualizado) * self.taxa
+                )
+                self.atualizado = agora
+
+                if self.fichas >= 1:
+                    self.fichas -= 1
+                    return
+
+                await asyncio.sleep((1 - self.fichas) / self.taxa)
+
+
+def tempo_de_espera(erro, tentativa, espera_base):
+    """Backoff exponencial com jitter, respeitando o Retry-After do 429"""
+    resposta = getattr(erro, 'response', None)
+    retry_after = resposta.headers.get('retry-after') if resposta is not None else None
+    try:
+        if retry_after is not None:
+            return float(retry_after)
+    except ValueError:
+        pass
+    return espera_base * (2 ** tentativa) * (1 + random.random() / 2)
+
+
+async def categorizar_lote_async(client, lote, numero, categorias_usuario,
+                                 semaforo, limitador, max_tentativas,
+                                 espera_base, consumo):
+    """
+    Categoriza um lote, repetindo em caso de 429
 
-def aplicar_categorizacao_chatgpt(transacoes, resultado_chatgpt, categorias_usuario):
+    Qualquer outra falha, ou o esgotamento das tentativas, aplica as regras
+    locais somente a este lote. As transações que faltarem na resposta são
+    reenviadas em lotes menores, fora do semáforo.
     """
-    Aplica as categorizações sugeridas pelo ChatGPT
+    response = None
+    _estatisticas.somar(lotes=1)
+
+    async with semaforo:
+        for tentativa in range(max_tentativas):
+            await limitador.aguardar()
+            try:
+                response = await client.chat.completions.create(
+                    **parametros_requisicao(lote))
+                consumo.registrar(response)
+                break
+
+            except openai.RateLimitError as e:
+                if tentativa + 1 >= max_tentativas:
+                    logger.error(
+                        f"Batch {numero}: rate limit after {max_tentativas} attempts")
+                    break
+                espera = tempo_de_espera(e, tentativa, espera_base)
+                logger.warning(
+                    f"Batch {numero}: rate limited, retrying in {espera:.1f}s")
+                await asyncio.sleep(espera)
+
+            except Exception as e:
+                logger.error(f"Error processing batch {numero}: {str(e)}")
+                break
+
+    if response is None:
+        _estatisticas.somar(lotes_com_falha=1)
+        # Fallback para regras locais neste lote
+        categorizar_com_regras_locais(lote.transacoes, categorias_usuario)
+        return
+
+    try:
+        novos = aplicar_resposta(lote, response, categorias_usuario)
+    except Exception as e:
+        logger.error(f"Error processing batch {numero}: {str(e)}")
+        _estatisticas.somar(lotes_com_falha=1)
+        categorizar_com_regras_locais(lote.transacoes, categorias_usuario)
+        return
+
+    await asyncio.gather(*(
+        categorizar_lote_async(
+            client, novo, f'{numero}.{i}', categorias_usuario, semaforo,
+            limitador, max_tentativas, espera_base, consumo)
+        for i, novo in enumerate(novos, start=1)
+    ))
+
+
+async def categorizar_com_chatgpt_async(transacoes, categorias_usuario,
+                                        client=None, concorrencia=None,
+                                        requisicoes_por_minuto=None,
+                                        max_tentativas=None,
+                                        espera_base=None, consumo=None,
+                                        max_linhas=None):
     """
-    # Cria mapa de categorias por ID para busca rápida
-    categorias_map = {cat['id']: cat for cat in categorias_usuario}
+    Categoriza as transações enviando os lotes ao ChatGPT em paralelo
 
-    # Aplica categorizações
-    for item in resultado_chatgpt.get('categorizacoes', []):
-        try:
-            idx = item['transacao_index']
-            categoria_id = item['categoria_id']
-            confianca = item.get('confianca', 0.0)
-
-            if 0 <= idx < len(transacoes) and categoria_id in categorias_map:
-                categoria = categorias_map[categoria_id]
-                transacoes[idx]['categoria_id'] = categoria['id']
-                transacoes[idx]['categoria_nome'] = categoria['nome']
-                transacoes[idx]['categoria_cor'] = categoria['cor']
-                transacoes[idx]['melhorada_chatgpt'] = True
-                transacoes[idx]['confianca_ia'] = confianca
-            else:
-                # Mantém categoria original se não encontrou sugestão válida
-                transacoes[idx]['melhorada_chatgpt'] = False
-                transacoes[idx]['confianca_ia'] = 0.0
-
-        except (KeyError, IndexError, TypeError) as e:
-            logger.error(f"Error applying ChatGPT categorization: {str(e)}")
-            continue
+    Args:
+        transacoes: Lista de transações para categorizar
+        categorias_usuario: Categorias do usuário (id, nome, tipo, cor)
+        client: Cliente compatível com openai.AsyncOpenAI (opcional)
+        concorrencia: Requisições simultâneas (padrão: CHATGPT_CONCORRENCIA)
+        requisicoes_por_minuto: Limite do token bucket
+        max_tentativas: Tentativas por lote em caso de 429
+        espera_base: Segundos do primeiro backoff
+        consumo: ConsumoChatGPT que acumula requisições e tokens
+        max_linhas: Transações por lote (padrão: CHATGPT_MAX_LINHAS_LOTE)
+
+    Returns:
+        list: Transações categorizadas, na ordem original
+    """
+    concorrencia = concorrencia or getattr(
+        settings, 'CHATGPT_CONCORRENCIA', CHATGPT_CONCORRENCIA)
+    requisicoes_por_minuto = requisicoes_por_minuto or getattr(
+        settings, 'CHATGPT_REQUISICOES_POR_MINUTO',
+        CHATGPT_REQUISICOES_POR_MINUTO)
+    max_tentativas = max_tentativas or getattr(
+        settings, 'CHATGPT_MAX_TENTATIVAS', CHATGPT_MAX_TENTATIVAS)
+    if espera_base is None:
+        espera_base = CHATGPT_ESPERA_BASE
+    if consumo is None:
+        consumo = ConsumoChatGPT()
+
+    lotes, sem_categoria = montar_lotes(
+        transacoes, categorias_usuario, max_linhas=max_linhas)
+    categorizar_com_regras_locais(sem_categoria, categorias_usuario)
+    if not lotes:
+        return transacoes
+
+    cliente_proprio = client is None
+    if cliente_proprio:
+        # As repetições ficam a cargo do backoff abaixo
+        client = openai.AsyncOpenAI(
+            api_key=settings.OPENAI_API_KEY, max_retries=0)
+
+    semaforo = asyncio.Semaphore(concorrencia)
+    limitador = LimitadorTaxa(
+        requisicoes_por_minuto / 60, capacidade=concorrencia)
+
+    try:
+        # As transações são alteradas nos próprios dicionários
+        await asyncio.gather(*(
+            categorizar_lote_async(
+                client, lote, numero, categorias_usuario, semaforo,
+                limitador, max_tentativas, espera_base, consumo)
+            for numero, lote in enumerate(lotes, start=1)
+        ))
+    finally:
+        if cliente_proprio:
+            await client.close()
 
     return transacoes
 
@@ -196,71 +478,58 @@ def categorizar_com_regras_locais(transacoes, categorias_usuario):
     """
     Categorização usando regras locais melhoradas (fallback)
     """
+    regras = mapear_regras_locais(categorias_usuario)
     for transacao in transacoes:
-        transacao = melhorar_categorizacao_local(transacao, categorias_usuario)
+        transacao = melhorar_categorizacao_local(
+            transacao, categorias_usuario, regras)
 
     return transacoes
 
 
-def melhorar_categorizacao_local(transacao, categorias_usuario):
+def mapear_regras_locais(categorias_usuario):
+    """
+    Associa cada grupo de REGRAS_MELHORADAS à categoria do usuário
+
+    Feito uma vez por lote, em vez de percorrer as categorias para cada
+    palavra encontrada.
+
+    Returns:
+        dict: {tipo: [(palavras, categoria), ...]} na ordem das regras
+    """
+    regras = {}
+    for tipo, grupos in REGRAS_MELHORADAS.items():
+        regras[tipo] = []
+        for categoria_chave, palavras_chave in grupos.items():
+            categoria = next((
+                cat for cat in categorias_usuario
+                if cat['tipo'] == tipo and (
+                    categoria_chave in cat['nome'].lower() or
+                    cat['nome'].lower() in categoria_chave)
+            ), None)
+            if categoria is not None:
+                regras[tipo].append((palavras_chave, categoria))
+
+    return regras
+
+
+def melhorar_categorizacao_local(transacao, categorias_usuario, regras=None):
     """
     Aplica regras locais melhoradas para categorização
     """
+    if regras is None:
+        regras = mapear_regras_locais(categorias_usuario)
+
     descricao = transacao['descricao'].lower()
-    tipo = transacao['tipo']
-
-    # Regras específicas melhoradas
-    regras_melhoradas = {
-        'DESPESA': {
-            'mercado': ['supermercado', 'mercado', 'emporio', 'atacadao', 'extra', 'carrefour', 'pao de acucar'],
-            'combustivel': ['posto', 'gasolina', 'etanol', 'diesel', 'shell', 'petrobras', 'ipiranga'],
-            'farmacia': ['farmacia', 'drogaria', 'drogasil', 'pacheco', 'ultrafarma'],
-            'restaurante': ['restaurante', 'lanchonete', 'pizzaria', 'hamburger', 'mcdonald', 'burger king'],
-            'transporte': ['uber', '99', 'taxi', 'onibus', 'metro', 'trem', 'pedagio'],
-            'saude': ['hospital', 'clinica', 'laboratorio', 'exame', 'consulta', 'medico'],
-            'educacao': ['escola', 'faculdade', 'universidade', 'curso', 'aula', 'mensalidade'],
-            'lazer': ['cinema', 'teatro', 'show', 'parque', 'netflix', 'spotify', 'amazon prime'],
-            'moradia': ['condominio', 'aluguel', 'iptu', 'agua', 'luz', 'gas', 'internet', 'telefone'],
-            'vestuario': ['loja', 'roupa', 'calcado', 'sapato', 'tenis', 'camisa', 'vestido'],
-            'tecnologia': ['informatica', 'computador', 'celular', 'tablet', 'software', 'hardware']
-        },
-        'RECEITA': {
-            'salario': ['salario', 'ordenado', 'pagamento', 'vencimento', 'folha'],
-            'freelance': ['freelance', 'consultoria', 'servico', 'trabalho extra'],
-            'investimento': ['dividendo', 'juros', 'rendimento', 'aplicacao', 'poupanca'],
-            'venda': ['venda', 'comissao', 'bonificacao', 'premio']
-        }
-    }
 
     # Tenta encontrar melhor categoria baseada nas regras
-    if tipo in regras_melhoradas:
-        for categoria_chave, palavras_chave in regras_melhoradas[tipo].items():
-            for palavra in palavras_chave:
-                if palavra in descricao:
-                    # Procura categoria correspondente do usuário
-                    for cat in categorias_usuario:
-                        if (categoria_chave.lower() in cat['nome'].lower() or
-                                cat['nome'].lower() in categoria_chave.lower()) and cat['tipo'] == tipo:
-                            transacao['categoria_id'] = cat['id']
-                            transacao['categoria_nome'] = cat['nome']
-                            transacao['categoria_cor'] = cat['cor']
-                            transacao['melhorada_chatgpt'] = True
-                            return transacao
+    for palavras_chave, cat in regras.get(transacao['tipo'], []):
+        if any(palavra in descricao for palavra in palavras_chave):
+            transacao['categoria_id'] = cat['id']
+            transacao['categoria_nome'] = cat['nome']
+            transacao['categoria_cor'] = cat['cor']
+            transacao['melhorada_chatgpt'] = True
+            return transacao
 
     # Adiciona flag indicando que não foi melhorada
     transacao['melhorada_chatgpt'] = False
     return transacao
-
-
-def implementar_chatgpt_real():
-    """
-    TODO: Implementar integração real com ChatGPT
-
-    Passos futuros:
-    1. Configurar API key do OpenAI
-    2. Criar prompt otimizado para categorização
-    3. Enviar lote de transações para análise
-    4. Processar resposta e aplicar categorizações
-    5. Implementar cache para evitar re-processar mesmas transações
-    """
-    pass
@@ -0,0 +1,328 @@
+"""
+Classificador de categorias aprendido com o histórico de cada usuário
+
+Naive Bayes multinomial sobre as palavras e os trigramas de caracteres da
+descrição normalizada, reduzidos por hash (crc32) a um espaço fixo. Como o
+modelo guarda apenas contagens, as transações de cada importação são
+somadas ao modelo existente sem reprocessar o histórico; o treino completo
+(comando treinar_classificador) incorpora também as categorias corrigidas
+manualmente.
+
+O modelo fica serializado em ClassificadorCategoria (JSON compactado), um
+por usuário. Na importação ele classifica cada transação do preview e só
+as com confiança abaixo do limite seguem para o cache e o ChatGPT.
+"""
+import json
+import logging
+import math
+import zlib
+from collections import Counter
+
+from django.conf import settings
+from django.db.models import Q
+
+from .cache_categorizacao import normalizar_descricao
+from .categorizacao import CATEGORIAS_PADRAO
+from .models import Categoria, ClassificadorCategoria, Transacao
+
+logger = logging.getLogger(__name__)
+
+# Tamanho do espaço das características após o hash
+CLASSIFICADOR_DIMENSOES = 2 ** 18
+
+# Probabilidade mínima para aceitar a categoria prevista
+CLASSIFICADOR_CONFIANCA_MINIMA = 0.9
+
+# Transações de treino necessárias antes de usar o modelo
+CLASSIFICADOR_MINIMO_EXEMPLOS = 30
+
+# Suavização de Laplace/Lidstone das contagens
+CLASSIFICADOR_SUAVIZACAO = 0.5
+
+# Transações lidas por vez durante o treino
+TREINO_CHUNK_SIZE = 2000
+
+
+def _hash(item):
+    return zlib.crc32(item.encode('utf-8')) % CLASSIFICADOR_DIMENSOES
+
+
+def caracteristicas(normalizada):
+    """
+    Características da descrição normalizada
+
+    Returns:
+        tuple: (hashes das palavras, Counter de todas as características)
+    """
+    palavras = [_hash(f'p:{p}') for p in normalizada.split()]
+    contagem = Counter(palavras)
+
+    for palavra in normalizada.split():
+        texto = f' {palavra} '
+        contagem.update(
+            _hash(f't:{texto[i:i + 3]}') for i in range(len(texto) - 2))
+
+    return palavras, contagem
+
+
+class NaiveBayes:
+    """
+    Naive Bayes multinomial com contagens esparsas por categoria
+
+    Cada classe guarda [documentos, total de características, contagens].
+    """
+
+    VERSAO = 1
+
+    def __init__(self):
+        self.classes = {}
+        self.exemplos = 0
+
+    def adicionar(self, categoria_id, descricao):
+        """Soma uma transação rotulada às contagens do modelo"""
+        normalizada = normalizar_descricao(descricao)
+        if not normalizada:
+            return False
+
+        _, contagem = caracteristicas(normalizada)
+        classe = self.classes.setdefault(categoria_id, [0, 0, Counter()])
+        classe[0] += 1
+        classe[1] += sum(contagem.values())
+        classe[2].update(contagem)
+        self.exemplos += 1
+        return True
+
+    def prever(self, itens, suavizacao=CLASSIFICADOR_SUAVIZACAO):
+        """
+        Classifica cada descrição
+
+        A pontuação é um laço em Python por descrição e característica (não
+        é vetorizada); os termos que dependem apenas da classe são
+        calculados uma vez por chamada, e descrições repetidas são
+        classificadas uma única vez.
+
+        Args:
+            itens: Lista de tuplas (descricao, categorias candidatas)
+
+        Returns:
+            list: Tuplas (categoria_id, probabilidade); (None, 0.0) quando
+            nenhuma candidata foi vista no treino
+        """
+        if not self.classes:
+            return [(None, 0.0)] * len(itens)
+
+        vocabulario = len(set().union(
+            *(classe[2].keys() for classe in self.classes.values())))
+        log_total = math.log(self.exemplos)
+        termos = {
+            categoria_id: (
+                math.log(documentos) - log_total,
+                math.log(total + suavizacao * vocabulario)
+            )
+            for categoria_id, (documentos, total, _) in self.classes.items()
+        }
+
+        resultados = []
+        memoria = {}
+        for descricao, candidatas in itens:
+            normalizada = normalizar_descricao(descricao)
+            chave = (normalizada, tuple(candidatas))
+            if chave not in memoria:
+                memoria[chave] = self._prever(
+                    normalizada, candidatas, termos, suavizacao)
+            resultados.append(memoria[chave])
+
+        return resultados
+
+    def _prever(self, normalizada, candidatas, termos, suavizacao):
+        candidatas = [c for c in candidatas if c in self.classes]
+        if not normalizada or not candidatas:
+            return None, 0.0
+
+        palavras, contagem = caracteristicas(normalizada)
+        quantidade = sum(contagem.values())
+
+        pontuacoes = {}
+        for categoria_id in candidatas:
+            log_prior, log_denominador = termos[categoria_id]
+            contagens = self.classes[categoria_id][2]
+            pontuacoes[categoria_id] = (
+                log_prior
+                - quantidade * log_denominador
+                + sum(n * math.log(contagens.get(h, 0) + suavizacao)
+                      for h, n in contagem.items())
+            )
+
+        melhor = max(pontuacoes, key=pontuacoes.get)
+
+        # Sem nenhuma palavra conhecida a decisão viria só dos trigramas e da
+        # frequência da categoria, o que não justifica dispensar o ChatGPT
+        if not any(h in self.classes[melhor][2] for h in palavras):
+            return melhor, 0.0
+
+        maximo = pontuacoes[melhor]
+        soma = sum(math.exp(p - maximo) for p in pontuacoes.values())
+        return melhor, 1.0 / soma
+
+    def serializar(self):
+        """Modelo em JSON compactado com zlib"""
+        dados = {
+            'versao': self.VERSAO,
+            'exemplos': self.exemplos,
+            'classes': {
+                str(categoria_id): [documentos, total, dict(contagens)]
+                for categoria_id, (documentos, total, contagens)
+                in self.classes.items()
+            },
+        }
+        return zlib.compress(
+            json.dumps(dados, separators=(',', ':')).encode('utf-8'))
+
+    @classmethod
+    def carregar(cls, dados):
+        """Reconstrói o modelo gravado por serializar()"""
+        modelo = cls()
+        if not dados:
+            return modelo
+
+        conteudo = json.loads(zlib.decompress(bytes(dados)))
+        if conteudo.get('versao') != cls.VERSAO:
+            return modelo
+
+        modelo.exemplos = conteudo['exemplos']
+        for categoria_id, (documentos, total, contagens) \
+                in conteudo['classes'].items():
+            modelo.classes[int(categoria_id)] = [
+                documentos, total,
+                Counter({int(h): n for h, n in contagens.items()})
+            ]
+        return modelo
+
+
+def _transacoes_de_treino(usuario):
+    """
+    Transações usadas como exemplo
+
+    As categorias "Outras ..." ficam de fora: são o destino padrão de
+    quem não foi categorizado e ensinariam o modelo a não decidir.
+    """
+    genericas = Q(categoria__nome__in=CATEGORIAS_PADRAO.values()) | \
+        Q(categoria__nome__icontains='outros')
+    return Transacao.objects.filter(usuario=usuario).exclude(genericas)
+
+
+def treinar_classificador(usuario, completo=False):
+    """
+    Atualiza o modelo do usuário com as transações ainda não vistas
+
+    Args:
+        usuario: Dono das transações e do modelo
+        completo: Descarta o modelo e treina com todo o histórico
+
+    Returns:
+        int: Transações adicionadas ao modelo
+    """
+    registro, _ = ClassificadorCategoria.objects.get_or_create(
+        usuario=usuario)
+
+    if completo:
+        modelo = NaiveBayes()
+        ultima_transacao_id = 0
+    else:
+        modelo = NaiveBayes.carregar(registro.dados)
+        ultima_transacao_id = registro.ultima_transacao_id
+
+    novas = (
+        _transacoes_de_treino(usuario)
+        .filter(id__gt=ultima_transacao_id)
+        .order_by('id')
+        .values_list('id', 'descricao', 'categoria_id')
+    )
+
+    adicionadas = 0
+    for transacao_id, descricao, categoria_id in novas.iterator(
+            chunk_size=TREINO_CHUNK_SIZE):
+        adicionadas += modelo.adicionar(categoria_id, descricao)
+        ultima_transacao_id = transacao_id
+
+    if adicionadas or completo:
+        registro.dados = modelo.serializar()
+        registro.exemplos = modelo.exemplos
+    registro.ultima_transacao_id = ultima_transacao_id
+    registro.save()
+
+    return adicionadas
+
+
+def atualizar_classificador(usuario):
+    """
+    Soma ao modelo as transações recém-importadas
+
+    Uma falha no treino não deve desfazer a importação já gravada; o
+    modelo é atualizado de novo na próxima importação.
+    """
+    try:
+        return treinar_classificador(usuario)
+    except Exception:
+        logger.exception(f'Failed to update classifier for user {usuario.pk}')
+        return 0
+
+
+def classificar_com_modelo(usuario, transacoes, categorias_usuario):
+    """
+    Aplica o modelo do usuário às transações do preview
+
+    As transações classificadas com confiança suficiente recebem a
+    categoria e 'classificada_modelo'; as demais são devolvidas para
+    seguirem para o cache/ChatGPT ou as regras locais.
+
+    Args:
+        usuario: Usuário que está importando
+        transacoes: Lista de dicionários com 'descricao' e 'tipo'
+        categorias_usuario: Categorias ativas (dicionários com id, nome,
+            tipo e cor)
+
+    Returns:
+        list: Transações que continuam sem categoria confiável
+    """
+    registro = ClassificadorCategoria.objects.filter(usuario=usuario).only(
+        'dados', 'exemplos').first()
+    minimo = getattr(settings, 'CLASSIFICADOR_MINIMO_EXEMPLOS',
+                     CLASSIFICADOR_MINIMO_EXEMPLOS)
+    if registro is None or registro.exemplos < minimo:
+        return transacoes
+
+    modelo = NaiveBayes.carregar(registro.dados)
+    limite = getattr(settings, 'CLASSIFICADOR_CONFIANCA_MINIMA',
+                     CLASSIFICADOR_CONFIANCA_MINIMA)
+
+    categorias_map = {cat['id']: cat for cat in categorias_usuario}
+    candidatas = {
+        tipo: [cat['id'] for cat in categorias_usuario if cat['tipo'] == tipo]
+        for tipo, _ in Categoria.TIPOS_CATEGORIA
+    }
+
+    previsoes = modelo.prever([
+        (transacao['descricao'], candidatas.get(transacao['tipo'], []))
+        for transacao in transacoes
+    ])
+
+    restantes = []
+    for transacao, (categoria_id, confianca) in zip(transacoes, previsoes):
+        if categoria_id is None or confianca < limite:
+            restantes.append(transacao)
+            continue
+
+        categoria = categorias_map[categoria_id]
+        transacao['categoria_id'] = categoria['id']
+        transacao['categoria_nome'] = categoria['nome']
+        transacao['categoria_cor'] = categoria['cor']
+        transacao['melhorada_chatgpt'] = False
+        transacao['classificada_modelo'] = True
+        transacao['confianca_ia'] = round(confianca, 4)
+
+    logger.info(
+        f"Local classifier: {len(transacoes) - len(restantes)} of "
+        f"{len(transacoes)} transactions above {limite:.0%} confidence")
+
+    return restantes
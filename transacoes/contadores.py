@@ -0,0 +1,30 @@
+"""
+Contadores do processo usados pelas estatísticas e por /metrics
+
+Os incrementos passam por um lock: em um servidor com threads, o += em um
+dicionário compartilhado perde atualizações.
+"""
+import threading
+
+
+class Contadores:
+    """Conjunto de contadores nomeados protegidos por um lock"""
+
+    def __init__(self, *nomes):
+        self._valores = dict.fromkeys(nomes, 0)
+        self._lock = threading.Lock()
+
+    def somar(self, **incrementos):
+        with self._lock:
+            for nome, quantidade in incrementos.items():
+                self._valores[nome] += quantidade
+
+    def valores(self):
+        """Cópia dos valores atuais"""
+        with self._lock:
+            return dict(self._valores)
+
+    def zerar(self):
+        with self._lock:
+            for nome in self._valores:
+                self._valores[nome] = 0
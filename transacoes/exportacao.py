@@ -0,0 +1,190 @@
+"""
+Exportação das transações em CSV, OFX e JSON Lines
+
+As transações são lidas com values_list() e iterator(chunk_size): a
+consulta traz apenas as colunas exportadas (categoria e conta pelo mesmo
+JOIN), sem instanciar modelos, e o banco entrega as linhas em blocos. Cada
+formato é um gerador de texto usado por um StreamingHttpResponse, de modo
+que o primeiro byte sai antes da consulta terminar e a memória não cresce
+com a quantidade de transações.
+"""
+import csv
+import json
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from django.db.models import Max, Min
+from django.utils import timezone
+
+# Linhas buscadas do banco (e enviadas ao cliente) por vez
+EXPORTACAO_CHUNK_SIZE = 2000
+
+CAMPOS_EXPORTACAO = (
+    'id', 'data', 'descricao', 'valor', 'tipo', 'categoria__nome',
+    'conta_bancaria__nome', 'identificador_ofx',
+)
+
+
+class _Eco:
+    """Destino do csv.writer que apenas devolve a linha formatada"""
+
+    def write(self, valor):
+        return valor
+
+
+def linhas_exportacao(transacoes, chunk_size=EXPORTACAO_CHUNK_SIZE):
+    """Tuplas CAMPOS_EXPORTACAO em ordem cronológica, lidas em blocos"""
+    return transacoes.order_by('data', 'id').values_list(
+        *CAMPOS_EXPORTACAO).iterator(chunk_size=chunk_size)
+
+
+def valor_com_sinal(valor, tipo):
+    return valor if tipo == 'RECEITA' else -valor
+
+
+def agrupar(partes, tamanho=EXPORTACAO_CHUNK_SIZE):
+    """Junta as partes geradas em blocos de texto maiores"""
+    bloco = []
+    for parte in partes:
+        bloco.append(parte)
+        if len(bloco) >= tamanho:
+            yield ''.join(bloco)
+            bloco = []
+    if bloco:
+        yield ''.join(bloco)
+
+
+# Início de célula que o Excel interpreta como fórmula
+INICIO_FORMULA = ('=', '+', '-', '@', '\t', '\r')
+
+
+def texto_seguro(texto):
+    """Texto de célula com apóstrofo na frente se pudesse virar fórmula"""
+    if texto and texto.startswith(INICIO_FORMULA):
+        return "'" + texto
+    return texto
+
+
+def exportar_csv(transacoes, chunk_size=EXPORTACAO_CHUNK_SIZE):
+    """
+    CSV separado por ponto e vírgula, com vírgula decimal e datas dd/mm/aaaa
+
+    O formato abre direto no Excel em português (o BOM indica o UTF-8) e é
+    lido de volta pela importação de CSV. Descrições e nomes que começam
+    como uma fórmula (=, +, -, @) recebem um apóstrofo na frente.
+    """
+    escritor = csv.writer(_Eco(), delimiter=';')
+    yield '\ufeff' + escritor.writerow((
+        'Data', 'Descrição', 'Valor', 'Tipo', 'Categoria', 'Conta',
+        'Identificador'))
+
+    def linhas():
+        for (_, data, descricao, valor, tipo, categoria, conta,
+             identificador) in linhas_exportacao(transacoes, chunk_size):
+            yield escritor.writerow((
+                data.strftime('%d/%m/%Y'),
+                texto_seguro(descricao),
+                f'{valor_com_sinal(valor, tipo):.2f}'.replace('.', ','),
+                tipo,
+                texto_seguro(categoria),
+                texto_seguro(conta or ''),
+                texto_seguro(identificador),
+            ))
+
+    yield from agrupar(linhas(), chunk_size)
+
+
+def exportar_jsonl(transacoes, chunk_size=EXPORTACAO_CHUNK_SIZE):
+    """Um objeto JSON por linha, com o valor em texto para não perder precisão"""
+    def linhas():
+        for (pk, data, descricao, valor, tipo, categoria, conta,
+             identificador) in linhas_exportacao(transacoes, chunk_size):
+            yield json.dumps({
+                'id': pk,
+                'data': data.isoformat(),
+                'descricao': descricao,
+                'valor': str(valor),
+                'tipo': tipo,
+                'categoria': categoria,
+                'conta_bancaria': conta,
+                'identificador_ofx': identificador,
+            }, ensure_ascii=False) + '\n'
+
+    yield from agrupar(linhas(), chunk_size)
+
+
+CABECALHO_OFX = """OFXHEADER:100
+DATA:OFXSGML
+VERSION:102
+SECURITY:NONE
+ENCODING:UTF-8
+CHARSET:NONE
+COMPRESSION:NONE
+OLDFILEUID:NONE
+NEWFILEUID:NONE
+
+<OFX>
+<SIGNONMSGSRSV1><SONRS>
+<STATUS><CODE>0<SEVERITY>INFO</STATUS>
+<DTSERVER>{agora}<LANGUAGE>POR
+</SONRS></SIGNONMSGSRSV1>
+<BANKMSGSRSV1><STMTTRNRS><TRNUID>1
+<STATUS><CODE>0<SEVERITY>INFO</STATUS>
+<STMTRS><CURDEF>BRL
+<BANKACCTFROM><BANKID>0000<ACCTID>MYMONEY<ACCTTYPE>CHECKING</BANKACCTFROM>
+<BANKTRANLIST><DTSTART>{inicio}<DTEND>{fim}
+"""
+
+RODAPE_OFX = """</BANKTRANLIST>
+<LEDGERBAL><BALAMT>{saldo}<DTASOF>{fim}</LEDGERBAL>
+</STMTRS></STMTTRNRS></BANKMSGSRSV1>
+</OFX>
+"""
+
+
+def exportar_ofx(transacoes, chunk_size=EXPORTACAO_CHUNK_SIZE):
+    """
+    Extrato OFX 1.02 (SGML) com todas as transações em uma única conta
+
+    O FITID é o identificador da importação original, ou o id da transação
+    para as lançadas manualmente. O saldo informado é o total líquido das
+    transações exportadas.
+    """
+    periodo = transacoes.order_by().aggregate(
+        inicio=Min('data'), fim=Max('data'))
+    agora = timezone.localtime()
+    hoje = agora.strftime('%Y%m%d')
+    inicio = periodo['inicio'].strftime('%Y%m%d') \
+        if periodo['inicio'] else hoje
+    fim = periodo['fim'].strftime('%Y%m%d') if periodo['fim'] else hoje
+
+    yield CABECALHO_OFX.format(
+        agora=agora.strftime('%Y%m%d%H%M%S'), inicio=inicio, fim=fim)
+
+    saldo = Decimal(0)
+
+    def linhas():
+        nonlocal saldo
+        for (pk, data, descricao, valor, tipo, _, _,
+             identificador) in linhas_exportacao(transacoes, chunk_size):
+            valor = valor_com_sinal(valor, tipo)
+            saldo += valor
+            yield (
+                '<STMTTRN>'
+                f'<TRNTYPE>{"CREDIT" if tipo == "RECEITA" else "DEBIT"}'
+                f'<DTPOSTED>{data.strftime("%Y%m%d")}'
+                f'<TRNAMT>{valor:.2f}'
+                f'<FITID>{escape(identificador or f"mymoney-{pk}")}'
+                f'<MEMO>{escape(" ".join(descricao.split()))}'
+                '</STMTTRN>\n'
+            )
+
+    yield from agrupar(linhas(), chunk_size)
+    yield RODAPE_OFX.format(saldo=f'{saldo:.2f}', fim=fim)
+
+
+FORMATOS_EXPORTACAO = {
+    'csv': (exportar_csv, 'text/csv; charset=utf-8', 'csv'),
+    'ofx': (exportar_ofx, 'application/x-ofx; charset=utf-8', 'ofx'),
+    'jsonl': (exportar_jsonl, 'application/x-ndjson; charset=utf-8', 'jsonl'),
+}
@@ -0,0 +1,320 @@
+"""
+Importação de vários arquivos OFX de uma vez (diretório ou ZIP)
+
+A leitura dos arquivos, que consome CPU, roda em processos separados
+(ProcessPoolExecutor) que não acessam o banco. O processo principal recebe
+os lançamentos de cada arquivo assim que a leitura termina e é o único que
+grava: associa os lançamentos à ContaBancaria pelo BANKID/ACCTID do extrato,
+categoriza e insere em lote com inserir_transacoes(), registrando um
+ImportacaoOFX por arquivo. Com um só escritor as gravações não disputam o
+lock do banco (no SQLite, uma única escrita por vez).
+"""
+import os
+import re
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from contextlib import contextmanager
+from decimal import Decimal
+from functools import partial
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+
+from .categorizacao import CategorizadorAutomatico
+from .classificador import atualizar_classificador
+from .leitor_ofx import analisar_arquivo_ofx
+from .models import ContaBancaria, ImportacaoOFX, Transacao
+from .utils import (
+    OFX_BULK_BATCH_SIZE, gerar_identificador_ofx, inserir_transacoes,
+    obter_categoria_automatica, registrar_importacao
+)
+
+EXTENSOES_OFX = ('.ofx', '.qfx')
+
+# Limites de um ZIP (quantidade de arquivos OFX e tamanho descompactado)
+OFX_ZIP_MAX_ARQUIVOS = 1000
+OFX_ZIP_MAX_BYTES = 200 * 1024 * 1024
+
+NAO_DIGITOS = re.compile(r'\D')
+
+
+def somente_digitos(texto):
+    return NAO_DIGITOS.sub('', texto or '')
+
+
+def eh_arquivo_ofx(nome):
+    return nome.lower().endswith(EXTENSOES_OFX)
+
+
+@contextmanager
+def ler_zip_ofx(arquivo):
+    """
+    Arquivos OFX de um ZIP, em ordem de nome, lidos sob demanda
+
+    Os limites de quantidade e de tamanho descompactado são verificados
+    pelo diretório do ZIP, antes de ler qualquer arquivo. O conteúdo de
+    cada um só é descompactado quando importar_lote_ofx() o envia para a
+    leitura; o ZIP fica aberto até o fim do bloco with.
+
+    Args:
+        arquivo: Caminho ou arquivo binário aberto
+
+    Yields:
+        list: Tuplas (nome, leitor), com leitor() devolvendo os bytes
+
+    Raises:
+        zipfile.BadZipFile: Se o arquivo não for um ZIP válido
+        ValueError: Se o ZIP exceder settings.OFX_ZIP_MAX_ARQUIVOS ou
+            settings.OFX_ZIP_MAX_BYTES
+    """
+    max_arquivos = getattr(
+        settings, 'OFX_ZIP_MAX_ARQUIVOS', OFX_ZIP_MAX_ARQUIVOS)
+    max_bytes = getattr(settings, 'OFX_ZIP_MAX_BYTES', OFX_ZIP_MAX_BYTES)
+
+    with zipfile.ZipFile(arquivo) as pacote:
+        entradas = sorted(
+            (info for info in pacote.infolist()
+             if not info.is_dir() and eh_arquivo_ofx(info.filename)),
+            key=lambda i: i.filename
+        )
+        if len(entradas) > max_arquivos:
+            raise ValueError(
+                f'O ZIP tem {len(entradas)} arquivos OFX; o limite é '
+                f'{max_arquivos}')
+        # file_size vem do diretório do ZIP; a descompactação para nele
+        if sum(info.file_size for info in entradas) > max_bytes:
+            raise ValueError(
+                f'Os arquivos OFX do ZIP passam de '
+                f'{max_bytes // (1024 * 1024)} MB descompactados')
+
+        yield [
+            (info.filename, partial(pacote.read, info)) for info in entradas
+        ]
+
+
+@contextmanager
+def listar_arquivos_ofx(origem):
+    """
+    Arquivos OFX de um diretório (incluindo subdiretórios), ZIP ou arquivo
+
+    Yields:
+        list: Tuplas (nome, origem) aceitas por importar_lote_ofx(); os
+        arquivos do disco são lidos pelos processos de leitura, os de um
+        ZIP (aberto até o fim do bloco with) pelo processo principal, um
+        de cada vez
+
+    Raises:
+        ValueError: Se a origem não for um diretório, ZIP ou arquivo OFX,
+            ou se o ZIP exceder os limites de ler_zip_ofx()
+    """
+    if os.path.isdir(origem):
+        arquivos = []
+        for pasta, _, nomes in os.walk(origem):
+            for nome in nomes:
+                if eh_arquivo_ofx(nome):
+                    caminho = os.path.join(pasta, nome)
+                    arquivos.append((os.path.relpath(caminho, origem), caminho))
+        yield sorted(arquivos)
+        return
+
+    if os.path.isfile(origem):
+        if zipfile.is_zipfile(origem):
+            with ler_zip_ofx(origem) as arquivos:
+                yield arquivos
+            return
+        if eh_arquivo_ofx(origem):
+            yield [(os.path.basename(origem), origem)]
+            return
+
+    raise ValueError(f'"{origem}" não é um diretório, ZIP ou arquivo OFX')
+
+
+def mapear_conta(contas, banco_id, conta_id):
+    """
+    Conta bancária de um extrato pelo BANKID e ACCTID do OFX
+
+    O ACCTID é comparado só pelos dígitos com o número da conta, com ou sem
+    a agência na frente (alguns bancos enviam agência e conta juntas). Se
+    mais de uma conta combinar, o BANKID desempata pelo código no campo
+    banco.
+
+    Returns:
+        ContaBancaria: Conta encontrada, ou None se nenhuma ou mais de uma
+        combinarem
+    """
+    numero = somente_digitos(conta_id)
+    if not numero:
+        return None
+
+    candidatas = [
+        conta for conta in contas
+        if somente_digitos(conta.conta) and numero in (
+            somente_digitos(conta.conta),
+            somente_digitos(conta.agencia) + somente_digitos(conta.conta)
+        )
+    ]
+
+    codigo = somente_digitos(banco_id).lstrip('0')
+    if len(candidatas) > 1 and codigo:
+        candidatas = [
+            conta for conta in candidatas
+            if somente_digitos(conta.banco).lstrip('0') == codigo
+        ]
+
+    return candidatas[0] if len(candidatas) == 1 else None
+
+
+def importar_lote_ofx(arquivos, usuario, processos=None, batch_size=None,
+                      conta_padrao=None, ao_concluir=None):
+    """
+    Importa vários arquivos OFX, lidos em paralelo e gravados em sequência
+
+    Os arquivos são gravados na ordem em que a leitura termina, cada um em
+    sua própria transação do banco; a falha de um arquivo fica registrada no
+    ImportacaoOFX dele e não interrompe os demais.
+
+    Args:
+        arquivos: Tuplas (nome, origem) como as de listar_arquivos_ofx();
+            origem é o caminho, os bytes ou uma função que devolve os bytes
+        usuario: Usuário que está importando
+        processos: Processos de leitura (padrão: settings.OFX_LOTE_PROCESSOS,
+            ou um por CPU)
+        batch_size: Registros por INSERT (padrão: settings.OFX_BULK_BATCH_SIZE)
+        conta_padrao: Conta usada quando o extrato não corresponde a
+            nenhuma conta do usuário (opcional)
+        ao_concluir: Função ao_concluir(resultado, concluidos) chamada após
+            cada arquivo
+
+    Returns:
+        dict: 'arquivos' (resultado de cada arquivo, na ordem de conclusão),
+        'total', 'importadas', 'duplicadas', 'erros' e 'segundos'
+    """
+    inicio = time.perf_counter()
+    processos = processos or getattr(settings, 'OFX_LOTE_PROCESSOS', 0) \
+        or os.cpu_count()
+    batch_size = batch_size or getattr(
+        settings, 'OFX_BULK_BATCH_SIZE', OFX_BULK_BATCH_SIZE)
+
+    contas = list(ContaBancaria.objects.filter(usuario=usuario, ativa=True))
+    categorizador = CategorizadorAutomatico(usuario)
+    resultados = []
+
+    if arquivos:
+        processos = min(processos, len(arquivos))
+        pendentes = iter(arquivos)
+        em_leitura = set()
+        with ProcessPoolExecutor(max_workers=processos) as executor:
+            while True:
+                # O próximo arquivo só é enviado quando há processo livre:
+                # no máximo dois por processo ficam em memória
+                for nome, origem in islice(
+                        pendentes, 2 * processos - len(em_leitura)):
+                    if callable(origem):
+                        origem = origem()
+                    em_leitura.add(executor.submit(
+                        analisar_arquivo_ofx, nome, origem))
+                if not em_leitura:
+                    break
+
+                lidos, em_leitura = wait(
+                    em_leitura, return_when=FIRST_COMPLETED)
+                for futuro in lidos:
+                    resultado = _gravar_arquivo(
+                        futuro.result(), usuario, contas, conta_padrao,
+                        categorizador, batch_size)
+                    resultados.append(resultado)
+                    if ao_concluir:
+                        ao_concluir(resultado, len(resultados))
+
+    if any(resultado['importadas'] for resultado in resultados):
+        # As transações novas passam a treinar o classificador do usuário
+        atualizar_classificador(usuario)
+
+    return {
+        'arquivos': resultados,
+        'total': sum(resultado['total'] for resultado in resultados),
+        'importadas': sum(resultado['importadas'] for resultado in resultados),
+        'duplicadas': sum(resultado['duplicadas'] for resultado in resultados),
+        'erros': sum(1 for resultado in resultados if resultado['erro']),
+        'segundos': time.perf_counter() - inicio,
+    }
+
+
+def _gravar_arquivo(lido, usuario, contas, conta_padrao, categorizador,
+                    batch_size):
+    """Grava os lançamentos de um arquivo lido e registra o ImportacaoOFX"""
+    resultado = {
+        'arquivo': lido['nome'],
+        'contas': [],
+        'total': len(lido['lancamentos']),
+        'importadas': 0,
+        'duplicadas': 0,
+        'erro': lido['erro'],
+        'segundos_leitura': lido['segundos'],
+        'segundos_gravacao': 0.0,
+    }
+    arquivo_nome = lido['nome'][-255:]
+    # A leitura roda em outro processo; a contagem fica no que grava
+    registrar_importacao(lidos=resultado['total'])
+
+    if lido['erro']:
+        ImportacaoOFX.objects.create(
+            arquivo_nome=arquivo_nome, usuario=usuario, sucesso=False,
+            erro=lido['erro'])
+        return resultado
+
+    inicio = time.perf_counter()
+    try:
+        # Um arquivo pode trazer extratos de mais de uma conta
+        contas_arquivo = {}
+        novas = []
+        for lancamento in lido['lancamentos']:
+            if lancamento.account_id not in contas_arquivo:
+                contas_arquivo[lancamento.account_id] = mapear_conta(
+                    contas, lido['banco'], lancamento.account_id
+                ) or conta_padrao
+
+            valor = abs(Decimal(str(lancamento.amount)))
+            tipo = 'RECEITA' if lancamento.amount > 0 else 'DESPESA'
+            descricao = lancamento.memo or lancamento.payee or 'Transação OFX'
+
+            novas.append(Transacao(
+                descricao=descricao,
+                valor=valor,
+                tipo=tipo,
+                data=lancamento.date.date(),
+                categoria=obter_categoria_automatica(
+                    descricao, tipo, usuario, categorizador),
+                conta_bancaria=contas_arquivo[lancamento.account_id],
+                usuario=usuario,
+                identificador_ofx=gerar_identificador_ofx(lancamento),
+                importada_ofx=True
+            ))
+
+        with transaction.atomic():
+            inseridas = inserir_transacoes(novas, batch_size)
+            resultado['importadas'] = len(inseridas)
+            resultado['duplicadas'] = len(novas) - len(inseridas)
+
+            ImportacaoOFX.objects.create(
+                arquivo_nome=arquivo_nome,
+                usuario=usuario,
+                total_transacoes=resultado['total'],
+                transacoes_importadas=resultado['importadas'],
+                transacoes_duplicadas=resultado['duplicadas']
+            )
+
+        resultado['contas'] = sorted({
+            conta.nome if conta else '' for conta in contas_arquivo.values()
+        })
+
+    except Exception as e:
+        resultado['erro'] = str(e)
+        ImportacaoOFX.objects.create(
+            arquivo_nome=arquivo_nome, usuario=usuario, sucesso=False,
+            erro=str(e))
+
+    resultado['segundos_gravacao'] = time.perf_counter() - inicio
+    return resultado
@@ -0,0 +1,368 @@
+"""
+Fila de jobs em segundo plano guardada no banco (Job)
+
+Os jobs são reservados com SELECT ... FOR UPDATE SKIP LOCKED seguido de
+uma atualização condicional do status, de modo que vários processos
+run_jobs podem consumir a fila em paralelo sem executar o mesmo job duas
+vezes (no SQLite, que ignora o FOR UPDATE, vale a atualização condicional).
+
+Enquanto executa, o worker renova o sinal de vida do job (sinal_vida_em)
+em uma thread à parte; só volta para a fila o job cujo sinal de vida
+expirou, ou seja, cujo worker parou.
+"""
+import logging
+import os
+import socket
+import threading
+import zipfile
+from contextlib import ExitStack
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .importacao_lote import importar_lote_ofx, ler_zip_ofx
+from .models import ContaBancaria, Job
+from .staging import gravar_staging, promover_staging
+from .utils import preview_arquivo_csv, preview_arquivo_ofx
+
+logger = logging.getLogger(__name__)
+
+# Minutos sem sinal de vida após os quais um job em execução é liberado
+JOB_TIMEOUT_MINUTOS = 30
+
+# Intervalo entre as renovações do sinal de vida de um job em execução
+JOB_SINAL_VIDA_SEGUNDOS = 30
+
+# Execuções permitidas antes de marcar um job abandonado como erro
+JOB_MAX_TENTATIVAS = 3
+
+
+class ErroJob(Exception):
+    """Falha esperada durante a execução de um job"""
+
+
+def identificar_worker():
+    """Identificação do processo que executa os jobs"""
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def enfileirar_job(tipo, usuario, parametros=None, arquivo=None):
+    """
+    Cria um job pendente
+
+    Com JOBS_ASSINCRONOS desativado o job é executado imediatamente, no
+    próprio processo (útil em desenvolvimento, sem worker rodando).
+
+    Args:
+        tipo: Um dos Job.TIPOS_JOB
+        usuario: Usuário dono do job
+        parametros: Dicionário serializável em JSON
+        arquivo: Arquivo enviado, copiado para o storage (opcional)
+
+    Returns:
+        Job: Job criado
+    """
+    job = Job(tipo=tipo, usuario=usuario, parametros=parametros or {})
+    if arquivo is not None:
+        job.arquivo.save(arquivo.name, arquivo, save=False)
+    job.save()
+
+    if not getattr(settings, 'JOBS_ASSINCRONOS', True):
+        agora = timezone.now()
+        Job.objects.filter(pk=job.pk).update(
+            status='EXECUTANDO',
+            worker=identificar_worker(),
+            iniciado_em=agora,
+            sinal_vida_em=agora,
+            tentativas=F('tentativas') + 1
+        )
+        job.refresh_from_db()
+        executar_job(job)
+
+    return job
+
+
+def reservar_proximo_job(worker):
+    """
+    Reserva o job pendente mais antigo para o worker
+
+    Returns:
+        Job: Job reservado, ou None se a fila estiver vazia
+    """
+    while True:
+        with transaction.atomic():
+            job = (
+                Job.objects.select_for_update(skip_locked=True)
+                .filter(status='PENDENTE')
+                .order_by('criado_em', 'id')
+                .first()
+            )
+            if job is None:
+                return None
+
+            agora = timezone.now()
+            reservado = Job.objects.filter(
+                pk=job.pk, status='PENDENTE'
+            ).update(
+                status='EXECUTANDO',
+                worker=worker,
+                iniciado_em=agora,
+                sinal_vida_em=agora,
+                tentativas=F('tentativas') + 1
+            )
+
+        if reservado:
+            job.refresh_from_db()
+            return job
+        # Outro worker reservou o mesmo job: tenta o próximo
+
+
+def atualizar_progresso(job, progresso, mensagem=''):
+    """Grava o percentual e a mensagem exibidos na página de importação"""
+    job.progresso = max(0, min(int(progresso), 100))
+    job.mensagem = mensagem[:200]
+    Job.objects.filter(pk=job.pk).update(
+        progresso=job.progresso, mensagem=job.mensagem,
+        sinal_vida_em=timezone.now())
+
+
+class SinalDeVida:
+    """
+    Renova periodicamente o sinal de vida de um job em execução
+
+    Roda em uma thread própria, com sua própria conexão ao banco, para que
+    o sinal continue mesmo quando o job passa minutos sem informar
+    progresso (leitura de um ZIP grande, lotes lentos do ChatGPT).
+    """
+
+    def __init__(self, job, intervalo=None):
+        self.job = job
+        self.intervalo = intervalo or getattr(
+            settings, 'JOB_SINAL_VIDA_SEGUNDOS', JOB_SINAL_VIDA_SEGUNDOS)
+        self._parar = threading.Event()
+        self._thread = threading.Thread(
+            target=self._executar, name=f'sinal-vida-job-{job.pk}',
+            daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._parar.set()
+        self._thread.join()
+
+    def _executar(self):
+        try:
+            while not self._parar.wait(self.intervalo):
+                try:
+                    Job.objects.filter(
+                        pk=self.job.pk, status='EXECUTANDO',
+                        worker=self.job.worker
+                    ).update(sinal_vida_em=timezone.now())
+                except DatabaseError as e:
+                    # Ex.: banco ocupado pela gravação do próprio job
+                    logger.warning(
+                        f'Sinal de vida do job {self.job.pk} falhou: {e}')
+        finally:
+            connection.close()
+
+
+def executar_job(job):
+    """
+    Executa um job já reservado e grava o resultado ou o erro
+
+    O resultado só é gravado se o job ainda pertencer a este worker; um
+    job liberado por liberar_jobs_travados e reservado por outro não tem o
+    status sobrescrito.
+
+    Returns:
+        bool: True se o job foi concluído com sucesso
+    """
+    executor = EXECUTORES.get(job.tipo)
+
+    try:
+        if executor is None:
+            raise ErroJob(f'Tipo de job desconhecido: {job.tipo}')
+        with SinalDeVida(job):
+            job.resultado = executor(job)
+    except Exception as e:
+        if not isinstance(e, ErroJob):
+            logger.exception(f'Job {job.pk} ({job.tipo}) falhou')
+        job.status = 'ERRO'
+        job.erro = str(e)
+        job.mensagem = 'Falha no processamento'
+    else:
+        job.status = 'CONCLUIDO'
+        job.progresso = 100
+        job.mensagem = 'Concluído'
+
+    job.concluido_em = timezone.now()
+
+    # O arquivo enviado só é necessário durante o processamento
+    if job.arquivo:
+        job.arquivo.delete(save=False)
+
+    gravado = Job.objects.filter(
+        pk=job.pk, status='EXECUTANDO', worker=job.worker
+    ).update(
+        status=job.status, resultado=job.resultado, erro=job.erro,
+        progresso=job.progresso, mensagem=job.mensagem,
+        concluido_em=job.concluido_em, arquivo=job.arquivo.name or ''
+    )
+    if not gravado:
+        logger.warning(
+            f'Job {job.pk} não pertence mais ao worker {job.worker}; '
+            f'resultado descartado')
+
+    return job.status == 'CONCLUIDO'
+
+
+def liberar_jobs_travados(timeout=None):
+    """
+    Devolve à fila os jobs cujo worker parou no meio da execução
+
+    Um job está travado quando o sinal de vida não é renovado há mais que
+    o timeout; jobs longos cujo worker segue ativo não são afetados.
+
+    Returns:
+        tuple: (jobs devolvidos à fila, jobs marcados como erro)
+    """
+    if timeout is None:
+        timeout = timedelta(minutes=getattr(
+            settings, 'JOB_TIMEOUT_MINUTOS', JOB_TIMEOUT_MINUTOS))
+    max_tentativas = getattr(
+        settings, 'JOB_MAX_TENTATIVAS', JOB_MAX_TENTATIVAS)
+
+    travados = Job.objects.filter(
+        status='EXECUTANDO',
+        sinal_vida_em__lt=timezone.now() - timeout
+    )
+
+    esgotados = travados.filter(
+        tentativas__gte=max_tentativas
+    ).update(
+        status='ERRO',
+        erro='Tempo de execução esgotado',
+        concluido_em=timezone.now()
+    )
+    devolvidos = travados.update(status='PENDENTE', worker='')
+
+    return devolvidos, esgotados
+
+
+def executar_preview_ofx(job):
+    """Lê, deduplica e categoriza o extrato e grava o preview no staging"""
+    conta = None
+    conta_id = job.parametros.get('conta_id')
+    if conta_id:
+        conta = ContaBancaria.objects.filter(
+            pk=conta_id, usuario=job.usuario).first()
+
+    arquivo_nome = job.parametros.get('arquivo_nome') or job.arquivo.name
+    tamanho = job.arquivo.size or 1
+
+    with job.arquivo.open('rb') as arquivo:
+        def progresso(etapa, transacoes):
+            if etapa == 'leitura':
+                # A leitura vai até 70%, proporcional aos bytes lidos
+                lido = min(arquivo.tell() / tamanho, 1)
+                atualizar_progresso(
+                    job, 70 * lido, f'{transacoes} transações lidas')
+            else:
+                atualizar_progresso(
+                    job, 90, f'{transacoes} transações categorizadas')
+
+        formato = job.parametros.get('formato', 'ofx')
+        if formato == 'ofx':
+            resultado = preview_arquivo_ofx(
+                arquivo, job.usuario, conta, progresso)
+        else:
+            resultado = preview_arquivo_csv(
+                arquivo, job.usuario, conta, progresso, formato,
+                job.parametros.get('mapeamento'))
+
+    if not resultado['sucesso']:
+        raise ErroJob(resultado['erro'])
+
+    atualizar_progresso(job, 95, 'Gravando pré-visualização')
+    token = gravar_staging(
+        resultado['transacoes'], job.usuario, conta, arquivo_nome)
+
+    return {
+        'token': str(token),
+        'total': resultado['total'],
+        'novas': len(resultado['transacoes']),
+        'duplicadas': resultado['duplicadas'],
+        'consumo_chatgpt': resultado['consumo_chatgpt'],
+    }
+
+
+def executar_salvar_ofx(job):
+    """Move o preview confirmado do staging para as transações"""
+    atualizar_progresso(job, 10, 'Importando transações')
+    token = job.parametros.get('token')
+
+    # O uso do ChatGPT foi medido no job de preview do mesmo lote
+    preview = Job.objects.filter(
+        usuario=job.usuario, tipo='PREVIEW_OFX', resultado__token=token
+    ).values_list('resultado', flat=True).first()
+
+    resultado = promover_staging(
+        token, job.usuario, (preview or {}).get('consumo_chatgpt'))
+    if not resultado['sucesso']:
+        raise ErroJob(resultado['erro'])
+
+    return resultado
+
+
+def executar_importar_lote_ofx(job):
+    """Importa direto para as transações todos os arquivos OFX de um ZIP"""
+    conta = None
+    conta_id = job.parametros.get('conta_id')
+    if conta_id:
+        conta = ContaBancaria.objects.filter(
+            pk=conta_id, usuario=job.usuario).first()
+
+    with ExitStack() as pilha:
+        try:
+            arquivo = pilha.enter_context(job.arquivo.open('rb'))
+            arquivos = pilha.enter_context(ler_zip_ofx(arquivo))
+        except zipfile.BadZipFile:
+            raise ErroJob('Arquivo ZIP inválido')
+        except ValueError as e:
+            raise ErroJob(str(e))
+        if not arquivos:
+            raise ErroJob('Nenhum arquivo OFX encontrado no ZIP')
+
+        def progresso(resultado, concluidos):
+            atualizar_progresso(
+                job, 5 + 90 * concluidos / len(arquivos),
+                f'{concluidos} de {len(arquivos)} arquivos importados')
+
+        atualizar_progresso(job, 5, f'Lendo {len(arquivos)} arquivos')
+        resultado = importar_lote_ofx(
+            arquivos, job.usuario, conta_padrao=conta, ao_concluir=progresso)
+
+    return {
+        'importadas': resultado['importadas'],
+        'duplicadas': resultado['duplicadas'],
+        'total': resultado['total'],
+        'erros': resultado['erros'],
+        'arquivos': [
+            {chave: item[chave] for chave in (
+                'arquivo', 'contas', 'total', 'importadas', 'duplicadas',
+                'erro')}
+            for item in resultado['arquivos']
+        ],
+    }
+
+
+EXECUTORES = {
+    'PREVIEW_OFX': executar_preview_ofx,
+    'SALVAR_OFX': executar_salvar_ofx,
+    'IMPORTAR_LOTE_OFX': executar_importar_lote_ofx,
+}
@@ -0,0 +1,442 @@
+"""
+Leitura incremental de extratos em CSV (e XLSX)
+
+Os bancos que não exportam OFX costumam oferecer CSV, cada um com suas
+colunas, separador e formato de números. O arquivo é lido em blocos e as
+primeiras linhas servem de amostra para descobrir o cabeçalho, o separador
+de colunas, o formato das datas e se os valores usam vírgula decimal; as
+demais linhas são convertidas uma a uma, sem carregar o arquivo inteiro.
+
+Os lançamentos são devolvidos como LancamentoOFX, de modo que deduplicação,
+categorização e gravação seguem o mesmo caminho da importação OFX.
+"""
+import codecs
+import csv
+import hashlib
+import re
+import unicodedata
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from itertools import chain, islice
+
+from .leitor_ofx import TAMANHO_BLOCO, LancamentoOFX, ler_blocos
+
+# Linhas usadas para detectar cabeçalho, separador e formatos
+LINHAS_AMOSTRA = 50
+
+# Bytes usados para detectar o encoding
+TAMANHO_AMOSTRA_ENCODING = 4096
+
+DELIMITADORES = ';,\t|'
+
+FORMATOS_DATA = (
+    '%d/%m/%Y', '%d/%m/%y', '%Y-%m-%d', '%d-%m-%Y', '%d.%m.%Y', '%Y/%m/%d'
+)
+
+# Nomes de coluna reconhecidos (sem acentos, minúsculos, só letras e números)
+COLUNAS = {
+    'data': (
+        'data', 'data lancamento', 'data do lancamento', 'data movimento',
+        'data da transacao', 'data transacao', 'dt lancamento', 'date'),
+    'descricao': (
+        'historico', 'descricao', 'lancamento', 'estabelecimento',
+        'detalhes', 'titulo', 'memo', 'description'),
+    'valor': (
+        'valor', 'valor r', 'valor rs', 'valor em r', 'montante', 'quantia',
+        'amount'),
+    'credito': ('credito', 'credito r', 'entrada', 'entradas'),
+    'debito': ('debito', 'debito r', 'saida', 'saidas'),
+    'documento': (
+        'documento', 'n documento', 'numero documento', 'identificador',
+        'id'),
+}
+
+NAO_ALFANUMERICO = re.compile(r'[^a-z0-9]+')
+
+
+class ErroLeituraCSV(ValueError):
+    """Extrato CSV/XLSX com cabeçalho ou lançamento inválido"""
+
+
+def normalizar_nome(texto):
+    """Nome de coluna sem acentos, em minúsculas, só com letras e números"""
+    texto = unicodedata.normalize('NFKD', str(texto or ''))
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return NAO_ALFANUMERICO.sub(' ', texto.lower()).strip()
+
+
+def detectar_encoding_csv(inicio):
+    """UTF-8 (com ou sem BOM) ou, se não decodificar, Windows-1252"""
+    try:
+        inicio.decode('utf-8')
+    except UnicodeDecodeError as e:
+        # Um caractere cortado no fim da amostra não conta
+        if e.start < len(inicio) - 3:
+            return 'cp1252'
+    return 'utf-8-sig'
+
+
+def textos_decodificados(arquivo, tamanho_bloco=TAMANHO_BLOCO):
+    """Blocos do arquivo já decodificados"""
+    decodificador = None
+    inicio = b''
+    for bloco in ler_blocos(arquivo, tamanho_bloco):
+        if isinstance(bloco, str):
+            yield bloco
+            continue
+
+        if decodificador is None:
+            # O encoding é decidido pelos primeiros 4 KB
+            inicio += bloco
+            if len(inicio) < TAMANHO_AMOSTRA_ENCODING:
+                continue
+            decodificador = codecs.getincrementaldecoder(
+                detectar_encoding_csv(inicio))(errors='replace')
+            bloco, inicio = inicio, b''
+        yield decodificador.decode(bloco)
+
+    if inicio:
+        decodificador = codecs.getincrementaldecoder(
+            detectar_encoding_csv(inicio))(errors='replace')
+        yield decodificador.decode(inicio)
+    if decodificador is not None:
+        yield decodificador.decode(b'', final=True)
+
+
+def linhas_texto(arquivo, tamanho_bloco=TAMANHO_BLOCO):
+    """Linhas do arquivo decodificadas, lidas em blocos"""
+    resto = ''
+    for texto in textos_decodificados(arquivo, tamanho_bloco):
+        linhas = (resto + texto).splitlines(keepends=True)
+        resto = ''
+        if linhas and not linhas[-1].endswith(('\n', '\r')):
+            resto = linhas.pop()
+        yield from linhas
+
+    if resto:
+        yield resto
+
+
+def detectar_delimitador(amostra):
+    try:
+        return csv.Sniffer().sniff(amostra, DELIMITADORES).delimiter
+    except csv.Error:
+        return max(DELIMITADORES, key=amostra.count)
+
+
+def localizar_colunas(amostra, mapeamento=None):
+    """
+    Índices das colunas e posição da primeira linha de dados
+
+    Args:
+        amostra: Primeiras linhas do arquivo (listas de células)
+        mapeamento: Dicionário campo -> nome da coluna ou índice (a partir
+            de 0); os campos omitidos são detectados pelo cabeçalho
+
+    Returns:
+        tuple: (dict campo -> lista de índices, índice da primeira linha
+        de dados na amostra)
+
+    Raises:
+        ErroLeituraCSV: Se a data ou o valor não forem encontrados
+    """
+    mapeamento = {
+        campo: valor for campo, valor in (mapeamento or {}).items()
+        if valor not in (None, '')
+    }
+    fixos = {
+        campo: [valor] for campo, valor in mapeamento.items()
+        if isinstance(valor, int)
+    }
+    if _colunas_completas(fixos):
+        return fixos, 0
+
+    nomes = {
+        campo: (normalizar_nome(mapeamento[campo]),)
+        if campo in mapeamento else nomes_campo
+        for campo, nomes_campo in COLUNAS.items()
+    }
+    for posicao, registro in enumerate(amostra):
+        cabecalho = [normalizar_nome(celula) for celula in registro]
+        colunas = dict(fixos)
+        for campo, nomes_campo in nomes.items():
+            if campo in colunas:
+                continue
+            indices = [i for i, nome in enumerate(cabecalho)
+                       if nome in nomes_campo]
+            if indices:
+                # Só a descrição junta várias colunas (ex.: histórico e
+                # descrição); nos demais campos vale a primeira
+                colunas[campo] = indices if campo == 'descricao' \
+                    else indices[:1]
+        if _colunas_completas(colunas):
+            return colunas, posicao + 1
+
+    raise ErroLeituraCSV(
+        'Cabeçalho não encontrado: informe as colunas de data, descrição e '
+        'valor do extrato')
+
+
+def _colunas_completas(colunas):
+    return 'data' in colunas and (
+        'valor' in colunas or 'credito' in colunas or 'debito' in colunas)
+
+
+def celula(registro, indice):
+    if indice < len(registro) and registro[indice] is not None:
+        return registro[indice]
+    return ''
+
+
+def texto_data(valor):
+    """Parte da data de um texto com data e hora"""
+    return str(valor).strip().split(' ')[0].split('T')[0]
+
+
+def detectar_formato_data(valores):
+    """Primeiro formato de FORMATOS_DATA que converte todas as datas da amostra"""
+    textos = [
+        texto_data(valor) for valor in valores
+        if isinstance(valor, str) and valor.strip()
+    ]
+    for formato in FORMATOS_DATA:
+        convertidas = 0
+        for texto in textos:
+            try:
+                datetime.strptime(texto, formato)
+                convertidas += 1
+            except ValueError:
+                pass
+        # Linhas de saldo ou rodapé podem não ter data válida
+        if convertidas and convertidas >= len(textos) // 2:
+            return formato
+    return FORMATOS_DATA[0]
+
+
+def detectar_virgula_decimal(valores, padrao=True):
+    """
+    Se os valores da amostra usam vírgula como separador decimal
+
+    Com os dois separadores, decide o que aparece por último (1.234,56 ou
+    1,234.56); com apenas um, decide se ele não é seguido de exatamente três
+    dígitos (o separador de milhar).
+    """
+    virgula = ponto = 0
+    for valor in valores:
+        if not isinstance(valor, str):
+            continue
+        texto = valor.strip()
+        posicao_virgula, posicao_ponto = texto.rfind(','), texto.rfind('.')
+        if posicao_virgula >= 0 and posicao_ponto >= 0:
+            if posicao_virgula > posicao_ponto:
+                virgula += 1
+            else:
+                ponto += 1
+        elif posicao_virgula >= 0:
+            if not re.search(r',\d{3}\b', texto):
+                virgula += 1
+        elif posicao_ponto >= 0:
+            if not re.search(r'\.\d{3}\b', texto):
+                ponto += 1
+
+    if virgula == ponto:
+        return padrao
+    return virgula > ponto
+
+
+def converter_valor_csv(valor, virgula):
+    """
+    Converte o valor de uma célula em Decimal com sinal
+
+    Aceita "R$", sinal no início ou no fim, parênteses e o sufixo D/C
+    usado por alguns bancos para débito e crédito.
+    """
+    if isinstance(valor, (int, float, Decimal)):
+        return Decimal(str(valor))
+
+    texto = str(valor).upper().replace('R$', '')
+    texto = ''.join(texto.split())
+    if not texto:
+        return Decimal(0)
+
+    negativo = texto.startswith(('-', '(')) or texto.endswith(('-', 'D'))
+    texto = texto.strip('()+-CD')
+    if virgula:
+        texto = texto.replace('.', '').replace(',', '.')
+    else:
+        texto = texto.replace(',', '')
+
+    try:
+        numero = Decimal(texto)
+    except InvalidOperation:
+        raise ErroLeituraCSV(f"Valor inválido no lançamento: '{valor}'")
+    return -numero if negativo else numero
+
+
+def converter_data_csv(valor, formato):
+    """Data da célula, ou None se ela não contiver uma data"""
+    if isinstance(valor, datetime):
+        return valor
+    if isinstance(valor, date):
+        return datetime(valor.year, valor.month, valor.day)
+    try:
+        return datetime.strptime(texto_data(valor), formato)
+    except ValueError:
+        return None
+
+
+def ler_registros(registros, mapeamento=None, virgula_padrao=True,
+                  conta=''):
+    """
+    Converte as linhas de uma planilha em lançamentos
+
+    Linhas sem data válida (cabeçalhos, saldos, rodapés) e lançamentos de
+    saldo são ignorados. O identificador de cada lançamento é um hash do
+    conteúdo da linha (data, valor, descrição e documento) com a ordem entre
+    linhas iguais no mesmo dia, de modo que reimportar o mesmo extrato, ou
+    um extrato de período sobreposto, gera os mesmos identificadores. O CSV
+    não informa a conta: a conta de destino vai no account_id, como o ACCTID
+    do OFX, para que a mesma linha em contas diferentes não seja duplicata.
+
+    Args:
+        registros: Iterável de linhas (listas de células)
+        mapeamento: Colunas informadas pelo usuário (ver localizar_colunas)
+        virgula_padrao: Separador decimal assumido quando a amostra não
+            permite decidir
+        conta: Conta de destino (pk), usada como account_id
+
+    Yields:
+        LancamentoOFX: Um lançamento por linha, na ordem do arquivo
+    """
+    registros = iter(registros)
+    amostra = list(islice(registros, LINHAS_AMOSTRA))
+    colunas, primeira = localizar_colunas(amostra, mapeamento)
+
+    dados_amostra = amostra[primeira:]
+    indice_data = colunas['data'][0]
+    formato_data = detectar_formato_data(
+        celula(registro, indice_data) for registro in dados_amostra)
+    virgula = detectar_virgula_decimal((
+        celula(registro, colunas[campo][0])
+        for registro in dados_amostra
+        for campo in ('valor', 'credito', 'debito') if campo in colunas
+    ), virgula_padrao)
+
+    # Linhas iguais só são distinguidas pela ordem dentro do mesmo dia
+    ocorrencias = {}
+    data_atual = None
+    celula_data_atual = None
+
+    for numero, registro in enumerate(
+            chain(dados_amostra, registros), start=primeira + 1):
+        # Extratos vêm ordenados por data: a conversão é feita uma vez por dia
+        celula_data = celula(registro, indice_data)
+        if celula_data != celula_data_atual or data_atual is None:
+            data = converter_data_csv(celula_data, formato_data)
+        else:
+            data = data_atual
+        if data is None:
+            continue
+
+        descricao = ' - '.join(
+            ' '.join(str(celula(registro, indice)).split())
+            for indice in colunas.get('descricao', [])
+            if str(celula(registro, indice)).strip()
+        )
+        if descricao[:5].lower() == 'saldo':
+            continue
+
+        try:
+            if 'valor' in colunas:
+                valor = converter_valor_csv(
+                    celula(registro, colunas['valor'][0]), virgula)
+            else:
+                valor = Decimal(0)
+                if 'credito' in colunas:
+                    valor += abs(converter_valor_csv(
+                        celula(registro, colunas['credito'][0]), virgula))
+                if 'debito' in colunas:
+                    valor -= abs(converter_valor_csv(
+                        celula(registro, colunas['debito'][0]), virgula))
+        except ErroLeituraCSV as e:
+            raise ErroLeituraCSV(f'Linha {numero}: {e}')
+
+        documento = ''
+        if 'documento' in colunas:
+            documento = str(celula(registro, colunas['documento'][0])).strip()
+
+        if data != data_atual:
+            ocorrencias.clear()
+            data_atual = data
+        celula_data_atual = celula_data
+        chave = (valor, descricao, documento)
+        ocorrencias[chave] = ocorrencias.get(chave, 0) + 1
+
+        conteudo = '|'.join((
+            data.date().isoformat(), str(valor), descricao, documento,
+            str(ocorrencias[chave])))
+        yield LancamentoOFX(
+            account_id=conta,
+            id='csv' + hashlib.sha1(conteudo.encode()).hexdigest()[:20],
+            date=data,
+            amount=valor,
+            memo=descricao,
+            payee='',
+            type=''
+        )
+
+
+def ler_transacoes_csv(arquivo, mapeamento=None, tamanho_bloco=TAMANHO_BLOCO,
+                       conta=''):
+    """
+    Gera os lançamentos de um extrato CSV à medida que são lidos
+
+    Args:
+        arquivo: Arquivo enviado (UploadedFile ou objeto binário)
+        mapeamento: Colunas informadas pelo usuário (ver localizar_colunas)
+        tamanho_bloco: Bytes lidos por vez
+        conta: Conta de destino (ver ler_registros)
+
+    Yields:
+        LancamentoOFX: Um lançamento por linha, na ordem do arquivo
+    """
+    linhas = linhas_texto(arquivo, tamanho_bloco)
+    amostra = list(islice(linhas, LINHAS_AMOSTRA))
+    delimitador = detectar_delimitador(''.join(amostra))
+
+    # Com ";" separando colunas, a vírgula costuma ser o separador decimal
+    yield from ler_registros(
+        csv.reader(chain(amostra, linhas), delimiter=delimitador),
+        mapeamento, virgula_padrao=delimitador != ',', conta=conta)
+
+
+def ler_transacoes_xlsx(arquivo, mapeamento=None, conta=''):
+    """
+    Gera os lançamentos da primeira planilha de um arquivo XLSX
+
+    Usa o modo somente leitura do openpyxl, que percorre as linhas sem
+    carregar a planilha inteira. O openpyxl é opcional e só é necessário
+    para este formato.
+    """
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ErroLeituraCSV(
+            'Importação de XLSX requer o pacote openpyxl '
+            '(pip install openpyxl)')
+
+    pasta = load_workbook(arquivo, read_only=True, data_only=True)
+    try:
+        yield from ler_registros(
+            pasta.active.iter_rows(values_only=True), mapeamento,
+            conta=conta)
+    finally:
+        pasta.close()
+
+
+def ler_transacoes_planilha(arquivo, formato='csv', mapeamento=None,
+                            conta=''):
+    """Lançamentos de um extrato 'csv' ou 'xlsx'"""
+    if formato == 'xlsx':
+        return ler_transacoes_xlsx(arquivo, mapeamento, conta=conta)
+    return ler_transacoes_csv(arquivo, mapeamento, conta=conta)
@@ -0,0 +1,228 @@
+"""
+Leitura incremental de arquivos OFX/QFX
+
+Percorre o arquivo em blocos e devolve cada STMTTRN assim que ele termina,
+sem montar a árvore completa do documento. Funciona com OFX 1.x (SGML, com
+tags de valor sem fechamento) e OFX 2.x (XML).
+"""
+import codecs
+import html
+import io
+import re
+import time
+from collections import namedtuple
+from decimal import Decimal, InvalidOperation
+
+from ofxparse import OfxParser
+
+# Tamanho dos blocos lidos do arquivo
+TAMANHO_BLOCO = 64 * 1024
+
+LancamentoOFX = namedtuple(
+    'LancamentoOFX',
+    ['account_id', 'id', 'date', 'amount', 'memo', 'payee', 'type']
+)
+
+TOKEN = re.compile(r'<([^>]*)>([^<]*)')
+ENCODING_XML = re.compile(rb'encoding=["\']([\w.:-]+)["\']', re.IGNORECASE)
+ENCODING_SGML = re.compile(rb'ENCODING:\s*([\w-]+)', re.IGNORECASE)
+CHARSET_SGML = re.compile(rb'CHARSET:\s*([\w-]+)', re.IGNORECASE)
+BANKID = re.compile(rb'<BANKID>\s*([^<\s]+)', re.IGNORECASE)
+
+
+class ErroLeituraOFX(ValueError):
+    """Arquivo OFX com lançamento inválido"""
+
+
+class _ConversorDatas(OfxParser):
+    """Reaproveita o parser de datas do ofxparse sem o estado de parse()"""
+    custom_date_format = None
+
+
+def detectar_encoding(inicio):
+    """Descobre o encoding a partir do cabeçalho OFX (SGML ou XML)"""
+    if inicio.lstrip().startswith(b'<?xml'):
+        encontrado = ENCODING_XML.search(inicio)
+        return encontrado.group(1).decode() if encontrado else 'utf-8'
+
+    encoding = ENCODING_SGML.search(inicio)
+    if encoding and encoding.group(1).upper().replace(b'-', b'') == b'UTF8':
+        return 'utf-8'
+
+    charset = CHARSET_SGML.search(inicio)
+    if charset:
+        valor = charset.group(1).decode().upper()
+        if valor == '1252':
+            return 'cp1252'
+        if valor in ('8859-1', 'ISO-8859-1', 'LATIN1'):
+            return 'latin-1'
+
+    return 'utf-8'
+
+
+def ler_blocos(arquivo, tamanho=TAMANHO_BLOCO):
+    """Lê o arquivo enviado em blocos (UploadedFile ou objeto de arquivo)"""
+    if hasattr(arquivo, 'seek'):
+        try:
+            arquivo.seek(0)
+        except (OSError, ValueError):
+            pass
+
+    if hasattr(arquivo, 'chunks'):
+        yield from arquivo.chunks(tamanho)
+    else:
+        yield from iter(lambda: arquivo.read(tamanho), b'')
+
+
+def converter_valor(texto):
+    """Converte TRNAMT com as mesmas regras do ofxparse"""
+    d = texto.strip()
+    # Handle 10,000.50 formatted numbers
+    if re.search(r'.*\..*,', d):
+        d = d.replace('.', '')
+    # Handle 10.000,50 formatted numbers
+    if re.search(r'.*,.*\.', d):
+        d = d.replace(',', '')
+    # Handle 10000,50 formatted numbers
+    if '.' not in d and ',' in d:
+        d = d.replace(',', '.')
+    d = d.replace(' ', '').replace('+', '')
+
+    try:
+        return Decimal(d)
+    except InvalidOperation:
+        # Alguns bancos usam lançamentos nulos para mudanças de taxa
+        if d in ('null', '-null'):
+            return 0
+        raise ErroLeituraOFX(f"Valor inválido no lançamento: '{texto}'")
+
+
+def criar_lancamento(account_id, campos):
+    """Monta o LancamentoOFX a partir das tags de um STMTTRN"""
+    if 'TRNAMT' not in campos:
+        raise ErroLeituraOFX('Lançamento sem valor (TRNAMT)')
+    if 'DTPOSTED' not in campos:
+        raise ErroLeituraOFX('Lançamento sem data (DTPOSTED)')
+
+    try:
+        data = _ConversorDatas.parseOfxDateTime(campos['DTPOSTED'])
+    except ValueError as e:
+        raise ErroLeituraOFX(f'Data inválida no lançamento: {e}')
+    if data is None:
+        raise ErroLeituraOFX('Lançamento com data vazia (DTPOSTED)')
+
+    return LancamentoOFX(
+        account_id=account_id,
+        id=campos.get('FITID', ''),
+        date=data,
+        amount=converter_valor(campos['TRNAMT']),
+        memo=campos.get('MEMO', ''),
+        payee=campos.get('NAME', ''),
+        type=campos.get('TRNTYPE', '').lower()
+    )
+
+
+def ler_transacoes_ofx(arquivo, tamanho_bloco=TAMANHO_BLOCO):
+    """
+    Gera os lançamentos do arquivo OFX à medida que são lidos
+
+    Args:
+        arquivo: Arquivo OFX enviado (UploadedFile ou objeto binário)
+        tamanho_bloco: Bytes lidos por vez
+
+    Yields:
+        LancamentoOFX: Um lançamento por STMTTRN, na ordem do arquivo
+    """
+    decodificador = None
+    buffer = ''
+    conta_atual = ''
+    campos = None
+
+    def processar(texto):
+        nonlocal conta_atual, campos
+        for tag, conteudo in TOKEN.findall(texto):
+            if not tag or tag[0] in '?!':
+                continue
+
+            nome = tag.split(None, 1)[0].upper() if tag.strip() else ''
+            if nome == 'STMTTRN':
+                if campos is not None:
+                    # SGML sem fechamento explícito do lançamento anterior
+                    yield criar_lancamento(conta_atual, campos)
+                campos = {}
+            elif nome == '/STMTTRN':
+                if campos is not None:
+                    yield criar_lancamento(conta_atual, campos)
+                campos = None
+            elif nome.startswith('/'):
+                continue
+            elif campos is not None:
+                valor = html.unescape(conteudo.strip())
+                if valor:
+                    campos[nome] = valor
+            elif nome == 'ACCTID':
+                conta_atual = html.unescape(conteudo.strip())
+
+    for bloco in ler_blocos(arquivo, tamanho_bloco):
+        if isinstance(bloco, str):
+            texto = bloco
+        else:
+            if decodificador is None:
+                decodificador = codecs.getincrementaldecoder(
+                    detectar_encoding(bloco[:1024]))(errors='replace')
+            texto = decodificador.decode(bloco)
+
+        buffer += texto
+
+        # Só processa até a última tag aberta, que pode estar incompleta
+        corte = buffer.rfind('<')
+        if corte <= 0:
+            continue
+
+        yield from processar(buffer[:corte])
+        buffer = buffer[corte:]
+
+    if decodificador is not None:
+        buffer += decodificador.decode(b'', final=True)
+    yield from processar(buffer)
+
+    if campos:
+        yield criar_lancamento(conta_atual, campos)
+
+
+def analisar_arquivo_ofx(nome, origem):
+    """
+    Lê um arquivo OFX inteiro para a importação em lote
+
+    Executada nos processos de leitura da importação em lote: não acessa o
+    banco nem depende do Django, e a falha de um arquivo é devolvida em
+    'erro' para não interromper os demais.
+
+    Args:
+        nome: Nome do arquivo exibido no resultado
+        origem: Conteúdo do arquivo (bytes) ou caminho no disco
+
+    Returns:
+        dict: 'nome', 'banco' (primeiro BANKID do arquivo ou ''),
+        'lancamentos' (lista de LancamentoOFX), 'segundos' e 'erro'
+    """
+    inicio = time.perf_counter()
+    resultado = {'nome': nome, 'banco': '', 'lancamentos': [], 'erro': ''}
+
+    try:
+        if isinstance(origem, bytes):
+            conteudo = origem
+        else:
+            with open(origem, 'rb') as arquivo:
+                conteudo = arquivo.read()
+
+        banco = BANKID.search(conteudo)
+        if banco:
+            resultado['banco'] = banco.group(1).decode('ascii', 'replace')
+        resultado['lancamentos'] = list(
+            ler_transacoes_ofx(io.BytesIO(conteudo)))
+    except (OSError, LookupError, ValueError) as e:
+        resultado['erro'] = str(e)
+
+    resultado['segundos'] = time.perf_counter() - inicio
+    return resultado
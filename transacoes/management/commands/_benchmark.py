@@ -0,0 +1,116 @@
+"""
+Utilitários compartilhados pelos comandos de benchmark
+"""
+import io
+from datetime import date, timedelta
+
+DESCRICOES = [
+    'SUPERMERCADO EXTRA',
+    'POSTO SHELL GASOLINA',
+    'UBER TRIP',
+    'FARMACIA DROGASIL',
+    'NETFLIX.COM',
+    'RESTAURANTE SABOR',
+    'PAGAMENTO SALARIO',
+    'CONDOMINIO EDIFICIO',
+    'IFOOD *PEDIDO',
+    'LIVRARIA CULTURA',
+]
+
+CABECALHO = """OFXHEADER:100
+DATA:OFXSGML
+VERSION:102
+SECURITY:NONE
+ENCODING:USASCII
+CHARSET:1252
+COMPRESSION:NONE
+OLDFILEUID:NONE
+NEWFILEUID:NONE
+
+<OFX>
+<SIGNONMSGSRSV1><SONRS><STATUS><CODE>0<SEVERITY>INFO</STATUS>
+<DTSERVER>20240101120000<LANGUAGE>POR</SONRS></SIGNONMSGSRSV1>
+<BANKMSGSRSV1><STMTTRNRS><TRNUID>1001
+<STATUS><CODE>0<SEVERITY>INFO</STATUS>
+<STMTRS><CURDEF>BRL
+<BANKACCTFROM><BANKID>0001<ACCTID>{conta}<ACCTTYPE>CHECKING</BANKACCTFROM>
+<BANKTRANLIST><DTSTART>{inicio}<DTEND>{fim}
+"""
+
+RODAPE = """</BANKTRANLIST>
+<LEDGERBAL><BALAMT>0.00<DTASOF>{fim}</LEDGERBAL>
+</STMTRS></STMTTRNRS></BANKMSGSRSV1>
+</OFX>
+"""
+
+
+def linhas_ofx_sintetico(linhas, conta='12345-6', data_inicial=None):
+    """
+    Gera, parte a parte, um extrato OFX (SGML) com os lançamentos informados
+
+    Args:
+        linhas: Quantidade de lançamentos STMTTRN
+        conta: Número da conta informado em ACCTID
+        data_inicial: Data do primeiro lançamento (padrão: 01/01/2020)
+
+    Yields:
+        str: Cabeçalho, um STMTTRN por vez e rodapé
+    """
+    data_inicial = data_inicial or date(2020, 1, 1)
+    data_final = data_inicial + timedelta(days=linhas // 10)
+
+    yield CABECALHO.format(
+        conta=conta,
+        inicio=data_inicial.strftime('%Y%m%d'),
+        fim=data_final.strftime('%Y%m%d'),
+    )
+
+    for i in range(linhas):
+        data = data_inicial + timedelta(days=i // 10)
+        receita = i % 10 == 6
+        valor = (3500 + i % 7) if receita else -(10 + (i * 37) % 490)
+        yield (
+            '<STMTTRN>'
+            f'<TRNTYPE>{"CREDIT" if receita else "DEBIT"}'
+            f'<DTPOSTED>{data.strftime("%Y%m%d")}'
+            f'<TRNAMT>{valor:.2f}'
+            f'<FITID>{i:010d}'
+            f'<MEMO>{DESCRICOES[i % len(DESCRICOES)]} {i}'
+            '</STMTTRN>\n'
+        )
+
+    yield RODAPE.format(fim=data_final.strftime('%Y%m%d'))
+
+
+def gerar_ofx_sintetico(linhas, conta='12345-6', data_inicial=None):
+    """
+    Gera um extrato OFX (SGML) em memória
+
+    Returns:
+        io.BytesIO: Arquivo pronto para ser lido pelo parser
+    """
+    conteudo = ''.join(linhas_ofx_sintetico(linhas, conta, data_inicial))
+    arquivo = io.BytesIO(conteudo.encode('ascii'))
+    arquivo.name = f'sintetico_{linhas}.ofx'
+    return arquivo
+
+
+def escrever_ofx_sintetico(caminho, linhas, conta='12345-6'):
+    """Grava o extrato sintético em disco sem montá-lo em memória"""
+    with open(caminho, 'w', encoding='ascii') as arquivo:
+        arquivo.writelines(linhas_ofx_sintetico(linhas, conta))
+
+
+class ContadorConsultas:
+    """
+    Conta as consultas executadas (sem o limite do log do Django)
+
+    Uso: with connection.execute_wrapper(contador): ...
+    """
+
+    def __init__(self):
+        self.total = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.total += 1
+        return execute(sql, params, many, context)
@@ -0,0 +1,110 @@
+"""
+Comando para comparar a busca por icontains com o índice de busca textual
+
+As transações sintéticas são gravadas dentro de uma transação do banco
+desfeita ao final, de modo que nada permanece após a medição.
+"""
+import statistics
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+
+from transacoes.busca import filtrar_busca, indice_disponivel
+from transacoes.models import Categoria, Transacao
+from ._benchmark import DESCRICOES
+
+TERMOS = ['farmacia', 'merc', 'uber trip', 'sabor', 'inexistente']
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede a busca de transações com icontains e com o índice de busca '
+        'textual em uma base sintética'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--linhas', type=int, default=1000000,
+            help='Transações geradas (padrão: 1000000)')
+        parser.add_argument(
+            '--repeticoes', type=int, default=5,
+            help='Execuções de cada busca; é exibida a mediana (padrão: 5)')
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Registros por INSERT na geração (padrão: 5000)')
+
+    def handle(self, *args, **options):
+        if not indice_disponivel():
+            raise CommandError(
+                'Índice de busca indisponível; execute migrate ou '
+                'reconstruir_busca')
+
+        linhas = options['linhas']
+        self.stdout.write('=== BENCHMARK DE BUSCA TEXTUAL ===')
+
+        with transaction.atomic():
+            usuario = User.objects.create_user(f'benchmark_busca_{time.time_ns()}')
+            categoria = Categoria.objects.create(
+                nome='Benchmark', tipo='DESPESA', usuario=usuario)
+
+            inicio = time.perf_counter()
+            self._gerar(usuario, categoria, linhas, options['batch_size'])
+            self.stdout.write(
+                f'{linhas} transações geradas (com índice) em '
+                f'{time.perf_counter() - inicio:.1f}s')
+            self.stdout.write('')
+            self.stdout.write(
+                f'{"Busca":<14}{"icontains":>22}{"índice":>22}{"ganho":>8}')
+
+            transacoes = Transacao.objects.filter(usuario=usuario)
+            for termo in TERMOS:
+                contains = transacoes.filter(
+                    Q(descricao__icontains=termo)
+                    | Q(categoria__nome__icontains=termo))
+                indice = filtrar_busca(transacoes, usuario, termo)
+
+                tempo_contains, total_contains = self._medir(
+                    contains, options['repeticoes'])
+                tempo_indice, total_indice = self._medir(
+                    indice, options['repeticoes'])
+
+                ganho = tempo_contains / tempo_indice if tempo_indice else 0
+                self.stdout.write(
+                    f'{termo:<14}'
+                    f'{total_contains:>10} em {tempo_contains * 1000:>7.1f}ms'
+                    f'{total_indice:>10} em {tempo_indice * 1000:>7.1f}ms'
+                    f'{ganho:>7.1f}x')
+
+            transaction.set_rollback(True)
+
+        self.stdout.write('')
+        self.stdout.write(self.style.SUCCESS(
+            'Tempos: mediana da primeira página (20 linhas) mais o total'))
+
+    def _gerar(self, usuario, categoria, linhas, batch_size):
+        data_inicial = date(2015, 1, 1)
+        for inicio in range(0, linhas, batch_size):
+            Transacao.objects.bulk_create([
+                Transacao(
+                    descricao=f'{DESCRICOES[i % len(DESCRICOES)]} {i}',
+                    valor=Decimal(10 + i % 490), tipo='DESPESA',
+                    data=data_inicial + timedelta(days=i % 3650),
+                    categoria=categoria, usuario=usuario
+                )
+                for i in range(inicio, min(inicio + batch_size, linhas))
+            ])
+
+    def _medir(self, consulta, repeticoes):
+        """Mediana do tempo da primeira página mais a contagem"""
+        tempos = []
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            list(consulta.order_by('-data', '-criado_em', '-id')[:20])
+            total = consulta.count()
+            tempos.append(time.perf_counter() - inicio)
+        return statistics.median(tempos), total
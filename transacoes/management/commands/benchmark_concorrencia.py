@@ -0,0 +1,176 @@
+"""
+Comando para medir importações e leituras do dashboard em paralelo
+
+Roda contra o banco configurado (DB_ENGINE, SQLITE_JOURNAL_MODE, DB_POOL,
+...): cada perfil é comparado executando o comando com o .env
+correspondente. Os usuários criados para a medição são excluídos ao final.
+"""
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection
+
+from dashboard.views import calcular_contexto_dashboard
+from transacoes.models import Categoria
+from transacoes.utils import salvar_transacoes_ofx
+from ._benchmark import DESCRICOES
+
+DATA_INICIAL = date(2024, 1, 1)
+
+
+def percentil(valores, fracao):
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * fracao))]
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede importações OFX e leituras do dashboard simultâneas no '
+        'perfil de banco configurado'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--importadores', type=int, default=4,
+            help='Threads importando ao mesmo tempo (padrão: 4)')
+        parser.add_argument(
+            '--importacoes', type=int, default=3,
+            help='Importações por thread (padrão: 3)')
+        parser.add_argument(
+            '--linhas', type=int, default=1000,
+            help='Transações por importação (padrão: 1000)')
+        parser.add_argument(
+            '--leitores', type=int, default=4,
+            help='Threads lendo o dashboard durante as importações '
+                 '(padrão: 4)')
+        parser.add_argument(
+            '--batch-size', type=int, default=None,
+            help='Registros por INSERT (padrão: settings.OFX_BULK_BATCH_SIZE)')
+
+    def handle(self, *args, **options):
+        prefixo = f'benchmark_{uuid.uuid4().hex[:8]}'
+        usuarios = []
+        for i in range(options['importadores']):
+            usuario = User.objects.create_user(f'{prefixo}_{i}')
+            categoria = Categoria.objects.create(
+                nome='Benchmark', tipo='DESPESA', usuario=usuario)
+            usuarios.append((usuario, categoria))
+
+        self.stdout.write('=== BENCHMARK DE CONCORRÊNCIA ===')
+        self.stdout.write(f'Perfil: {self._perfil()}')
+        self.stdout.write(
+            f"Importadores: {options['importadores']} x "
+            f"{options['importacoes']} importações de {options['linhas']} "
+            f"linhas | Leitores: {options['leitores']}")
+        self.stdout.write('')
+
+        importando = threading.Event()
+        importando.set()
+        tempos_importacao, tempos_leitura, erros = [], [], []
+        importadas = []
+
+        def importar(indice):
+            usuario, categoria = usuarios[indice]
+            try:
+                for n in range(options['importacoes']):
+                    dados = self._gerar_dados(
+                        options['linhas'], categoria, f'{prefixo}_{indice}_{n}')
+                    inicio = time.perf_counter()
+                    resultado = salvar_transacoes_ofx(
+                        dados, usuario, None, f'{prefixo}.ofx',
+                        batch_size=options['batch_size'])
+                    tempos_importacao.append(time.perf_counter() - inicio)
+                    if resultado['sucesso']:
+                        importadas.append(resultado['importadas'])
+                    else:
+                        erros.append(resultado['erro'])
+            finally:
+                connection.close()
+
+        def ler(indice):
+            usuario, _ = usuarios[indice % len(usuarios)]
+            try:
+                while importando.is_set():
+                    inicio = time.perf_counter()
+                    try:
+                        calcular_contexto_dashboard(
+                            usuario, DATA_INICIAL.year, DATA_INICIAL.month)
+                    except OperationalError as e:
+                        erros.append(str(e))
+                        continue
+                    tempos_leitura.append(time.perf_counter() - inicio)
+            finally:
+                connection.close()
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(
+                max_workers=options['importadores'] + options['leitores']
+        ) as executor:
+            leitores = [executor.submit(ler, i)
+                        for i in range(options['leitores'])]
+            importadores = [executor.submit(importar, i)
+                            for i in range(options['importadores'])]
+            for futuro in importadores:
+                futuro.result()
+            importando.clear()
+            for futuro in leitores:
+                futuro.result()
+        duracao = time.perf_counter() - inicio
+
+        total = sum(importadas)
+        self.stdout.write(
+            f'Importações: {len(importadas)} de {len(tempos_importacao)} '
+            f'em {duracao:.2f}s '
+            f'({total / duracao:.0f} transações/s), '
+            f'p50 {percentil(tempos_importacao, 0.5):.2f}s, '
+            f'p95 {percentil(tempos_importacao, 0.95):.2f}s')
+        self.stdout.write(
+            f'Leituras do dashboard: {len(tempos_leitura)}, '
+            f'p50 {percentil(tempos_leitura, 0.5) * 1000:.1f}ms, '
+            f'p95 {percentil(tempos_leitura, 0.95) * 1000:.1f}ms')
+
+        bloqueios = sum('locked' in erro for erro in erros)
+        estilo = self.style.ERROR if erros else self.style.SUCCESS
+        self.stdout.write(estilo(
+            f'Erros: {len(erros)} ({bloqueios} "database is locked")'))
+        for erro in sorted(set(erros))[:5]:
+            self.stdout.write(f'  {erro}')
+
+        User.objects.filter(username__startswith=prefixo).delete()
+
+    def _perfil(self):
+        configuracao = connection.settings_dict
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode')
+                journal = cursor.fetchone()[0]
+                cursor.execute('PRAGMA synchronous')
+                synchronous = cursor.fetchone()[0]
+            return (f'sqlite (journal_mode={journal}, '
+                    f'synchronous={synchronous}, '
+                    f"CONN_MAX_AGE={configuracao['CONN_MAX_AGE']})")
+
+        pool = configuracao['OPTIONS'].get('pool')
+        return (f"{connection.vendor} (CONN_MAX_AGE="
+                f"{configuracao['CONN_MAX_AGE']}, pool={pool or 'não'})")
+
+    def _gerar_dados(self, linhas, categoria, prefixo):
+        """Monta dados no mesmo formato produzido pelo preview"""
+        return [
+            {
+                'descricao': f'{DESCRICOES[i % len(DESCRICOES)]} {i}',
+                'valor': float(10 + i % 490),
+                'tipo': 'DESPESA',
+                'data': (DATA_INICIAL + timedelta(days=i % 90)).isoformat(),
+                'categoria_id': categoria.id,
+                'identificador_ofx': f'{prefixo}_{i}',
+            }
+            for i in range(linhas)
+        ]
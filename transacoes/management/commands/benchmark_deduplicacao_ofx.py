@@ -0,0 +1,98 @@
+"""
+Comando para medir o custo da detecção de duplicatas na importação OFX
+"""
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from transacoes.models import Transacao
+from transacoes.leitor_ofx import ler_transacoes_ofx
+from transacoes.utils import (
+    buscar_identificadores_existentes, gerar_identificador_ofx
+)
+from ._benchmark import ContadorConsultas, gerar_ofx_sintetico
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara a deduplicação OFX linha a linha com a verificação em lote '
+        '(quantidade de consultas e tempo)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--usuario-id',
+            type=int,
+            default=1,
+            help='ID do usuário usado nas consultas (padrão: 1)'
+        )
+        parser.add_argument(
+            '--linhas',
+            type=int,
+            default=10000,
+            help='Quantidade de lançamentos no arquivo gerado (padrão: 10000)'
+        )
+
+    def handle(self, *args, **options):
+        usuario_id = options['usuario_id']
+        linhas = options['linhas']
+
+        try:
+            usuario = User.objects.get(id=usuario_id)
+        except User.DoesNotExist:
+            self.stdout.write(
+                self.style.ERROR(f'Usuário com ID {usuario_id} não encontrado')
+            )
+            return
+
+        self.stdout.write('=== BENCHMARK DE DEDUPLICAÇÃO OFX ===')
+        self.stdout.write(f'Lançamentos no arquivo: {linhas}')
+
+        inicio = time.perf_counter()
+        identificadores = [
+            gerar_identificador_ofx(lancamento)
+            for lancamento in ler_transacoes_ofx(gerar_ofx_sintetico(linhas))
+        ]
+        self.stdout.write(
+            f'Parse do arquivo: {time.perf_counter() - inicio:.2f}s')
+        self.stdout.write('')
+
+        # Estratégia anterior: uma consulta exists() por lançamento
+        consultas = ContadorConsultas()
+        with connection.execute_wrapper(consultas):
+            inicio = time.perf_counter()
+            duplicadas = sum(
+                1 for identificador in identificadores
+                if Transacao.objects.filter(
+                    usuario=usuario,
+                    identificador_ofx=identificador
+                ).exists()
+            )
+            tempo_linha = time.perf_counter() - inicio
+        self._relatorio('Linha a linha', consultas.total, tempo_linha,
+                        duplicadas)
+
+        # Estratégia em lote
+        consultas = ContadorConsultas()
+        with connection.execute_wrapper(consultas):
+            inicio = time.perf_counter()
+            existentes = buscar_identificadores_existentes(
+                usuario, identificadores)
+            duplicadas = sum(1 for i in identificadores if i in existentes)
+            tempo_lote = time.perf_counter() - inicio
+        self._relatorio('Em lote', consultas.total, tempo_lote, duplicadas)
+
+        if tempo_lote > 0:
+            self.stdout.write('')
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'Ganho: {tempo_linha / tempo_lote:.1f}x mais rápido')
+            )
+
+    def _relatorio(self, titulo, consultas, tempo, duplicadas):
+        self.stdout.write(
+            f'{titulo}: {consultas} consultas, {tempo:.3f}s, '
+            f'{duplicadas} duplicatas encontradas'
+        )
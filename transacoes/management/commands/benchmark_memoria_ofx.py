@@ -0,0 +1,120 @@
+"""
+Comando para medir o pico de memória da leitura de arquivos OFX
+
+Cada medição roda em um processo separado, para que o pico de RSS
+(ru_maxrss) de uma leitura não contamine a seguinte.
+"""
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from transacoes.leitor_ofx import ler_transacoes_ofx
+from transacoes.utils import gerar_identificador_ofx
+from ._benchmark import escrever_ofx_sintetico
+
+PARSERS = ('stream', 'ofxparse')
+
+
+def pico_rss_mb():
+    """Pico de memória residente do processo atual, em MB"""
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss é informado em KB no Linux e em bytes no macOS
+    return pico / (1024 * 1024) if sys.platform == 'darwin' else pico / 1024
+
+
+def ler_com_parser(caminho, parser):
+    """Lê todos os lançamentos do arquivo e devolve a quantidade"""
+    with open(caminho, 'rb') as arquivo:
+        if parser == 'stream':
+            return sum(
+                1 for lancamento in ler_transacoes_ofx(arquivo)
+                if gerar_identificador_ofx(lancamento)
+            )
+
+        # Importado só aqui para não pesar na medição do leitor em fluxo
+        import ofxparse
+        ofx = ofxparse.OfxParser.parse(arquivo)
+        return sum(
+            len(account.statement.transactions) for account in ofx.accounts
+        )
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara o pico de memória da leitura OFX em fluxo com o ofxparse '
+        'para arquivos de tamanhos crescentes'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--linhas', type=int, nargs='+',
+            default=[2000, 10000, 40000],
+            help='Tamanhos dos arquivos gerados (padrão: 2000 10000 40000)')
+        parser.add_argument(
+            '--parser', choices=PARSERS, action='append',
+            help='Parser a medir (padrão: ambos)')
+        parser.add_argument(
+            '--medir', type=str,
+            help='Uso interno: mede a leitura do arquivo neste processo')
+
+    def handle(self, *args, **options):
+        parsers = options['parser'] or list(PARSERS)
+
+        if options['medir']:
+            self._medir(options['medir'], parsers[0])
+            return
+
+        self.stdout.write('=== BENCHMARK DE MEMÓRIA NA LEITURA OFX ===')
+        self.stdout.write(
+            f'{"Lançamentos":>12} {"Arquivo":>10} '
+            + ''.join(f'{p + " (MB)":>16}{"tempo":>9}' for p in parsers)
+        )
+
+        with tempfile.TemporaryDirectory() as diretorio:
+            for linhas in options['linhas']:
+                caminho = os.path.join(diretorio, f'extrato_{linhas}.ofx')
+                escrever_ofx_sintetico(caminho, linhas)
+                tamanho_mb = os.path.getsize(caminho) / (1024 * 1024)
+
+                colunas = []
+                for parser in parsers:
+                    pico, tempo = self._medir_em_subprocesso(caminho, parser)
+                    colunas.append(f'{pico:>16.1f}{tempo:>8.2f}s')
+
+                self.stdout.write(
+                    f'{linhas:>12} {tamanho_mb:>8.1f}MB ' + ''.join(colunas)
+                )
+                os.remove(caminho)
+
+        self.stdout.write('')
+        self.stdout.write(self.style.SUCCESS(
+            'Valores em MB acima do processo ocioso (Django já carregado)'
+        ))
+
+    def _medir(self, caminho, parser):
+        """Executa a leitura e imprime 'pico_mb tempo quantidade'"""
+        base = pico_rss_mb()
+        inicio = time.perf_counter()
+        quantidade = ler_com_parser(caminho, parser)
+        tempo = time.perf_counter() - inicio
+        self.stdout.write(f'{pico_rss_mb() - base:.2f} {tempo:.4f} {quantidade}')
+
+    def _medir_em_subprocesso(self, caminho, parser):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings.SETTINGS_MODULE)
+        resultado = subprocess.run(
+            [sys.executable, '-m', 'django', 'benchmark_memoria_ofx',
+             '--medir', caminho, '--parser', parser],
+            capture_output=True, text=True, env=env, cwd=settings.BASE_DIR
+        )
+        if resultado.returncode != 0:
+            raise CommandError(
+                f'Falha ao medir com {parser}: {resultado.stderr.strip()}')
+
+        pico, tempo, _ = resultado.stdout.split()
+        return float(pico), float(tempo)
@@ -0,0 +1,145 @@
+"""
+Comando para comparar a gravação OFX linha a linha com a gravação em lote
+"""
+import time
+import uuid
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from transacoes.models import Categoria, ImportacaoOFX, Transacao
+from transacoes.utils import obter_categoria_automatica, salvar_transacoes_ofx
+from ._benchmark import ContadorConsultas
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara a gravação de transações confirmadas linha a linha com '
+        'o pipeline em lote (bulk_create)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--usuario-id',
+            type=int,
+            default=1,
+            help='ID do usuário usado na gravação (padrão: 1)'
+        )
+        parser.add_argument(
+            '--linhas',
+            type=int,
+            default=5000,
+            help='Quantidade de transações gravadas (padrão: 5000)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=None,
+            help='Registros por INSERT no modo em lote '
+                 '(padrão: settings.OFX_BULK_BATCH_SIZE)'
+        )
+
+    def handle(self, *args, **options):
+        usuario_id = options['usuario_id']
+        linhas = options['linhas']
+
+        try:
+            usuario = User.objects.get(id=usuario_id)
+        except User.DoesNotExist:
+            self.stdout.write(
+                self.style.ERROR(f'Usuário com ID {usuario_id} não encontrado')
+            )
+            return
+
+        categoria = obter_categoria_automatica(
+            'Benchmark', 'DESPESA', usuario)
+
+        self.stdout.write('=== BENCHMARK DE GRAVAÇÃO OFX ===')
+        self.stdout.write(f'Transações: {linhas}')
+        self.stdout.write('')
+
+        # Caminho anterior: uma consulta de categoria e um INSERT por linha
+        prefixo = f'benchmark_{uuid.uuid4().hex[:8]}'
+        dados = self._gerar_dados(linhas, categoria, prefixo)
+        consultas = ContadorConsultas()
+        with connection.execute_wrapper(consultas):
+            inicio = time.perf_counter()
+            self._salvar_linha_a_linha(dados, usuario)
+            tempo_linha = time.perf_counter() - inicio
+        self._relatorio('Linha a linha', consultas.total, tempo_linha, linhas)
+        self._limpar(usuario, prefixo)
+
+        # Pipeline em lote
+        prefixo = f'benchmark_{uuid.uuid4().hex[:8]}'
+        dados = self._gerar_dados(linhas, categoria, prefixo)
+        consultas = ContadorConsultas()
+        with connection.execute_wrapper(consultas):
+            inicio = time.perf_counter()
+            resultado = salvar_transacoes_ofx(
+                dados, usuario, None, f'{prefixo}.ofx',
+                batch_size=options['batch_size']
+            )
+            tempo_lote = time.perf_counter() - inicio
+        if not resultado['sucesso']:
+            self.stdout.write(
+                self.style.ERROR(f'Erro na gravação: {resultado["erro"]}'))
+        self._relatorio('Em lote', consultas.total, tempo_lote, linhas)
+        self._limpar(usuario, prefixo)
+
+        if tempo_lote > 0:
+            self.stdout.write('')
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'Ganho: {tempo_linha / tempo_lote:.1f}x mais rápido')
+            )
+
+    def _gerar_dados(self, linhas, categoria, prefixo):
+        """Monta dados no mesmo formato produzido pelo preview"""
+        data_inicial = date(2020, 1, 1)
+        return [
+            {
+                'descricao': f'BENCHMARK {i}',
+                'valor': float(10 + i % 490),
+                'tipo': 'DESPESA',
+                'data': (data_inicial + timedelta(days=i // 10)).isoformat(),
+                'categoria_id': categoria.id,
+                'categoria_nome': categoria.nome,
+                'categoria_cor': categoria.cor,
+                'identificador_ofx': f'{prefixo}_{i}',
+                'conta_bancaria_id': None
+            }
+            for i in range(linhas)
+        ]
+
+    def _salvar_linha_a_linha(self, dados, usuario):
+        for transacao_data in dados:
+            categoria = Categoria.objects.get(
+                id=transacao_data['categoria_id'], usuario=usuario)
+            Transacao.objects.create(
+                descricao=transacao_data['descricao'],
+                valor=Decimal(str(transacao_data['valor'])),
+                tipo=transacao_data['tipo'],
+                data=date.fromisoformat(transacao_data['data']),
+                categoria=categoria,
+                usuario=usuario,
+                identificador_ofx=transacao_data['identificador_ofx'],
+                importada_ofx=True
+            )
+
+    def _limpar(self, usuario, prefixo):
+        Transacao.objects.filter(
+            usuario=usuario, identificador_ofx__startswith=prefixo
+        ).delete()
+        ImportacaoOFX.objects.filter(
+            usuario=usuario, arquivo_nome=f'{prefixo}.ofx'
+        ).delete()
+
+    def _relatorio(self, titulo, consultas, tempo, linhas):
+        taxa = linhas / tempo if tempo > 0 else 0
+        self.stdout.write(
+            f'{titulo}: {consultas} consultas, {tempo:.3f}s '
+            f'({taxa:.0f} transações/s)'
+        )
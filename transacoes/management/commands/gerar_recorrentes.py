@@ -0,0 +1,110 @@
+"""
+Comando para gerar as transações recorrentes de todos os usuários
+
+Pode ser executado pelo cron sem risco de duplicatas, por exemplo:
+    0 3 1 * * python manage.py gerar_recorrentes
+"""
+import time
+from datetime import datetime
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from transacoes.models import TransacaoRecorrente
+from transacoes.previsao import gerar_transacoes_recorrentes
+
+
+def parse_mes(valor):
+    """Converte 'AAAA-MM' no índice absoluto do mês (ano * 12 + mes - 1)"""
+    try:
+        data = datetime.strptime(valor, '%Y-%m')
+    except ValueError:
+        raise CommandError(f'Mês inválido "{valor}", use o formato AAAA-MM')
+    return data.year * 12 + data.month - 1
+
+
+class Command(BaseCommand):
+    help = (
+        'Gera as transações das recorrências ativas de todos os usuários '
+        'para um intervalo de meses (idempotente)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--inicio', type=str,
+            help='Primeiro mês no formato AAAA-MM (padrão: mês atual)')
+        parser.add_argument(
+            '--fim', type=str,
+            help='Último mês no formato AAAA-MM (padrão: igual ao início)')
+        parser.add_argument(
+            '--user', type=str,
+            help='Username do usuário (padrão: todos os usuários)')
+        parser.add_argument(
+            '--chunk-size', type=int, default=500,
+            help='Recorrências processadas por lote (padrão: 500)')
+        parser.add_argument(
+            '--batch-size', type=int, default=None,
+            help='Registros por INSERT (padrão: settings.OFX_BULK_BATCH_SIZE)')
+
+    def handle(self, *args, **options):
+        hoje = timezone.localdate()
+        primeiro_mes = parse_mes(options['inicio']) if options['inicio'] \
+            else hoje.year * 12 + hoje.month - 1
+        ultimo_mes = parse_mes(options['fim']) if options['fim'] \
+            else primeiro_mes
+
+        if ultimo_mes < primeiro_mes:
+            raise CommandError('O mês final deve ser posterior ao inicial')
+
+        recorrentes = TransacaoRecorrente.objects.filter(
+            ativa=True).order_by('id')
+
+        username = options.get('user')
+        usuario = None
+        if username:
+            try:
+                usuario = User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise CommandError(f'Usuário "{username}" não encontrado')
+            recorrentes = recorrentes.filter(usuario=usuario)
+
+        chunk_size = options['chunk_size']
+        total_recorrentes = 0
+        total_geradas = 0
+        total_ignoradas = 0
+        inicio = time.perf_counter()
+
+        lote = []
+        for recorrente in recorrentes.iterator(chunk_size=chunk_size):
+            lote.append(recorrente)
+            if len(lote) >= chunk_size:
+                geradas, ignoradas = gerar_transacoes_recorrentes(
+                    lote, primeiro_mes, ultimo_mes, usuario,
+                    options['batch_size'])
+                total_recorrentes += len(lote)
+                total_geradas += geradas
+                total_ignoradas += ignoradas
+                lote = []
+
+        if lote:
+            geradas, ignoradas = gerar_transacoes_recorrentes(
+                lote, primeiro_mes, ultimo_mes, usuario,
+                options['batch_size'])
+            total_recorrentes += len(lote)
+            total_geradas += geradas
+            total_ignoradas += ignoradas
+
+        tempo = time.perf_counter() - inicio
+        taxa = total_geradas / tempo if tempo > 0 else 0
+
+        self.stdout.write(
+            f'{total_recorrentes} recorrências processadas: '
+            f'{total_geradas} transações geradas, '
+            f'{total_ignoradas} já existentes'
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Comando concluído em {tempo:.2f}s ({taxa:.0f} transações/s)'
+            )
+        )
@@ -0,0 +1,105 @@
+"""
+Comando para importar de uma vez todos os arquivos OFX de um diretório ou ZIP
+
+Cada arquivo é associado à conta do usuário com o mesmo número (ACCTID do
+extrato); arquivos sem conta correspondente usam a --conta-padrao, se
+informada. As transações vão direto para a base, sem a etapa de
+confirmação do upload, e cada arquivo gera um registro no histórico de
+importações.
+"""
+import zipfile
+from contextlib import ExitStack
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from transacoes.importacao_lote import importar_lote_ofx, listar_arquivos_ofx
+from transacoes.models import ContaBancaria
+
+
+class Command(BaseCommand):
+    help = 'Importa todos os arquivos OFX de um diretório ou arquivo ZIP'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'origem', help='Diretório (incluindo subdiretórios) ou ZIP')
+        parser.add_argument(
+            '--user', type=str, required=True,
+            help='Username do usuário')
+        parser.add_argument(
+            '--processos', type=int, default=None,
+            help='Processos de leitura (padrão: settings.OFX_LOTE_PROCESSOS '
+                 'ou um por CPU)')
+        parser.add_argument(
+            '--batch-size', type=int, default=None,
+            help='Registros por INSERT (padrão: settings.OFX_BULK_BATCH_SIZE)')
+        parser.add_argument(
+            '--conta-padrao', type=int, default=None,
+            help='ID da conta usada quando o extrato não corresponde a '
+                 'nenhuma conta do usuário')
+
+    def handle(self, *args, **options):
+        try:
+            usuario = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f'Usuário "{options["user"]}" não encontrado')
+
+        conta_padrao = None
+        if options['conta_padrao']:
+            conta_padrao = ContaBancaria.objects.filter(
+                pk=options['conta_padrao'], usuario=usuario).first()
+            if conta_padrao is None:
+                raise CommandError(
+                    f'Conta {options["conta_padrao"]} não encontrada')
+
+        with ExitStack() as pilha:
+            try:
+                arquivos = pilha.enter_context(
+                    listar_arquivos_ofx(options['origem']))
+            except (ValueError, zipfile.BadZipFile) as e:
+                raise CommandError(str(e))
+            if not arquivos:
+                raise CommandError('Nenhum arquivo OFX encontrado')
+
+            self.stdout.write(f'Importando {len(arquivos)} arquivos OFX...')
+
+            resultado = importar_lote_ofx(
+                arquivos, usuario,
+                processos=options['processos'],
+                batch_size=options['batch_size'],
+                conta_padrao=conta_padrao,
+                ao_concluir=self._mostrar_arquivo)
+
+        segundos = resultado['segundos']
+        self.stdout.write('')
+        self.stdout.write(
+            f"Total: {len(resultado['arquivos'])} arquivos, "
+            f"{resultado['total']} lançamentos em {segundos:.2f}s "
+            f"({resultado['total'] / segundos:.0f} lançamentos/s, "
+            f"{len(resultado['arquivos']) / segundos:.1f} arquivos/s)")
+
+        estilo = self.style.ERROR if resultado['erros'] else self.style.SUCCESS
+        self.stdout.write(estilo(
+            f"{resultado['importadas']} importadas, "
+            f"{resultado['duplicadas']} duplicadas, "
+            f"{resultado['erros']} arquivos com erro"))
+
+    def _mostrar_arquivo(self, resultado, concluidos):
+        if resultado['erro']:
+            self.stdout.write(self.style.ERROR(
+                f"{resultado['arquivo']}: erro - {resultado['erro']}"))
+            return
+
+        segundos = resultado['segundos_leitura'] + \
+            resultado['segundos_gravacao']
+        contas = ', '.join(
+            conta or 'sem conta' for conta in resultado['contas']) or '-'
+        self.stdout.write(
+            f"{resultado['arquivo']} [{contas}]: "
+            f"{resultado['total']} lançamentos, "
+            f"{resultado['importadas']} importadas, "
+            f"{resultado['duplicadas']} duplicadas | "
+            f"leitura {resultado['segundos_leitura']:.2f}s, "
+            f"gravação {resultado['segundos_gravacao']:.2f}s "
+            f"({resultado['total'] / segundos if segundos else 0:.0f} "
+            f"lançamentos/s)")
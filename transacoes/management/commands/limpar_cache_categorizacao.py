@@ -0,0 +1,50 @@
+"""
+Comando para remover as entradas vencidas ou pouco usadas do cache de
+categorização e exibir suas estatísticas
+"""
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count, Sum
+
+from transacoes.cache_categorizacao import limpar_cache_expirado
+from transacoes.models import CategorizacaoCache
+
+
+class Command(BaseCommand):
+    help = 'Remove entradas vencidas/excedentes do CategorizacaoCache'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', type=str,
+            help='Username do usuário (padrão: todos os usuários)')
+        parser.add_argument(
+            '--maximo', type=int, default=None,
+            help='Entradas mantidas por usuário '
+                 '(padrão: settings.CATEGORIZACAO_CACHE_MAX_POR_USUARIO)')
+
+    def handle(self, *args, **options):
+        usuario = None
+        username = options.get('user')
+        if username:
+            try:
+                usuario = User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise CommandError(f'Usuário "{username}" não encontrado')
+
+        vencidas, excedentes = limpar_cache_expirado(
+            usuario, options['maximo'])
+        self.stdout.write(
+            f'{vencidas} entradas vencidas e {excedentes} excedentes removidas')
+
+        entradas = CategorizacaoCache.objects.all()
+        if usuario is not None:
+            entradas = entradas.filter(usuario=usuario)
+        totais = entradas.aggregate(total=Count('id'), acertos=Sum('acertos'))
+
+        acertos = totais['acertos'] or 0
+        consultas = acertos + totais['total']
+        taxa = acertos / consultas if consultas else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'{totais["total"]} entradas no cache, {acertos} acertos '
+            f'(taxa de acerto estimada: {taxa:.0%})'
+        ))
@@ -0,0 +1,32 @@
+"""
+Comando para remover os previews de importação OFX não confirmados
+
+Pode ser agendado no cron, por exemplo:
+    30 * * * * python manage.py limpar_staging_ofx
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from transacoes.staging import limpar_staging_expirado
+
+
+class Command(BaseCommand):
+    help = 'Remove os lotes de ImportacaoStaging expirados'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--horas', type=int, default=None,
+            help='Validade em horas (padrão: settings.OFX_STAGING_VALIDADE_HORAS)')
+
+    def handle(self, *args, **options):
+        horas = options['horas']
+        if horas is not None and horas < 0:
+            raise CommandError('A validade deve ser positiva')
+
+        validade = timedelta(hours=horas) if horas is not None else None
+        removidas = limpar_staging_expirado(validade)
+
+        self.stdout.write(
+            self.style.SUCCESS(f'{removidas} linhas de staging removidas')
+        )
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.contrib.auth.models import User
+from transacoes.saldos import recalcular_saldos
+
+
+class Command(BaseCommand):
+    help = 'Recalcula o saldo em cache das contas bancárias'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', type=str,
+            help='Username do usuário (padrão: todos os usuários)')
+
+    def handle(self, *args, **options):
+        username = options.get('user')
+        usuario = None
+
+        if username:
+            try:
+                usuario = User.objects.get(username=username)
+            except User.DoesNotExist:
+                self.stdout.write(
+                    self.style.ERROR(f'Usuário "{username}" não encontrado')
+                )
+                return
+
+        total = recalcular_saldos(usuario)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Saldos recalculados! {total} contas atualizadas'
+            )
+        )
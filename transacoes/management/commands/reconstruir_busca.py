@@ -0,0 +1,31 @@
+"""
+Comando para recriar o índice de busca textual das transações
+
+Necessário após restaurar um backup sem a tabela de busca ou após uma
+migração que recrie transacoes_transacao no SQLite (o que descarta os
+triggers que mantêm o índice).
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from transacoes.busca import indice_disponivel, reconstruir_indice_busca
+from transacoes.models import Transacao
+
+
+class Command(BaseCommand):
+    help = 'Recria e repopula o índice de busca textual das transações'
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        reconstruir_indice_busca()
+
+        if not indice_disponivel():
+            self.stdout.write(self.style.WARNING(
+                'Banco sem suporte à busca textual; a busca usa icontains'))
+            return
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Índice de busca reconstruído: {Transacao.objects.count()} '
+            f'transações em {time.perf_counter() - inicio:.1f}s'
+        ))
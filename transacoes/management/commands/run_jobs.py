@@ -0,0 +1,78 @@
+"""
+Worker que executa os jobs em segundo plano (importação OFX)
+
+Vários processos podem rodar ao mesmo tempo, por exemplo:
+    python manage.py run_jobs &
+    python manage.py run_jobs &
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from transacoes.jobs import (
+    executar_job, identificar_worker, liberar_jobs_travados,
+    reservar_proximo_job
+)
+
+
+class Command(BaseCommand):
+    help = 'Executa os jobs pendentes da fila (Job) em um laço contínuo'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--intervalo', type=float, default=1.0,
+            help='Segundos de espera quando a fila está vazia (padrão: 1)')
+        parser.add_argument(
+            '--ate-esvaziar', action='store_true',
+            help='Encerra quando não houver mais jobs pendentes')
+        parser.add_argument(
+            '--max-jobs', type=int, default=None,
+            help='Encerra após executar esta quantidade de jobs')
+
+    def handle(self, *args, **options):
+        intervalo = options['intervalo']
+        if intervalo < 0:
+            raise CommandError('O intervalo deve ser positivo')
+
+        worker = identificar_worker()
+        max_jobs = options['max_jobs']
+        executados = 0
+
+        self.stdout.write(f'Worker {worker} aguardando jobs...')
+
+        try:
+            while max_jobs is None or executados < max_jobs:
+                close_old_connections()
+
+                devolvidos, esgotados = liberar_jobs_travados()
+                if devolvidos or esgotados:
+                    self.stdout.write(
+                        f'{devolvidos} jobs travados devolvidos à fila, '
+                        f'{esgotados} marcados como erro'
+                    )
+
+                job = reservar_proximo_job(worker)
+                if job is None:
+                    if options['ate_esvaziar']:
+                        break
+                    time.sleep(intervalo)
+                    continue
+
+                inicio = time.perf_counter()
+                sucesso = executar_job(job)
+                tempo = time.perf_counter() - inicio
+                executados += 1
+
+                if sucesso:
+                    self.stdout.write(self.style.SUCCESS(
+                        f'Job {job.pk} ({job.tipo}) concluído em {tempo:.2f}s'
+                    ))
+                else:
+                    self.stdout.write(self.style.ERROR(
+                        f'Job {job.pk} ({job.tipo}) falhou: {job.erro}'
+                    ))
+        except KeyboardInterrupt:
+            self.stdout.write('Interrompido')
+
+        self.stdout.write(f'{executados} jobs executados')
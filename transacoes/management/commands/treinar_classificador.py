@@ -0,0 +1,43 @@
+"""
+Comando para treinar o classificador de categorias de cada usuário
+
+Sem --completo apenas as transações criadas desde o último treino são
+somadas ao modelo; o treino completo incorpora também as categorias
+alteradas manualmente em transações antigas.
+"""
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from transacoes.classificador import treinar_classificador
+
+
+class Command(BaseCommand):
+    help = 'Treina o classificador de categorias com o histórico dos usuários'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', type=str,
+            help='Username do usuário (padrão: todos os usuários)')
+        parser.add_argument(
+            '--completo', action='store_true',
+            help='Descarta o modelo atual e treina com todo o histórico')
+
+    def handle(self, *args, **options):
+        usuarios = User.objects.filter(is_active=True).order_by('id')
+        username = options.get('user')
+        if username:
+            usuarios = usuarios.filter(username=username)
+            if not usuarios.exists():
+                raise CommandError(f'Usuário "{username}" não encontrado')
+
+        for usuario in usuarios:
+            inicio = time.perf_counter()
+            adicionadas = treinar_classificador(
+                usuario, completo=options['completo'])
+            self.stdout.write(
+                f'{usuario.username}: {adicionadas} transações adicionadas '
+                f'em {time.perf_counter() - inicio:.2f}s')
+
+        self.stdout.write(self.style.SUCCESS('Treino concluído'))
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.4 on 2026-10-18 01:50
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transacoes', '0003_alter_transacao_data'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transacao',
+            index=models.Index(fields=['usuario', 'identificador_ofx'], name='transacoes__usuario_26f60f_idx'),
+        ),
+    ]
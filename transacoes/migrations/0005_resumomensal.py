@@ -0,0 +1,68 @@
+# Generated by Django 5.2.4 on 2026-10-18 01:55
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import ExtractMonth, ExtractYear
+
+
+def popular_resumo(apps, schema_editor):
+    Transacao = apps.get_model('transacoes', 'Transacao')
+    ResumoMensal = apps.get_model('transacoes', 'ResumoMensal')
+
+    agrupado = Transacao.objects.annotate(
+        ano=ExtractYear('data'),
+        mes=ExtractMonth('data')
+    ).values(
+        'usuario_id', 'ano', 'mes', 'categoria_id', 'tipo'
+    ).annotate(
+        soma=Sum('valor'),
+        qtd=Count('id')
+    ).order_by()
+
+    ResumoMensal.objects.bulk_create(
+        [
+            ResumoMensal(
+                usuario_id=item['usuario_id'],
+                ano=item['ano'],
+                mes=item['mes'],
+                categoria_id=item['categoria_id'],
+                tipo=item['tipo'],
+                total=item['soma'],
+                quantidade=item['qtd']
+            )
+            for item in agrupado
+        ],
+        batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transacoes', '0004_transacao_usuario_identificador_ofx_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumoMensal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ano', models.IntegerField()),
+                ('mes', models.IntegerField()),
+                ('tipo', models.CharField(choices=[('RECEITA', 'Receita'), ('DESPESA', 'Despesa')], max_length=7)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('quantidade', models.IntegerField(default=0)),
+                ('categoria', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='transacoes.categoria')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Resumos Mensais',
+                'ordering': ['-ano', '-mes'],
+                'constraints': [models.UniqueConstraint(fields=('usuario', 'ano', 'mes', 'categoria', 'tipo'), name='resumo_mensal_unico')],
+            },
+        ),
+        migrations.RunPython(popular_resumo, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.4 on 2026-10-18 01:56
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Case, F, Sum, When
+
+
+def popular_saldo_cache(apps, schema_editor):
+    ContaBancaria = apps.get_model('transacoes', 'ContaBancaria')
+    Transacao = apps.get_model('transacoes', 'Transacao')
+
+    movimentos = Transacao.objects.filter(
+        conta_bancaria__isnull=False
+    ).values('conta_bancaria').annotate(
+        movimento=Sum(Case(
+            When(tipo='RECEITA', then=F('valor')),
+            When(tipo='DESPESA', then=-F('valor')),
+            default=Decimal('0')
+        ))
+    ).order_by()
+
+    for item in movimentos:
+        ContaBancaria.objects.filter(pk=item['conta_bancaria']).update(
+            saldo_cache=item['movimento'] or 0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transacoes', '0005_resumomensal'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contabancaria',
+            name='saldo_cache',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, help_text='Receitas menos despesas lançadas (mantido automaticamente)', max_digits=14),
+        ),
+        migrations.RunPython(popular_saldo_cache, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:32
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transacoes', '0007_transacao_recorrente_unica'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportacaoStaging',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.UUIDField(help_text='Identifica o lote de pré-visualização')),
+                ('posicao', models.IntegerField(help_text='Ordem da transação no arquivo')),
+                ('arquivo_nome', models.CharField(max_length=255)),
+                ('descricao', models.CharField(max_length=200)),
+                ('valor', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('tipo', models.CharField(choices=[('RECEITA', 'Receita'), ('DESPESA', 'Despesa')], max_length=7)),
+                ('data', models.DateField()),
+                ('identificador_ofx', models.CharField(blank=True, max_length=100)),
+                ('melhorada_chatgpt', models.BooleanField(default=False)),
+                ('confianca_ia', models.FloatField(default=0)),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('categoria', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='transacoes.categoria')),
+                ('conta_bancaria', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='transacoes.contabancaria')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Importações em Staging',
+                'ordering': ['token', 'posicao'],
+                'indexes': [models.Index(fields=['token', 'posicao'], name='transacoes__token_39f267_idx'), models.Index(fields=['criado_em'], name='transacoes__criado__bf0b75_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:34
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transacoes', '0008_importacaostaging'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('PREVIEW_OFX', 'Pré-visualização OFX'), ('SALVAR_OFX', 'Importação OFX')], max_length=20)),
+                ('status', models.CharField(choices=[('PENDENTE', 'Pendente'), ('EXECUTANDO', 'Executando'), ('CONCLUIDO', 'Concluído'), ('ERRO', 'Erro')], default='PENDENTE', max_length=10)),
+                ('arquivo', models.FileField(blank=True, upload_to='jobs/%Y/%m/')),
+                ('parametros', models.JSONField(blank=True, default=dict)),
+                ('resultado', models.JSONField(blank=True, default=dict)),
+                ('progresso', models.IntegerField(default=0, help_text='Percentual concluído')),
+                ('mensagem', models.CharField(blank=True, max_length=200)),
+                ('erro', models.TextField(blank=True)),
+                ('worker', models.CharField(blank=True, max_length=100)),
+                ('tentativas', models.IntegerField(default=0)),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('iniciado_em', models.DateTimeField(blank=True, null=True)),
+                ('concluido_em', models.DateTimeField(blank=True, null=True)),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Jobs',
+                'ordering': ['-criado_em'],
+                'indexes': [models.Index(fields=['status', 'criado_em'], name='transacoes__status_183f6d_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:38
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transacoes', '0009_job'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategorizacaoCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('RECEITA', 'Receita'), ('DESPESA', 'Despesa')], max_length=7)),
+                ('chave', models.CharField(help_text='SHA-1 da descrição normalizada', max_length=40)),
+                ('descricao_normalizada', models.CharField(max_length=200)),
+                ('confianca', models.FloatField(default=0)),
+                ('acertos', models.IntegerField(default=0)),
+                ('usado_em', models.DateTimeField(default=django.utils.timezone.now)),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('atualizado_em', models.DateTimeField(auto_now=True)),
+                ('categoria', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='transacoes.categoria')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Cache de Categorização',
+                'ordering': ['-usado_em'],
+                'indexes': [models.Index(fields=['usuario', 'usado_em'], name='transacoes__usuario_1edf1e_idx'), models.Index(fields=['atualizado_em'], name='transacoes__atualiz_b0f25a_idx')],
+                'constraints': [models.UniqueConstraint(fields=('usuario', 'tipo', 'chave'), name='categorizacao_cache_unica')],
+            },
+        ),
+    ]
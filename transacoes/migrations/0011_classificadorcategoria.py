@@ -0,0 +1,35 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:42
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transacoes', '0010_categorizacaocache'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importacaostaging',
+            name='classificada_modelo',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='ClassificadorCategoria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dados', models.BinaryField(default=bytes, help_text='Contagens do naive Bayes (JSON + zlib)')),
+                ('exemplos', models.IntegerField(default=0)),
+                ('ultima_transacao_id', models.BigIntegerField(default=0, help_text='Maior id de Transacao já incluído no modelo')),
+                ('atualizado_em', models.DateTimeField(auto_now=True)),
+                ('usuario', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='classificador_categoria', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Classificadores de Categoria',
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transacoes', '0011_classificadorcategoria'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importacaoofx',
+            name='chatgpt_requisicoes',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='importacaoofx',
+            name='chatgpt_tokens_prompt',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='importacaoofx',
+            name='chatgpt_tokens_resposta',
+            field=models.IntegerField(default=0),
+        ),
+    ]
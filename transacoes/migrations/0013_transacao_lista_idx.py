@@ -0,0 +1,19 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:48
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transacoes', '0012_importacaoofx_consumo_chatgpt'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transacao',
+            index=models.Index(fields=['usuario', '-data', '-criado_em', '-id'], name='transacao_lista_idx'),
+        ),
+    ]
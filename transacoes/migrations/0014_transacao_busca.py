@@ -0,0 +1,75 @@
+from django.db import migrations
+
+# SQL congelado na forma desta migração; transacoes.busca pode evoluir
+# (e o comando reconstruir_busca usa a versão atual) sem alterá-la
+SQLITE_CRIAR = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS transacoes_busca USING fts5("
+    "descricao, content='transacoes_transacao', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    'DROP TRIGGER IF EXISTS transacoes_busca_ai',
+    'DROP TRIGGER IF EXISTS transacoes_busca_ad',
+    'DROP TRIGGER IF EXISTS transacoes_busca_au',
+    'CREATE TRIGGER transacoes_busca_ai AFTER INSERT ON transacoes_transacao '
+    'BEGIN INSERT INTO transacoes_busca(rowid, descricao) '
+    'VALUES (new.id, new.descricao); END',
+    'CREATE TRIGGER transacoes_busca_ad AFTER DELETE ON transacoes_transacao '
+    'BEGIN INSERT INTO transacoes_busca(transacoes_busca, rowid, descricao) '
+    "VALUES ('delete', old.id, old.descricao); END",
+    'CREATE TRIGGER transacoes_busca_au AFTER UPDATE OF descricao '
+    'ON transacoes_transacao BEGIN '
+    'INSERT INTO transacoes_busca(transacoes_busca, rowid, descricao) '
+    "VALUES ('delete', old.id, old.descricao); "
+    'INSERT INTO transacoes_busca(rowid, descricao) '
+    'VALUES (new.id, new.descricao); END',
+    "INSERT INTO transacoes_busca(transacoes_busca) VALUES ('rebuild')",
+]
+
+SQLITE_REMOVER = [
+    'DROP TRIGGER IF EXISTS transacoes_busca_ai',
+    'DROP TRIGGER IF EXISTS transacoes_busca_ad',
+    'DROP TRIGGER IF EXISTS transacoes_busca_au',
+    'DROP TABLE IF EXISTS transacoes_busca',
+]
+
+POSTGRESQL_CRIAR = [
+    'CREATE EXTENSION IF NOT EXISTS unaccent',
+    # unaccent() não é IMMUTABLE e não pode ser usada em índices
+    'CREATE OR REPLACE FUNCTION transacoes_unaccent(text) '
+    'RETURNS text LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT '
+    "AS $$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$",
+    'CREATE INDEX IF NOT EXISTS transacao_busca_gin ON transacoes_transacao '
+    "USING GIN (to_tsvector('simple', transacoes_unaccent(descricao)))",
+]
+
+POSTGRESQL_REMOVER = [
+    'DROP INDEX IF EXISTS transacao_busca_gin',
+    'DROP FUNCTION IF EXISTS transacoes_unaccent(text)',
+]
+
+
+def _executar(schema_editor, comandos):
+    comandos = comandos.get(schema_editor.connection.vendor, [])
+    with schema_editor.connection.cursor() as cursor:
+        for sql in comandos:
+            cursor.execute(sql)
+
+
+def criar_indice(apps, schema_editor):
+    _executar(schema_editor, {
+        'sqlite': SQLITE_CRIAR, 'postgresql': POSTGRESQL_CRIAR})
+
+
+def remover_indice(apps, schema_editor):
+    _executar(schema_editor, {
+        'sqlite': SQLITE_REMOVER, 'postgresql': POSTGRESQL_REMOVER})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transacoes', '0013_transacao_lista_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(criar_indice, remover_indice),
+    ]
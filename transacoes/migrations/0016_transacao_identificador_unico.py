@@ -0,0 +1,64 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:08
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F, Min
+
+
+def remover_identificadores_duplicados(apps, schema_editor):
+    """Mantém só a primeira transação de cada identificador duplicado"""
+    Transacao = apps.get_model('transacoes', 'Transacao')
+    ResumoMensal = apps.get_model('transacoes', 'ResumoMensal')
+    ContaBancaria = apps.get_model('transacoes', 'ContaBancaria')
+
+    duplicadas = Transacao.objects.exclude(
+        identificador_ofx=''
+    ).values('usuario', 'identificador_ofx').annotate(
+        primeira=Min('id'), qtd=Count('id')
+    ).filter(qtd__gt=1).order_by()
+
+    for grupo in duplicadas:
+        excedentes = Transacao.objects.filter(
+            usuario=grupo['usuario'],
+            identificador_ofx=grupo['identificador_ofx']
+        ).exclude(id=grupo['primeira'])
+
+        # Signals não rodam em migrações: ajusta resumo e saldo aqui
+        for t in excedentes:
+            ResumoMensal.objects.filter(
+                usuario_id=t.usuario_id, ano=t.data.year, mes=t.data.month,
+                categoria_id=t.categoria_id, tipo=t.tipo
+            ).update(total=F('total') - t.valor,
+                     quantidade=F('quantidade') - 1)
+            if t.conta_bancaria_id:
+                efeito = t.valor if t.tipo == 'RECEITA' else -t.valor
+                ContaBancaria.objects.filter(pk=t.conta_bancaria_id).update(
+                    saldo_cache=F('saldo_cache') - efeito)
+
+        excedentes.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transacoes', '0015_transacao_data_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            remover_identificadores_duplicados, migrations.RunPython.noop),
+        migrations.RemoveConstraint(
+            model_name='transacao',
+            name='transacao_recorrente_unica',
+        ),
+        migrations.AddConstraint(
+            model_name='transacao',
+            constraint=models.UniqueConstraint(condition=models.Q(('identificador_ofx', ''), _negated=True), fields=('usuario', 'identificador_ofx'), name='transacao_identificador_unico'),
+        ),
+        # O índice da restrição única substitui o da 0004
+        migrations.RemoveIndex(
+            model_name='transacao',
+            name='transacoes__usuario_26f60f_idx',
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transacoes', '0016_transacao_identificador_unico'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='job',
+            name='tipo',
+            field=models.CharField(choices=[('PREVIEW_OFX', 'Pré-visualização OFX'), ('SALVAR_OFX', 'Importação OFX'), ('IMPORTAR_LOTE_OFX', 'Importação OFX em lote')], max_length=20),
+        ),
+    ]
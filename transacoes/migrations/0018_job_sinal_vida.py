@@ -0,0 +1,27 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:42
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def popular_sinal_vida(apps, schema_editor):
+    # Jobs em execução durante a migração contam a partir do início
+    Job = apps.get_model('transacoes', 'Job')
+    Job.objects.filter(status='EXECUTANDO').update(
+        sinal_vida_em=F('iniciado_em'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transacoes', '0017_job_importar_lote_ofx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='sinal_vida_em',
+            field=models.DateTimeField(blank=True, help_text='Última confirmação de que o worker segue executando', null=True),
+        ),
+        migrations.RunPython(popular_sinal_vida, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,12 @@
 from django.db import models
+from django.db.models import Case, F, Q, Sum, Value, When
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
 from django.utils import timezone
 from datetime import date
+from decimal import Decimal
+
+from .periodo import Periodo
 
 
 class Categoria(models.Model):
@@ -25,6 +30,34 @@ class Categoria(models.Model):
         return f"{self.nome} ({self.get_tipo_display()})"
 
 
+def movimento_liquido(prefixo=''):
+    """
+    Soma das receitas menos as despesas, em uma única agregação condicional
+
+    Args:
+        prefixo: Caminho até a transação (ex.: 'transacao__')
+    """
+    return Coalesce(
+        Sum(Case(
+            When(**{f'{prefixo}tipo': 'RECEITA'}, then=F(f'{prefixo}valor')),
+            When(**{f'{prefixo}tipo': 'DESPESA'}, then=-F(f'{prefixo}valor')),
+            default=Value(Decimal('0')),
+            output_field=models.DecimalField(max_digits=14, decimal_places=2)
+        )),
+        Value(Decimal('0')),
+        output_field=models.DecimalField(max_digits=14, decimal_places=2)
+    )
+
+
+class ContaBancariaQuerySet(models.QuerySet):
+
+    def with_saldo(self):
+        """Anota o saldo de cada conta calculado em uma única consulta"""
+        return self.annotate(
+            saldo=F('saldo_inicial') + movimento_liquido('transacao__')
+        )
+
+
 class ContaBancaria(models.Model):
     nome = models.CharField(max_length=100)
     banco = models.CharField(max_length=100)
@@ -34,6 +67,11 @@ class ContaBancaria(models.Model):
         max_digits=12, decimal_places=2, default=0)
     usuario = models.ForeignKey(User, on_delete=models.CASCADE)
     ativa = models.BooleanField(default=True)
+    saldo_cache = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0, editable=False,
+        help_text='Receitas menos despesas lançadas (mantido automaticamente)')
+
+    objects = ContaBancariaQuerySet.as_manager()
 
     class Meta:
         verbose_name_plural = 'Contas Bancárias'
@@ -43,12 +81,21 @@ class ContaBancaria(models.Model):
         return f"{self.nome} - {self.banco}"
 
     def saldo_atual(self):
-        from django.db.models import Sum
-        receitas = self.transacao_set.filter(tipo='RECEITA').aggregate(
-            total=Sum('valor'))['total'] or 0
-        despesas = self.transacao_set.filter(tipo='DESPESA').aggregate(
-            total=Sum('valor'))['total'] or 0
-        return self.saldo_inicial + receitas - despesas
+        """Saldo atual sem consultas (usa with_saldo() ou o saldo_cache)"""
+        if hasattr(self, 'saldo'):
+            return self.saldo
+        return self.saldo_inicial + self.saldo_cache
+
+
+class TransacaoQuerySet(models.QuerySet):
+
+    def no_periodo(self, periodo):
+        """Transações do período, como faixa do índice (usuario, data)"""
+        return self.filter(**periodo.filtro())
+
+    def no_mes(self, ano, mes):
+        """Transações do mês (em vez de data__month/data__year)"""
+        return self.no_periodo(Periodo.mes(ano, mes))
 
 
 class Transacao(models.Model):
@@ -75,14 +122,32 @@ class Transacao(models.Model):
     criado_em = models.DateTimeField(auto_now_add=True)
     atualizado_em = models.DateTimeField(auto_now=True)
 
+    objects = TransacaoQuerySet.as_manager()
+
     class Meta:
         verbose_name_plural = 'Transações'
         ordering = ['-data', '-criado_em']
         indexes = [
             models.Index(fields=['usuario', 'data']),
+            # Ordem da lista paginada por cursor
+            models.Index(
+                fields=['usuario', '-data', '-criado_em', '-id'],
+                name='transacao_lista_idx'
+            ),
             models.Index(fields=['usuario', 'tipo']),
+            # Faixas de datas sem filtro de usuário (date_hierarchy do admin)
+            models.Index(fields=['data'], name='transacao_data_idx'),
             models.Index(fields=['identificador_ofx']),
         ]
+        constraints = [
+            # Importações e recorrências gravam com ON CONFLICT DO NOTHING;
+            # transações manuais (identificador vazio) ficam de fora
+            models.UniqueConstraint(
+                fields=['usuario', 'identificador_ofx'],
+                condition=~Q(identificador_ofx=''),
+                name='transacao_identificador_unico'
+            ),
+        ]
 
     def __str__(self):
         return f"{self.descricao} - R$ {self.valor} ({self.get_tipo_display()})"
@@ -216,9 +281,192 @@ class ImportacaoOFX(models.Model):
     sucesso = models.BooleanField(default=True)
     erro = models.TextField(blank=True)
 
+    # Uso do ChatGPT na categorização do preview
+    chatgpt_requisicoes = models.IntegerField(default=0)
+    chatgpt_tokens_prompt = models.IntegerField(default=0)
+    chatgpt_tokens_resposta = models.IntegerField(default=0)
+
     class Meta:
         verbose_name_plural = 'Importações OFX'
         ordering = ['-data_importacao']
 
     def __str__(self):
         return f"Importação {self.arquivo_nome} - {self.data_importacao.strftime('%d/%m/%Y %H:%M')}"
+
+
+class ResumoMensal(models.Model):
+    """Totais mensais por categoria, mantidos a cada gravação de Transacao"""
+    TIPOS_TRANSACAO = (
+        ('RECEITA', 'Receita'),
+        ('DESPESA', 'Despesa'),
+    )
+
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE)
+    ano = models.IntegerField()
+    mes = models.IntegerField()
+    categoria = models.ForeignKey(Categoria, on_delete=models.CASCADE)
+    tipo = models.CharField(max_length=7, choices=TIPOS_TRANSACAO)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    quantidade = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = 'Resumos Mensais'
+        ordering = ['-ano', '-mes']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['usuario', 'ano', 'mes', 'categoria', 'tipo'],
+                name='resumo_mensal_unico'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.mes:02d}/{self.ano} - {self.categoria.nome}: R$ {self.total}"
+
+
+class ImportacaoStaging(models.Model):
+    """Transação em pré-visualização, aguardando a confirmação da importação"""
+    TIPOS_TRANSACAO = (
+        ('RECEITA', 'Receita'),
+        ('DESPESA', 'Despesa'),
+    )
+
+    token = models.UUIDField(help_text='Identifica o lote de pré-visualização')
+    posicao = models.IntegerField(help_text='Ordem da transação no arquivo')
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE)
+    conta_bancaria = models.ForeignKey(
+        ContaBancaria, on_delete=models.CASCADE, null=True, blank=True)
+    arquivo_nome = models.CharField(max_length=255)
+
+    descricao = models.CharField(max_length=200)
+    valor = models.DecimalField(max_digits=12, decimal_places=2)
+    tipo = models.CharField(max_length=7, choices=TIPOS_TRANSACAO)
+    data = models.DateField()
+    categoria = models.ForeignKey(Categoria, on_delete=models.CASCADE)
+    identificador_ofx = models.CharField(max_length=100, blank=True)
+    melhorada_chatgpt = models.BooleanField(default=False)
+    classificada_modelo = models.BooleanField(default=False)
+    confianca_ia = models.FloatField(default=0)
+
+    criado_em = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name_plural = 'Importações em Staging'
+        ordering = ['token', 'posicao']
+        indexes = [
+            models.Index(fields=['token', 'posicao']),
+            models.Index(fields=['criado_em']),
+        ]
+
+    def __str__(self):
+        return f"{self.arquivo_nome} #{self.posicao} - {self.descricao}"
+
+
+class Job(models.Model):
+    """Tarefa em segundo plano executada pelo comando run_jobs"""
+    TIPOS_JOB = (
+        ('PREVIEW_OFX', 'Pré-visualização OFX'),
+        ('SALVAR_OFX', 'Importação OFX'),
+        ('IMPORTAR_LOTE_OFX', 'Importação OFX em lote'),
+    )
+
+    STATUS_JOB = (
+        ('PENDENTE', 'Pendente'),
+        ('EXECUTANDO', 'Executando'),
+        ('CONCLUIDO', 'Concluído'),
+        ('ERRO', 'Erro'),
+    )
+
+    tipo = models.CharField(max_length=20, choices=TIPOS_JOB)
+    status = models.CharField(
+        max_length=10, choices=STATUS_JOB, default='PENDENTE')
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE)
+    arquivo = models.FileField(upload_to='jobs/%Y/%m/', blank=True)
+    parametros = models.JSONField(default=dict, blank=True)
+    resultado = models.JSONField(default=dict, blank=True)
+
+    # Acompanhamento da execução
+    progresso = models.IntegerField(default=0, help_text='Percentual concluído')
+    mensagem = models.CharField(max_length=200, blank=True)
+    erro = models.TextField(blank=True)
+    worker = models.CharField(max_length=100, blank=True)
+    tentativas = models.IntegerField(default=0)
+
+    criado_em = models.DateTimeField(auto_now_add=True)
+    iniciado_em = models.DateTimeField(null=True, blank=True)
+    sinal_vida_em = models.DateTimeField(
+        null=True, blank=True,
+        help_text='Última confirmação de que o worker segue executando')
+    concluido_em = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name_plural = 'Jobs'
+        ordering = ['-criado_em']
+        indexes = [
+            models.Index(fields=['status', 'criado_em']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} #{self.pk} - {self.get_status_display()}"
+
+    @property
+    def finalizado(self):
+        return self.status in ('CONCLUIDO', 'ERRO')
+
+
+class CategorizacaoCache(models.Model):
+    """Categoria sugerida pelo ChatGPT para uma descrição normalizada"""
+    TIPOS_TRANSACAO = (
+        ('RECEITA', 'Receita'),
+        ('DESPESA', 'Despesa'),
+    )
+
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE)
+    tipo = models.CharField(max_length=7, choices=TIPOS_TRANSACAO)
+    chave = models.CharField(
+        max_length=40, help_text='SHA-1 da descrição normalizada')
+    descricao_normalizada = models.CharField(max_length=200)
+    categoria = models.ForeignKey(Categoria, on_delete=models.CASCADE)
+    confianca = models.FloatField(default=0)
+
+    # Uso da entrada, para estatísticas e remoção das menos usadas
+    acertos = models.IntegerField(default=0)
+    usado_em = models.DateTimeField(default=timezone.now)
+
+    criado_em = models.DateTimeField(auto_now_add=True)
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'Cache de Categorização'
+        ordering = ['-usado_em']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['usuario', 'tipo', 'chave'],
+                name='categorizacao_cache_unica'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['usuario', 'usado_em']),
+            models.Index(fields=['atualizado_em']),
+        ]
+
+    def __str__(self):
+        return f"{self.descricao_normalizada} → {self.categoria.nome}"
+
+
+class ClassificadorCategoria(models.Model):
+    """Modelo de categorização treinado com as transações do usuário"""
+    usuario = models.OneToOneField(
+        User, on_delete=models.CASCADE, related_name='classificador_categoria')
+    dados = models.BinaryField(
+        default=bytes, help_text='Contagens do naive Bayes (JSON + zlib)')
+    exemplos = models.IntegerField(default=0)
+    ultima_transacao_id = models.BigIntegerField(
+        default=0, help_text='Maior id de Transacao já incluído no modelo')
+
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'Classificadores de Categoria'
+
+    def __str__(self):
+        return f"{self.usuario.username} - {self.exemplos} exemplos"
@@ -0,0 +1,151 @@
+"""
+Paginação por cursor (keyset) da lista de transações
+
+As páginas são obtidas com WHERE (data, criado_em, id) < (cursor) na
+ordem (-data, -criado_em, -id), coberta pelo índice transacao_lista_idx,
+sem OFFSET: o custo de uma página não cresce com a posição na lista. O
+total do cabeçalho vem do ResumoMensal ou de uma contagem em cache, em
+vez de um COUNT(*) a cada página.
+"""
+import base64
+import hashlib
+from datetime import date, datetime
+
+from django.core.cache import cache
+from django.db.models import Q, Sum
+
+from .models import ResumoMensal
+
+# Transações por página
+TRANSACOES_POR_PAGINA = 20
+
+# Segundos que a contagem de uma busca textual fica em cache
+CONTAGEM_CACHE_SEGUNDOS = 300
+
+ORDEM_LISTA = ('-data', '-criado_em', '-id')
+
+
+class CursorInvalido(ValueError):
+    """Cursor que não foi gerado por codificar_cursor"""
+
+
+def codificar_cursor(transacao):
+    """Posição de uma transação na lista, segura para URLs"""
+    valor = f'{transacao.data.isoformat()}|{transacao.criado_em.isoformat()}|{transacao.pk}'
+    return base64.urlsafe_b64encode(valor.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """
+    Returns:
+        tuple: (data, criado_em, id)
+    """
+    try:
+        valor = base64.urlsafe_b64decode(
+            cursor + '=' * (-len(cursor) % 4)).decode()
+        data, criado_em, pk = valor.split('|')
+        return (date.fromisoformat(data), datetime.fromisoformat(criado_em),
+                int(pk))
+    except (ValueError, UnicodeDecodeError) as e:
+        raise CursorInvalido(f'Cursor inválido: {cursor}') from e
+
+
+class PaginaCursor:
+    """Uma página da lista e os cursores das vizinhas"""
+
+    def __init__(self, itens, proximo=None, anterior=None):
+        self.itens = itens
+        self.proximo = proximo
+        self.anterior = anterior
+
+    def __iter__(self):
+        return iter(self.itens)
+
+    def __len__(self):
+        return len(self.itens)
+
+    def __bool__(self):
+        return bool(self.itens)
+
+    @property
+    def has_other_pages(self):
+        return bool(self.proximo or self.anterior)
+
+
+def pagina_por_cursor(transacoes, apos=None, antes=None,
+                      tamanho=TRANSACOES_POR_PAGINA):
+    """
+    Página da lista a partir de um cursor
+
+    Args:
+        transacoes: QuerySet de Transacao já filtrado
+        apos: Cursor da última transação da página anterior
+        antes: Cursor da primeira transação da página seguinte
+        tamanho: Transações por página
+
+    Returns:
+        PaginaCursor: Transações (com categoria e conta) e cursores
+
+    Raises:
+        CursorInvalido: Se o cursor não puder ser decodificado
+    """
+    transacoes = transacoes.select_related('categoria', 'conta_bancaria')
+
+    if antes:
+        data, criado_em, pk = decodificar_cursor(antes)
+        # Volta percorrendo a ordem inversa a partir do cursor
+        itens = list(
+            transacoes.filter(
+                Q(data__gt=data)
+                | Q(data=data, criado_em__gt=criado_em)
+                | Q(data=data, criado_em=criado_em, id__gt=pk)
+            ).order_by('data', 'criado_em', 'id')[:tamanho + 1]
+        )
+        mais_recentes = len(itens) > tamanho
+        itens = itens[:tamanho][::-1]
+        return PaginaCursor(
+            itens,
+            proximo=codificar_cursor(itens[-1]) if itens else antes,
+            anterior=codificar_cursor(itens[0]) if mais_recentes else None
+        )
+
+    if apos:
+        data, criado_em, pk = decodificar_cursor(apos)
+        transacoes = transacoes.filter(
+            Q(data__lt=data)
+            | Q(data=data, criado_em__lt=criado_em)
+            | Q(data=data, criado_em=criado_em, id__lt=pk)
+        )
+
+    itens = list(transacoes.order_by(*ORDEM_LISTA)[:tamanho + 1])
+    mais_antigas = len(itens) > tamanho
+    itens = itens[:tamanho]
+    return PaginaCursor(
+        itens,
+        proximo=codificar_cursor(itens[-1]) if mais_antigas else None,
+        anterior=codificar_cursor(itens[0]) if apos and itens else None
+    )
+
+
+def contar_transacoes(usuario, transacoes, tipo=None, categoria_id=None,
+                      busca=None):
+    """
+    Total exibido no cabeçalho da lista
+
+    Sem busca textual o total é a soma das quantidades do ResumoMensal,
+    que já agrega tipo e categoria. Com busca, a contagem é feita uma vez e
+    reaproveitada por CONTAGEM_CACHE_SEGUNDOS (pode ficar ligeiramente
+    desatualizada nesse intervalo).
+    """
+    if not busca:
+        resumos = ResumoMensal.objects.filter(usuario=usuario)
+        if tipo:
+            resumos = resumos.filter(tipo=tipo)
+        if categoria_id:
+            resumos = resumos.filter(categoria_id=categoria_id)
+        return resumos.aggregate(total=Sum('quantidade'))['total'] or 0
+
+    filtros = f'{tipo}|{categoria_id}|{busca}'
+    chave = 'transacoes:contagem:{}:{}'.format(
+        usuario.pk, hashlib.sha1(filtros.encode('utf-8')).hexdigest())
+    return cache.get_or_set(chave, transacoes.count, CONTAGEM_CACHE_SEGUNDOS)
@@ -0,0 +1,52 @@
+"""
+Períodos de datas usados nos filtros das consultas
+
+Filtros como data__month/data__year viram chamadas de função sobre a
+coluna (django_date_extract no SQLite, EXTRACT no PostgreSQL) e obrigam o
+banco a avaliar todas as transações do usuário. Um Periodo é um intervalo
+semiaberto [inicio, fim), traduzido em data__gte/data__lt, que o banco
+resolve como uma faixa do índice (usuario, data).
+"""
+from collections import namedtuple
+from datetime import date
+
+from django.db.models import Q
+
+
+class Periodo(namedtuple('Periodo', ['inicio', 'fim'])):
+    """Intervalo de datas com o fim excluído"""
+
+    __slots__ = ()
+
+    @classmethod
+    def mes(cls, ano, mes):
+        """
+        Período de um mês
+
+        Raises:
+            ValueError: Se o mês ou o ano forem inválidos
+        """
+        inicio = date(ano, mes, 1)
+        if mes == 12:
+            return cls(inicio, date(ano + 1, 1, 1))
+        return cls(inicio, date(ano, mes + 1, 1))
+
+    @classmethod
+    def ano(cls, ano):
+        """Período de um ano"""
+        return cls(date(ano, 1, 1), date(ano + 1, 1, 1))
+
+    @classmethod
+    def da_data(cls, data):
+        """Período do mês que contém a data"""
+        return cls.mes(data.year, data.month)
+
+    def filtro(self, campo='data'):
+        """Argumentos de filter() para o período"""
+        return {f'{campo}__gte': self.inicio, f'{campo}__lt': self.fim}
+
+    def q(self, campo='data'):
+        return Q(**self.filtro(campo))
+
+    def __contains__(self, data):
+        return self.inicio <= data < self.fim
@@ -0,0 +1,187 @@
+"""
+Projeção e geração das transações recorrentes ao longo de vários meses
+"""
+import calendar
+from datetime import date
+from decimal import Decimal
+
+from .models import Transacao, TransacaoRecorrente
+from .utils import buscar_identificadores_existentes, inserir_transacoes
+
+# Intervalo em meses entre as ocorrências de cada tipo de recorrência
+MESES_POR_RECORRENCIA = {
+    'MENSAL': 1,
+    'BIMESTRAL': 2,
+    'TRIMESTRAL': 3,
+    'SEMESTRAL': 6,
+    'ANUAL': 12,
+}
+
+
+def identificador_recorrente(recorrente_id, mes, ano):
+    """Identificador da transação gerada por uma recorrência no mês"""
+    return f"recorrente_{recorrente_id}_{mes}_{ano}"
+
+
+def data_vencimento(recorrente, mes, ano):
+    """Data de vencimento da recorrência no mês, ajustada ao último dia"""
+    ultimo_dia_mes = calendar.monthrange(ano, mes)[1]
+    return date(ano, mes, min(recorrente.dia_vencimento, ultimo_dia_mes))
+
+
+def ocorrencias_recorrencia(recorrente, primeiro_mes, ultimo_mes):
+    """
+    Meses em que a recorrência vence dentro da janela
+
+    Os meses são índices absolutos (ano * 12 + mes - 1). A primeira
+    ocorrência é obtida aritmeticamente a partir da data de início, sem
+    percorrer os meses fora do passo da recorrência.
+
+    Yields:
+        tuple: (mes, ano, data_vencimento)
+    """
+    passo = MESES_POR_RECORRENCIA.get(recorrente.tipo_recorrencia, 1)
+    mes_inicio = recorrente.data_inicio.year * 12 + \
+        recorrente.data_inicio.month - 1
+
+    primeiro = max(primeiro_mes, mes_inicio)
+    primeiro += (mes_inicio - primeiro) % passo
+
+    for indice in range(primeiro, ultimo_mes + 1, passo):
+        ano, mes = divmod(indice, 12)
+        mes += 1
+        vencimento = data_vencimento(recorrente, mes, ano)
+
+        # Verifica se está dentro do período de vigência
+        if vencimento < recorrente.data_inicio:
+            continue
+        if recorrente.data_fim and vencimento > recorrente.data_fim:
+            break
+
+        yield mes, ano, vencimento
+
+
+def projetar_recorrencias(usuario, ano, mes, meses=12):
+    """
+    Projeta as recorrências ativas ainda não consolidadas
+
+    Carrega as recorrências uma vez e verifica em lote quais identificadores
+    já foram consolidados na janela inteira.
+
+    Args:
+        usuario: Usuário proprietário das recorrências
+        ano: Ano do primeiro mês da projeção
+        mes: Primeiro mês da projeção
+        meses: Quantidade de meses projetados
+
+    Returns:
+        list: Um item por mês com 'ano', 'mes', 'receitas', 'despesas',
+        'saldo' e a lista 'transacoes' de transações previstas
+    """
+    primeiro_mes = ano * 12 + mes - 1
+    ultimo_mes = primeiro_mes + meses - 1
+
+    recorrentes = TransacaoRecorrente.objects.filter(
+        usuario=usuario,
+        ativa=True
+    ).select_related('categoria', 'conta_bancaria')
+
+    ocorrencias = [
+        (recorrente, mes_ocorrencia, ano_ocorrencia, vencimento)
+        for recorrente in recorrentes
+        for mes_ocorrencia, ano_ocorrencia, vencimento
+        in ocorrencias_recorrencia(recorrente, primeiro_mes, ultimo_mes)
+    ]
+
+    consolidadas = buscar_identificadores_existentes(
+        usuario,
+        (identificador_recorrente(r.id, m, a) for r, m, a, _ in ocorrencias)
+    )
+
+    projecao = []
+    for indice in range(primeiro_mes, ultimo_mes + 1):
+        ano_mes, mes_mes = divmod(indice, 12)
+        projecao.append({
+            'ano': ano_mes,
+            'mes': mes_mes + 1,
+            'receitas': Decimal('0'),
+            'despesas': Decimal('0'),
+            'saldo': Decimal('0'),
+            'transacoes': [],
+        })
+
+    for recorrente, mes_ocorrencia, ano_ocorrencia, vencimento in ocorrencias:
+        identificador = identificador_recorrente(
+            recorrente.id, mes_ocorrencia, ano_ocorrencia)
+        if identificador in consolidadas:
+            continue
+
+        item = projecao[ano_ocorrencia * 12 + mes_ocorrencia - 1 - primeiro_mes]
+        item['transacoes'].append({
+            'descricao': f"{recorrente.descricao} (Prevista)",
+            'valor': recorrente.valor,
+            'tipo': recorrente.tipo,
+            'data': vencimento,
+            'categoria': recorrente.categoria,
+            'conta_bancaria': recorrente.conta_bancaria,
+            'recorrente_id': recorrente.id,
+            'eh_prevista': True
+        })
+
+        if recorrente.tipo == 'RECEITA':
+            item['receitas'] += recorrente.valor
+            item['saldo'] += recorrente.valor
+        else:
+            item['despesas'] += recorrente.valor
+            item['saldo'] -= recorrente.valor
+
+    for item in projecao:
+        item['transacoes'].sort(key=lambda t: (t['data'], t['descricao']))
+
+    return projecao
+
+
+def gerar_transacoes_recorrentes(recorrentes, primeiro_mes, ultimo_mes,
+                                 usuario=None, batch_size=None):
+    """
+    Gera as transações das recorrências vencidas na janela
+
+    É idempotente: os identificadores já consolidados são descartados com
+    uma verificação em lote e eventuais gravações concorrentes são ignoradas
+    pela restrição de unicidade.
+
+    Args:
+        recorrentes: Recorrências a processar (um lote)
+        primeiro_mes: Índice do primeiro mês (ano * 12 + mes - 1)
+        ultimo_mes: Índice do último mês, inclusive
+        usuario: Restringe a verificação a um usuário (opcional)
+        batch_size: Registros por INSERT
+
+    Returns:
+        tuple: (transações geradas, ocorrências ignoradas)
+    """
+    novas = [
+        Transacao(
+            descricao=f"{recorrente.descricao} (Recorrente)",
+            valor=recorrente.valor,
+            tipo=recorrente.tipo,
+            data=vencimento,
+            categoria_id=recorrente.categoria_id,
+            conta_bancaria_id=recorrente.conta_bancaria_id,
+            usuario_id=recorrente.usuario_id,
+            identificador_ofx=identificador_recorrente(
+                recorrente.id, mes, ano),
+            importada_ofx=False
+        )
+        for recorrente in recorrentes
+        for mes, ano, vencimento
+        in ocorrencias_recorrencia(recorrente, primeiro_mes, ultimo_mes)
+    ]
+
+    existentes = buscar_identificadores_existentes(
+        usuario, (t.identificador_ofx for t in novas))
+    pendentes = [t for t in novas if t.identificador_ofx not in existentes]
+
+    inseridas = inserir_transacoes(pendentes, batch_size)
+
+    return len(inseridas), len(novas) - len(inseridas)
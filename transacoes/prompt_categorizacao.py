@@ -0,0 +1,226 @@
+"""
+Prompts de categorização do ChatGPT montados dentro de um orçamento de tokens
+
+Cada lote contém transações de um único tipo e lista apenas as categorias
+desse tipo, identificadas por códigos curtos (D1, D2, R1...) em vez do
+nome e do ID. O lote cresce enquanto o prompt couber no orçamento de
+entrada e a resposta esperada couber em CHATGPT_MAX_TOKENS. A resposta é
+conferida item a item; as transações que faltarem (resposta truncada ou
+incompleta) são reenviadas uma vez em lotes menores.
+"""
+import json
+
+from django.conf import settings
+
+# Orçamento de tokens do prompt (mensagem de sistema + usuário) por requisição
+CHATGPT_TOKENS_PROMPT = 1500
+
+# Máximo de transações por requisição, mesmo com orçamento sobrando
+CHATGPT_MAX_LINHAS_LOTE = 50
+
+# Tokens estimados por item da resposta ([n,"D12",0.95],) e fixos do JSON
+TOKENS_POR_ITEM_RESPOSTA = 12
+TOKENS_FIXOS_RESPOSTA = 10
+
+# Sem o tokenizer do modelo, a estimativa assume poucos caracteres por token
+# (textos em português com números e siglas ficam perto de 3)
+CARACTERES_POR_TOKEN = 3
+
+# Reenvios das transações que faltaram na resposta
+REPETICOES_INCOMPLETAS = 1
+
+PREFIXOS_TIPO = {'DESPESA': 'D', 'RECEITA': 'R'}
+
+NOMES_TIPO = {'DESPESA': 'despesas', 'RECEITA': 'receitas'}
+
+MENSAGEM_SISTEMA = "Você é um assistente especializado em categorização de transações financeiras. Analise cada transação e sugira a categoria mais apropriada baseada na descrição e no tipo (receita/despesa)."
+
+
+def estimar_tokens(texto):
+    """Estimativa conservadora da quantidade de tokens do texto"""
+    return len(texto) // CARACTERES_POR_TOKEN + 1
+
+
+class LotePrompt:
+    """Transações de um tipo enviadas em uma requisição"""
+
+    def __init__(self, tipo, transacoes, codigos, prompt, repeticao=0):
+        self.tipo = tipo
+        self.transacoes = transacoes
+        self.codigos = codigos
+        self.prompt = prompt
+        self.repeticao = repeticao
+
+    @property
+    def max_tokens(self):
+        """Tokens reservados para a resposta deste lote"""
+        return min(
+            settings.CHATGPT_MAX_TOKENS,
+            TOKENS_FIXOS_RESPOSTA
+            + 2 * TOKENS_POR_ITEM_RESPOSTA * len(self.transacoes)
+        )
+
+    def __len__(self):
+        return len(self.transacoes)
+
+
+def codigos_categorias(tipo, categorias):
+    """
+    Códigos curtos das categorias de um tipo
+
+    Returns:
+        dict: {codigo: categoria}, na ordem alfabética dos nomes
+    """
+    prefixo = PREFIXOS_TIPO.get(tipo, tipo[:1])
+    ordenadas = sorted(categorias, key=lambda c: (c['nome'].lower(), c['id']))
+    return {f'{prefixo}{n}': cat for n, cat in enumerate(ordenadas, start=1)}
+
+
+def cabecalho_prompt(tipo, codigos):
+    linhas = [
+        f'Categorize as {NOMES_TIPO.get(tipo, tipo.lower())} abaixo '
+        '(contexto brasileiro: empresas, bancos, siglas).',
+        'CATEGORIAS (código=nome):',
+    ]
+    linhas.extend(f'{codigo}={cat["nome"]}' for codigo, cat in codigos.items())
+    linhas.append('TRANSAÇÕES (n|descrição|valor):')
+    return '\n'.join(linhas) + '\n'
+
+
+def linha_prompt(numero, transacao):
+    descricao = ' '.join(str(transacao['descricao']).split()).replace('|', '/')
+    return f"{numero}|{descricao[:120]}|{float(transacao['valor']):.2f}\n"
+
+
+RODAPE_PROMPT = (
+    'Responda apenas JSON, um item por transação, na mesma ordem: '
+    '{"r":[[n,"código",confiança 0-1]]}. '
+    'Use null no código se nenhuma categoria servir.'
+)
+
+
+def montar_lotes(transacoes, categorias_usuario, orcamento=None,
+                 max_linhas=None, repeticao=0):
+    """
+    Agrupa as transações em lotes que cabem no orçamento de tokens
+
+    Args:
+        transacoes: Lista de dicionários com 'descricao', 'tipo' e 'valor'
+        categorias_usuario: Categorias ativas (id, nome, tipo, cor)
+        orcamento: Tokens do prompt (padrão: settings.CHATGPT_TOKENS_PROMPT)
+        max_linhas: Transações por lote (padrão: CHATGPT_MAX_LINHAS_LOTE)
+
+    Returns:
+        tuple: (lista de LotePrompt, transações sem categoria do seu tipo)
+    """
+    orcamento = orcamento or getattr(
+        settings, 'CHATGPT_TOKENS_PROMPT', CHATGPT_TOKENS_PROMPT)
+    max_linhas = max_linhas or getattr(
+        settings, 'CHATGPT_MAX_LINHAS_LOTE', CHATGPT_MAX_LINHAS_LOTE)
+
+    # A resposta também precisa caber em CHATGPT_MAX_TOKENS
+    max_linhas = max(1, min(
+        max_linhas,
+        (settings.CHATGPT_MAX_TOKENS - TOKENS_FIXOS_RESPOSTA)
+        // (2 * TOKENS_POR_ITEM_RESPOSTA)
+    ))
+
+    por_tipo = {}
+    for transacao in transacoes:
+        por_tipo.setdefault(transacao['tipo'], []).append(transacao)
+
+    lotes = []
+    sem_categoria = []
+    fixos = estimar_tokens(MENSAGEM_SISTEMA) + estimar_tokens(RODAPE_PROMPT)
+
+    for tipo, do_tipo in por_tipo.items():
+        codigos = codigos_categorias(
+            tipo, [c for c in categorias_usuario if c['tipo'] == tipo])
+        if not codigos:
+            sem_categoria.extend(do_tipo)
+            continue
+
+        cabecalho = cabecalho_prompt(tipo, codigos)
+        disponivel = orcamento - fixos - estimar_tokens(cabecalho)
+
+        atual, linhas, usados = [], [], 0
+        for transacao in do_tipo:
+            linha = linha_prompt(len(atual) + 1, transacao)
+            custo = estimar_tokens(linha)
+            if atual and (usados + custo > disponivel
+                          or len(atual) >= max_linhas):
+                lotes.append(LotePrompt(
+                    tipo, atual, codigos,
+                    cabecalho + ''.join(linhas) + RODAPE_PROMPT, repeticao))
+                atual, linhas, usados = [], [], 0
+                linha = linha_prompt(1, transacao)
+                custo = estimar_tokens(linha)
+
+            atual.append(transacao)
+            linhas.append(linha)
+            usados += custo
+
+        if atual:
+            lotes.append(LotePrompt(
+                tipo, atual, codigos,
+                cabecalho + ''.join(linhas) + RODAPE_PROMPT, repeticao))
+
+    return lotes, sem_categoria
+
+
+def interpretar_resposta(lote, conteudo):
+    """
+    Confere a resposta do ChatGPT para o lote
+
+    Itens com número fora do lote ou código desconhecido são ignorados;
+    código null é uma resposta válida (nenhuma categoria adequada).
+
+    Returns:
+        tuple: ({posição no lote: (categoria ou None, confianca)},
+                transações sem resposta)
+    """
+    try:
+        itens = json.loads(conteudo).get('r')
+    except (TypeError, ValueError, AttributeError):
+        itens = None
+    if not isinstance(itens, list):
+        return {}, list(lote.transacoes)
+
+    respostas = {}
+    for item in itens:
+        if not isinstance(item, (list, tuple)) or len(item) < 2:
+            continue
+        try:
+            posicao = int(item[0]) - 1
+            confianca = float(item[2]) if len(item) > 2 and item[2] else 0.0
+        except (TypeError, ValueError):
+            continue
+        codigo = item[1]
+        if not 0 <= posicao < len(lote) or (
+                codigo is not None and codigo not in lote.codigos):
+            continue
+        respostas[posicao] = (lote.codigos.get(codigo), confianca)
+
+    faltantes = [
+        transacao for posicao, transacao in enumerate(lote.transacoes)
+        if posicao not in respostas
+    ]
+    return respostas, faltantes
+
+
+def dividir_faltantes(lote, faltantes, categorias_usuario):
+    """
+    Novos lotes, menores, para as transações que faltaram na resposta
+
+    Returns:
+        list: Lotes a reenviar (vazia se as repetições se esgotaram)
+    """
+    if not faltantes or lote.repeticao >= REPETICOES_INCOMPLETAS:
+        return []
+
+    lotes, _ = montar_lotes(
+        faltantes, categorias_usuario,
+        max_linhas=max(1, (len(faltantes) + 1) // 2),
+        repeticao=lote.repeticao + 1
+    )
+    return lotes
@@ -0,0 +1,128 @@
+"""
+Manutenção incremental do resumo mensal (ResumoMensal)
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import ExtractMonth, ExtractYear
+
+from .models import ResumoMensal, Transacao
+
+# Registros por INSERT na reconstrução do resumo
+RESUMO_BATCH_SIZE = 500
+
+
+def chave_resumo(transacao):
+    """Retorna a chave (usuario, ano, mes, categoria, tipo) da transação"""
+    return (
+        transacao.usuario_id,
+        transacao.data.year,
+        transacao.data.month,
+        transacao.categoria_id,
+        transacao.tipo,
+    )
+
+
+def ajustar_resumo(chave, valor, quantidade, criar=True):
+    """
+    Soma valor e quantidade à linha do resumo indicada pela chave
+
+    Args:
+        chave: Tupla (usuario_id, ano, mes, categoria_id, tipo)
+        valor: Valor a somar (negativo para remover)
+        quantidade: Quantidade de transações a somar
+        criar: Cria a linha caso ainda não exista
+    """
+    usuario_id, ano, mes, categoria_id, tipo = chave
+    filtro = {
+        'usuario_id': usuario_id,
+        'ano': ano,
+        'mes': mes,
+        'categoria_id': categoria_id,
+        'tipo': tipo,
+    }
+
+    with transaction.atomic():
+        atualizadas = ResumoMensal.objects.filter(**filtro).update(
+            total=F('total') + valor,
+            quantidade=F('quantidade') + quantidade
+        )
+        if atualizadas or not criar:
+            return
+
+        try:
+            with transaction.atomic():
+                ResumoMensal.objects.create(
+                    total=valor, quantidade=quantidade, **filtro)
+        except IntegrityError:
+            # Outra gravação criou a linha ao mesmo tempo
+            ResumoMensal.objects.filter(**filtro).update(
+                total=F('total') + valor,
+                quantidade=F('quantidade') + quantidade
+            )
+
+
+def registrar_no_resumo(transacoes):
+    """
+    Soma ao resumo transações gravadas sem signals (ex.: bulk_create)
+
+    Args:
+        transacoes: Instâncias de Transacao já gravadas
+    """
+    deltas = defaultdict(lambda: [Decimal('0'), 0])
+    for t in transacoes:
+        delta = deltas[chave_resumo(t)]
+        delta[0] += t.valor
+        delta[1] += 1
+
+    for chave, (valor, quantidade) in deltas.items():
+        ajustar_resumo(chave, valor, quantidade)
+
+
+def reconstruir_resumo(usuario=None):
+    """
+    Recalcula o resumo mensal a partir das transações
+
+    Args:
+        usuario: Usuário a recalcular (padrão: todos)
+
+    Returns:
+        int: Quantidade de linhas gravadas
+    """
+    transacoes = Transacao.objects.all()
+    resumos = ResumoMensal.objects.all()
+    if usuario is not None:
+        transacoes = transacoes.filter(usuario=usuario)
+        resumos = resumos.filter(usuario=usuario)
+
+    agrupado = transacoes.annotate(
+        ano=ExtractYear('data'),
+        mes=ExtractMonth('data')
+    ).values(
+        'usuario_id', 'ano', 'mes', 'categoria_id', 'tipo'
+    ).annotate(
+        soma=Sum('valor'),
+        qtd=Count('id')
+    ).order_by()
+
+    with transaction.atomic():
+        resumos.delete()
+        linhas = ResumoMensal.objects.bulk_create(
+            (
+                ResumoMensal(
+                    usuario_id=item['usuario_id'],
+                    ano=item['ano'],
+                    mes=item['mes'],
+                    categoria_id=item['categoria_id'],
+                    tipo=item['tipo'],
+                    total=item['soma'],
+                    quantidade=item['qtd']
+                )
+                for item in agrupado.iterator()
+            ),
+            batch_size=RESUMO_BATCH_SIZE
+        )
+
+    return len(linhas)
@@ -0,0 +1,133 @@
+"""
+Cálculo de saldos das contas bancárias
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F
+
+from .models import ContaBancaria, Transacao, movimento_liquido
+
+
+def efeito_no_saldo(transacao):
+    """Valor com sinal que a transação soma ao saldo da conta"""
+    return transacao.valor if transacao.tipo == 'RECEITA' else -transacao.valor
+
+
+def ajustar_saldo(conta_id, delta):
+    """Soma delta ao saldo_cache da conta"""
+    if conta_id and delta:
+        ContaBancaria.objects.filter(pk=conta_id).update(
+            saldo_cache=F('saldo_cache') + delta)
+
+
+def registrar_no_saldo(transacoes):
+    """
+    Soma ao saldo_cache transações gravadas sem signals (ex.: bulk_create)
+
+    Args:
+        transacoes: Instâncias de Transacao já gravadas
+    """
+    deltas = defaultdict(Decimal)
+    for t in transacoes:
+        if t.conta_bancaria_id:
+            deltas[t.conta_bancaria_id] += efeito_no_saldo(t)
+
+    for conta_id, delta in deltas.items():
+        ajustar_saldo(conta_id, delta)
+
+
+def calcular_saldos(usuario):
+    """
+    Calcula o saldo de todas as contas do usuário em uma única consulta
+
+    Returns:
+        dict: {conta_id: saldo}
+    """
+    return dict(
+        ContaBancaria.objects.filter(usuario=usuario)
+        .with_saldo()
+        .values_list('id', 'saldo')
+    )
+
+
+def recalcular_saldos(usuario=None):
+    """
+    Regrava o saldo_cache das contas a partir das transações
+
+    Args:
+        usuario: Usuário a recalcular (padrão: todos)
+
+    Returns:
+        int: Quantidade de contas atualizadas
+    """
+    contas = ContaBancaria.objects.all()
+    if usuario is not None:
+        contas = contas.filter(usuario=usuario)
+
+    movimentos = dict(
+        Transacao.objects.filter(conta_bancaria__in=contas)
+        .values('conta_bancaria')
+        .annotate(movimento=movimento_liquido())
+        .values_list('conta_bancaria', 'movimento')
+        .order_by()
+    )
+
+    contas = list(contas.only('id', 'saldo_cache'))
+    for conta in contas:
+        conta.saldo_cache = movimentos.get(conta.id, Decimal('0'))
+
+    with transaction.atomic():
+        ContaBancaria.objects.bulk_update(contas, ['saldo_cache'])
+
+    return len(contas)
+
+
+def serie_saldo_diario(usuario, inicio, fim, conta=None):
+    """
+    Saldo ao final de cada dia do período
+
+    O saldo de abertura e os movimentos diários usam a mesma agregação
+    condicional de with_saldo(); os dias sem movimento são preenchidos
+    em Python.
+
+    Args:
+        usuario: Usuário proprietário das contas
+        inicio: Primeiro dia da série
+        fim: Último dia da série
+        conta: ContaBancaria específica (padrão: soma de todas as contas)
+
+    Returns:
+        list: [{'data': date, 'saldo': Decimal}, ...]
+    """
+    contas = ContaBancaria.objects.filter(usuario=usuario)
+    transacoes = Transacao.objects.filter(
+        usuario=usuario, conta_bancaria__isnull=False)
+    if conta is not None:
+        contas = contas.filter(pk=conta.pk)
+        transacoes = transacoes.filter(conta_bancaria=conta)
+
+    saldo_inicial = sum(
+        contas.values_list('saldo_inicial', flat=True), Decimal('0'))
+    abertura = transacoes.filter(data__lt=inicio).aggregate(
+        movimento=movimento_liquido())['movimento']
+
+    movimentos = dict(
+        transacoes.filter(data__gte=inicio, data__lte=fim)
+        .values('data')
+        .annotate(movimento=movimento_liquido())
+        .values_list('data', 'movimento')
+        .order_by()
+    )
+
+    saldo = saldo_inicial + abertura
+    serie = []
+    dia = inicio
+    while dia <= fim:
+        saldo += movimentos.get(dia, 0)
+        serie.append({'data': dia, 'saldo': saldo})
+        dia += timedelta(days=1)
+
+    return serie
@@ -0,0 +1,56 @@
+"""
+Signals do app de transações
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import Categoria, Transacao, TransacaoRecorrente
+from .resumo import ajustar_resumo, chave_resumo
+from .saldos import ajustar_saldo, efeito_no_saldo
+from .versao import invalidar_dados_usuario
+
+
+@receiver(pre_save, sender=Transacao)
+def guardar_transacao_anterior(sender, instance, **kwargs):
+    """Guarda a versão gravada da transação para ajustar resumo e saldo"""
+    instance._resumo_anterior = None
+    if instance.pk:
+        instance._resumo_anterior = Transacao.objects.filter(
+            pk=instance.pk
+        ).only(
+            'usuario', 'data', 'categoria', 'tipo', 'valor', 'conta_bancaria'
+        ).first()
+
+
+@receiver(post_save, sender=Transacao)
+def transacao_salva(sender, instance, **kwargs):
+    """Atualiza resumo mensal e saldo da conta com a transação gravada"""
+    anterior = getattr(instance, '_resumo_anterior', None)
+
+    with transaction.atomic():
+        if anterior is not None:
+            ajustar_resumo(
+                chave_resumo(anterior), -anterior.valor, -1, criar=False)
+            ajustar_saldo(
+                anterior.conta_bancaria_id, -efeito_no_saldo(anterior))
+
+        ajustar_resumo(chave_resumo(instance), instance.valor, 1)
+        ajustar_saldo(instance.conta_bancaria_id, efeito_no_saldo(instance))
+
+
+@receiver(post_delete, sender=Transacao)
+def transacao_excluida(sender, instance, **kwargs):
+    """Remove a transação excluída do resumo mensal e do saldo da conta"""
+    with transaction.atomic():
+        ajustar_resumo(
+            chave_resumo(instance), -instance.valor, -1, criar=False)
+        ajustar_saldo(instance.conta_bancaria_id, -efeito_no_saldo(instance))
+
+
+@receiver([post_save, post_delete], sender=Transacao)
+@receiver([post_save, post_delete], sender=Categoria)
+@receiver([post_save, post_delete], sender=TransacaoRecorrente)
+def dados_usuario_alterados(sender, instance, **kwargs):
+    """Descarta os caches derivados dos dados do usuário (dashboard)"""
+    invalidar_dados_usuario(instance.usuario_id)
@@ -0,0 +1,277 @@
+"""
+Pré-visualização da importação OFX guardada no banco (ImportacaoStaging)
+
+O preview é gravado em lote com um token; a confirmação move as linhas
+para Transacao com um único INSERT ... SELECT, sem passar pela sessão. As
+linhas cujo identificador já existe são ignoradas pelo próprio banco
+(restrição transacao_identificador_unico), inclusive quando outra
+importação grava as mesmas transações ao mesmo tempo.
+"""
+import uuid
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.constants import OnConflict
+from django.utils import timezone
+
+from .categorizacao import CategorizadorAutomatico
+from .classificador import atualizar_classificador
+from .models import Categoria, ImportacaoOFX, ImportacaoStaging, Transacao
+from .resumo import registrar_no_resumo
+from .saldos import registrar_no_saldo
+from .utils import (
+    DEDUP_CHUNK_SIZE, campos_consumo_chatgpt, ids_por_identificador,
+    registrar_importacao
+)
+from .versao import invalidar_dados_usuario
+
+# Horas que um preview não confirmado permanece disponível
+OFX_STAGING_VALIDADE_HORAS = 24
+
+# Registros por INSERT na gravação do preview
+OFX_STAGING_BATCH_SIZE = 500
+
+# Colunas copiadas de ImportacaoStaging para Transacao
+CAMPOS_PROMOVIDOS = [
+    'descricao', 'valor', 'tipo', 'data', 'categoria_id',
+    'conta_bancaria_id', 'usuario_id', 'identificador_ofx',
+]
+
+
+def validade_staging():
+    """Tempo que um preview permanece disponível para confirmação"""
+    return timedelta(hours=getattr(
+        settings, 'OFX_STAGING_VALIDADE_HORAS', OFX_STAGING_VALIDADE_HORAS))
+
+
+def staging_do_usuario(token, usuario):
+    """Linhas ainda válidas do preview identificado pelo token"""
+    if not token:
+        return ImportacaoStaging.objects.none()
+    return ImportacaoStaging.objects.filter(
+        token=token,
+        usuario=usuario,
+        criado_em__gte=timezone.now() - validade_staging()
+    )
+
+
+def gravar_staging(transacoes_data, usuario, conta_bancaria, arquivo_nome,
+                   batch_size=None):
+    """
+    Grava o preview da importação em lote
+
+    Args:
+        transacoes_data: Lista de dicionários gerada por preview_arquivo_ofx
+        usuario: Usuário que está importando
+        conta_bancaria: Conta bancária associada (opcional)
+        arquivo_nome: Nome do arquivo original
+
+    Returns:
+        uuid.UUID: Token do lote gravado
+    """
+    batch_size = batch_size or getattr(
+        settings, 'OFX_STAGING_BATCH_SIZE', OFX_STAGING_BATCH_SIZE)
+    token = uuid.uuid4()
+
+    categorias = Categoria.objects.filter(usuario=usuario).in_bulk()
+    categorizador = None
+
+    linhas = []
+    for posicao, transacao_data in enumerate(transacoes_data):
+        categoria = categorias.get(transacao_data.get('categoria_id'))
+        if categoria is None:
+            # Categoria de outro usuário ou removida: usa as regras locais
+            if categorizador is None:
+                categorizador = CategorizadorAutomatico(usuario)
+            categoria = categorizador.categorizar(
+                transacao_data['descricao'], transacao_data['tipo'])
+
+        linhas.append(ImportacaoStaging(
+            token=token,
+            posicao=posicao,
+            usuario=usuario,
+            conta_bancaria=conta_bancaria,
+            arquivo_nome=arquivo_nome,
+            descricao=transacao_data['descricao'][:200],
+            valor=Decimal(str(transacao_data['valor'])),
+            tipo=transacao_data['tipo'],
+            data=date.fromisoformat(transacao_data['data'][:10]),
+            categoria=categoria,
+            identificador_ofx=transacao_data.get('identificador_ofx') or '',
+            melhorada_chatgpt=bool(transacao_data.get('melhorada_chatgpt')),
+            classificada_modelo=bool(
+                transacao_data.get('classificada_modelo')),
+            confianca_ia=transacao_data.get('confianca_ia') or 0
+        ))
+
+    ImportacaoStaging.objects.bulk_create(linhas, batch_size=batch_size)
+
+    return token
+
+
+def totais_staging(staging):
+    """Quantidade e somas de receitas e despesas do preview"""
+    return staging.aggregate(
+        total=Count('id'),
+        receitas=Sum('valor', filter=Q(tipo='RECEITA'), default=Decimal('0')),
+        despesas=Sum('valor', filter=Q(tipo='DESPESA'), default=Decimal('0')),
+    )
+
+
+def descartar_staging(token, usuario):
+    """Remove o preview (cancelamento ou novo upload)"""
+    if token:
+        ImportacaoStaging.objects.filter(token=token, usuario=usuario).delete()
+
+
+def promover_staging(token, usuario, consumo_chatgpt=None):
+    """
+    Move o preview confirmado para Transacao
+
+    As linhas são copiadas com um único INSERT ... SELECT que ignora os
+    identificadores já existentes (já importados, repetidos no próprio
+    arquivo ou gravados ao mesmo tempo por outra importação); as ignoradas
+    são contadas como duplicadas. Resumo mensal, saldos e o registro da
+    importação são atualizados na mesma transação; depois dela as
+    transações novas são somadas ao classificador do usuário.
+
+    Args:
+        token: Token do lote gravado por gravar_staging
+        usuario: Usuário que está importando
+        consumo_chatgpt: Uso do ChatGPT no preview, gravado na importação
+
+    Returns:
+        dict: Resultado da importação
+    """
+    staging = staging_do_usuario(token, usuario)
+
+    with transaction.atomic():
+        arquivo_nome = staging.values_list(
+            'arquivo_nome', flat=True).first()
+        if arquivo_nome is None:
+            return {
+                'sucesso': False,
+                'erro': 'Dados de importação não encontrados ou expirados'
+            }
+
+        total = staging.count()
+        ids = _copiar_para_transacoes(token, usuario)
+        registrar_importacao(inseridas=len(ids))
+
+        # O INSERT ... SELECT não dispara signals
+        promovidas = []
+        for inicio in range(0, len(ids), DEDUP_CHUNK_SIZE):
+            promovidas.extend(Transacao.objects.filter(
+                id__in=ids[inicio:inicio + DEDUP_CHUNK_SIZE]
+            ).only(
+                'usuario', 'data', 'categoria', 'tipo', 'valor',
+                'conta_bancaria'
+            ))
+        registrar_no_resumo(promovidas)
+        registrar_no_saldo(promovidas)
+        invalidar_dados_usuario(usuario.pk)
+
+        ImportacaoOFX.objects.create(
+            arquivo_nome=arquivo_nome,
+            usuario=usuario,
+            total_transacoes=total,
+            transacoes_importadas=len(ids),
+            transacoes_duplicadas=total - len(ids),
+            **campos_consumo_chatgpt(consumo_chatgpt)
+        )
+
+        staging.delete()
+
+    atualizar_classificador(usuario)
+
+    return {
+        'sucesso': True,
+        'importadas': len(ids),
+        'duplicadas': total - len(ids)
+    }
+
+
+def _copiar_para_transacoes(token, usuario):
+    """
+    INSERT ... SELECT das linhas do lote em Transacao, ignorando conflitos
+
+    Returns:
+        list: IDs das transações efetivamente gravadas
+    """
+    conexao = connections[router.db_for_write(Transacao)]
+    qn = conexao.ops.quote_name
+    agora = timezone.now()
+
+    token_db = ImportacaoStaging._meta.get_field('token').get_db_prep_value(
+        token if isinstance(token, uuid.UUID) else uuid.UUID(str(token)),
+        conexao
+    )
+    agora_db = Transacao._meta.get_field('criado_em').get_db_prep_value(
+        agora, conexao)
+
+    # INSERT OR IGNORE no SQLite, ON CONFLICT DO NOTHING no PostgreSQL
+    insert = conexao.ops.insert_statement(on_conflict=OnConflict.IGNORE)
+    sufixo = conexao.ops.on_conflict_suffix_sql(
+        [], OnConflict.IGNORE, None, None)
+    retorno = conexao.features.can_return_rows_from_bulk_insert
+
+    colunas = ', '.join(qn(c) for c in CAMPOS_PROMOVIDOS)
+    sql = (
+        f'{insert} {qn(Transacao._meta.db_table)} '
+        f'({colunas}, {qn("importada_ofx")}, {qn("criado_em")}, '
+        f'{qn("atualizado_em")}) '
+        f'SELECT {colunas}, %s, %s, %s '
+        f'FROM {qn(ImportacaoStaging._meta.db_table)} '
+        f'WHERE {qn("token")} = %s AND {qn("usuario_id")} = %s '
+        f'ORDER BY {qn("posicao")}'
+    )
+    if sufixo:
+        sql += f' {sufixo}'
+    if retorno:
+        sql += f' RETURNING {qn("id")}'
+
+    if retorno:
+        with conexao.cursor() as cursor:
+            cursor.execute(
+                sql, [True, agora_db, agora_db, token_db, usuario.pk])
+            return sorted(pk for pk, in cursor.fetchall())
+
+    # Sem RETURNING: as gravadas são as do lote que não existiam antes do
+    # INSERT. A restrição de unicidade garante um id por identificador.
+    identificadores = list(ImportacaoStaging.objects.filter(
+        token=token, usuario=usuario
+    ).exclude(identificador_ofx='').values_list(
+        'identificador_ofx', flat=True).distinct())
+    existentes = ids_por_identificador(usuario, identificadores)
+    # Linhas sem identificador não têm restrição e são sempre gravadas
+    sem_identificador = Transacao.objects.filter(
+        usuario=usuario, identificador_ofx='', criado_em=agora)
+    anteriores = set(sem_identificador.values_list('id', flat=True))
+
+    with conexao.cursor() as cursor:
+        cursor.execute(sql, [True, agora_db, agora_db, token_db, usuario.pk])
+
+    gravadas = ids_por_identificador(usuario, identificadores)
+    ids = [pk for identificador, pk in gravadas.items()
+           if identificador not in existentes]
+    ids += [pk for pk in sem_identificador.values_list('id', flat=True)
+            if pk not in anteriores]
+    return sorted(ids)
+
+
+def limpar_staging_expirado(validade=None):
+    """
+    Remove os previews não confirmados dentro da validade
+
+    Returns:
+        int: Quantidade de linhas removidas
+    """
+    if validade is None:
+        validade = validade_staging()
+    limite = timezone.now() - validade
+    removidas, _ = ImportacaoStaging.objects.filter(
+        criado_em__lt=limite).delete()
+    return removidas
@@ -1,3 +1,1630 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import os
+import re
+import tempfile
+import time
+import zipfile
+from datetime import date, timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import httpx
+import ofxparse
+import openai
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import (
+    SimpleTestCase, TestCase, TransactionTestCase, override_settings
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .busca import filtrar_busca, ordenar_por_relevancia
+from .categorizacao import CategorizadorAutomatico
+from .cache_categorizacao import (
+    estatisticas_cache, limpar_cache_expirado, normalizar_descricao,
+    zerar_cache_memoria
+)
+from .chatgpt_service import (
+    ConsumoChatGPT, LimitadorTaxa, categorizar_com_chatgpt_async,
+    categorizar_transacoes_chatgpt
+)
+from .classificador import NaiveBayes, treinar_classificador
+from .importacao_lote import mapear_conta
+from .jobs import (
+    SinalDeVida, enfileirar_job, executar_job, liberar_jobs_travados,
+    reservar_proximo_job
+)
+from .leitor_csv import ErroLeituraCSV, ler_transacoes_csv
+from .leitor_ofx import ler_transacoes_ofx
+from .management.commands._benchmark import gerar_ofx_sintetico
+from .models import (
+    Categoria, CategorizacaoCache, ClassificadorCategoria, ContaBancaria,
+    ImportacaoOFX, ImportacaoStaging, Job, ResumoMensal, Transacao,
+    TransacaoRecorrente
+)
+from .paginacao import pagina_por_cursor
+from .periodo import Periodo
+from .prompt_categorizacao import (
+    MENSAGEM_SISTEMA, estimar_tokens, montar_lotes
+)
+from .previsao import gerar_transacoes_recorrentes, projetar_recorrencias
+from .resumo import reconstruir_resumo
+from .saldos import calcular_saldos, serie_saldo_diario
+from .staging import gravar_staging, limpar_staging_expirado, promover_staging
+from .utils import (
+    buscar_identificadores_existentes, gerar_identificador_ofx,
+    inserir_transacoes, salvar_transacoes_ofx
+)
+
+
+class CategorizadorTest(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('teste', password='senha')
+        self.mercado = Categoria.objects.create(
+            nome='Alimentação', tipo='DESPESA', usuario=self.usuario)
+        self.transporte = Categoria.objects.create(
+            nome='Transporte', tipo='DESPESA', usuario=self.usuario)
+        self.moradia = Categoria.objects.create(
+            nome='Moradia', tipo='DESPESA', usuario=self.usuario)
+
+    def test_palavra_chave_sem_consultas(self):
+        categorizador = CategorizadorAutomatico(self.usuario)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(categorizador.categorizar(
+                'COMPRA SUPERMERCADO EXTRA', 'DESPESA'), self.mercado)
+            self.assertEqual(categorizador.categorizar(
+                'Conta de Luz', 'DESPESA'), self.moradia)
+
+        outras = categorizador.categorizar('Sem palavra conhecida', 'DESPESA')
+        self.assertEqual(outras.nome, 'Outras Despesas')
+
+    def test_palavras_sobrepostas_seguem_a_prioridade(self):
+        categorizador = CategorizadorAutomatico(self.usuario)
+
+        # "gas" (Moradia) está dentro de "gasolina" (Transporte)
+        self.assertEqual(categorizador.categorizar(
+            'POSTO GASOLINA', 'DESPESA'), self.transporte)
+        # Alimentação vem antes de Transporte mesmo aparecendo depois
+        self.assertEqual(categorizador.categorizar(
+            'UBER PARA O RESTAURANTE', 'DESPESA'), self.mercado)
+
+    def test_alteracao_de_categoria_vale_no_proximo_categorizador(self):
+        anterior = CategorizadorAutomatico(self.usuario)
+        self.transporte.nome = 'Deslocamentos'
+        self.transporte.save()
+
+        # O categorizador de uma importação em andamento não muda
+        self.assertEqual(
+            anterior.categorizar('UBER TRIP', 'DESPESA'), self.transporte)
+        novo = CategorizadorAutomatico(self.usuario)
+        self.assertEqual(
+            novo.categorizar('UBER TRIP', 'DESPESA').nome, 'Outras Despesas')
+
+        self.moradia.nome = 'Transporte e moradia'
+        self.moradia.save()
+        self.assertEqual(CategorizadorAutomatico(self.usuario).categorizar(
+            'UBER TRIP', 'DESPESA'), self.moradia)
+
+
+class ResumoMensalTest(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('teste', password='senha')
+        self.mercado = Categoria.objects.create(
+            nome='Alimentação', tipo='DESPESA', usuario=self.usuario)
+        self.lazer = Categoria.objects.create(
+            nome='Lazer', tipo='DESPESA', usuario=self.usuario)
+
+    def resumo(self):
+        return sorted(ResumoMensal.objects.filter(
+            usuario=self.usuario, quantidade__gt=0
+        ).values_list('ano', 'mes', 'categoria_id', 'tipo', 'total',
+                      'quantidade'))
+
+    def assertResumoConsistente(self):
+        incremental = self.resumo()
+        reconstruir_resumo(self.usuario)
+        self.assertEqual(incremental, self.resumo())
+
+    def test_signals_mantem_resumo(self):
+        transacao = Transacao.objects.create(
+            descricao='Mercado', valor=Decimal('50.00'), tipo='DESPESA',
+            data=date(2024, 1, 10), categoria=self.mercado,
+            usuario=self.usuario)
+        Transacao.objects.create(
+            descricao='Cinema', valor=Decimal('30.00'), tipo='DESPESA',
+            data=date(2024, 1, 12), categoria=self.lazer,
+            usuario=self.usuario)
+        self.assertResumoConsistente()
+
+        transacao.valor = Decimal('70.00')
+        transacao.data = date(2024, 2, 1)
+        transacao.categoria = self.lazer
+        transacao.save()
+        self.assertResumoConsistente()
+
+        transacao.delete()
+        self.assertResumoConsistente()
+
+    def test_importacao_em_lote_atualiza_resumo(self):
+        dados = [
+            {
+                'descricao': f'Compra {i}',
+                'valor': 10.0 + i,
+                'tipo': 'DESPESA',
+                'data': f'2024-0{1 + i % 3}-05',
+                'categoria_id': self.mercado.id,
+                'identificador_ofx': f'conta_{i}',
+            }
+            for i in range(9)
+        ]
+
+        resultado = salvar_transacoes_ofx(
+            dados, self.usuario, None, 'extrato.ofx')
+
+        self.assertTrue(resultado['sucesso'])
+        self.assertEqual(resultado['importadas'], 9)
+        self.assertResumoConsistente()
+
+
+class SaldoContaTest(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('teste', password='senha')
+        self.categoria = Categoria.objects.create(
+            nome='Geral', tipo='DESPESA', usuario=self.usuario)
+        self.contas = [
+            ContaBancaria.objects.create(
+                nome=f'Conta {i}', banco='Banco', usuario=self.usuario,
+                saldo_inicial=Decimal('100.00'))
+            for i in range(3)
+        ]
+
+    def lancar(self, conta, valor, tipo, dia):
+        return Transacao.objects.create(
+            descricao='Lançamento', valor=Decimal(valor), tipo=tipo,
+            data=date(2024, 1, dia), categoria=self.categoria,
+            conta_bancaria=conta, usuario=self.usuario)
+
+    def assertCacheConsistente(self):
+        saldos = calcular_saldos(self.usuario)
+        for conta in ContaBancaria.objects.filter(usuario=self.usuario):
+            self.assertEqual(conta.saldo_atual(), saldos[conta.id])
+
+    def test_with_saldo_usa_uma_consulta(self):
+        for conta in self.contas:
+            self.lancar(conta, '50.00', 'RECEITA', 1)
+            self.lancar(conta, '20.00', 'DESPESA', 2)
+
+        with self.assertNumQueries(1):
+            saldos = [
+                c.saldo_atual()
+                for c in ContaBancaria.objects.filter(
+                    usuario=self.usuario).with_saldo()
+            ]
+
+        self.assertEqual(saldos, [Decimal('130.00')] * 3)
+
+    def test_saldo_cache_acompanha_gravacoes(self):
+        transacao = self.lancar(self.contas[0], '50.00', 'RECEITA', 1)
+        self.lancar(self.contas[0], '20.00', 'DESPESA', 2)
+        self.assertCacheConsistente()
+
+        transacao.conta_bancaria = self.contas[1]
+        transacao.tipo = 'DESPESA'
+        transacao.save()
+        self.assertCacheConsistente()
+
+        transacao.delete()
+        self.assertCacheConsistente()
+
+    def test_serie_saldo_diario(self):
+        conta = self.contas[0]
+        self.lancar(conta, '10.00', 'DESPESA', 1)
+        self.lancar(conta, '50.00', 'RECEITA', 3)
+
+        serie = serie_saldo_diario(
+            self.usuario, date(2024, 1, 2), date(2024, 1, 4), conta)
+
+        self.assertEqual(
+            [item['saldo'] for item in serie],
+            [Decimal('90.00'), Decimal('140.00'), Decimal('140.00')]
+        )
+
+    def test_saldo_diario_rejeita_conta_invalida(self):
+        self.client.force_login(self.usuario)
+        url = reverse('transacoes:saldo_diario')
+
+        response = self.client.get(url, {'conta': 'abc'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('erro', response.json())
+
+        response = self.client.get(url, {'conta': self.contas[0].pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['conta'], self.contas[0].pk)
+
+
+class ProjecaoRecorrenciasTest(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('teste', password='senha')
+        self.categoria = Categoria.objects.create(
+            nome='Moradia', tipo='DESPESA', usuario=self.usuario)
+
+    def recorrencia(self, tipo_recorrencia, inicio, **kwargs):
+        return TransacaoRecorrente.objects.create(
+            descricao=tipo_recorrencia, valor=Decimal('10.00'),
+            tipo='DESPESA', categoria=self.categoria, usuario=self.usuario,
+            tipo_recorrencia=tipo_recorrencia, data_inicio=inicio,
+            dia_vencimento=31, **kwargs)
+
+    def meses_com(self, projecao, descricao):
+        return [
+            (item['mes'], item['ano'])
+            for item in projecao
+            for t in item['transacoes']
+            if t['descricao'].startswith(descricao)
+        ]
+
+    def test_passos_e_vigencia(self):
+        self.recorrencia('BIMESTRAL', date(2024, 1, 1))
+        self.recorrencia('ANUAL', date(2023, 3, 1))
+        self.recorrencia('MENSAL', date(2024, 1, 1),
+                         data_fim=date(2024, 3, 31))
+
+        projecao = projetar_recorrencias(self.usuario, 2024, 1, meses=24)
+
+        self.assertEqual(len(projecao), 24)
+        self.assertEqual(
+            self.meses_com(projecao, 'BIMESTRAL'),
+            [(m, 2024) for m in (1, 3, 5, 7, 9, 11)] +
+            [(m, 2025) for m in (1, 3, 5, 7, 9, 11)]
+        )
+        self.assertEqual(
+            self.meses_com(projecao, 'ANUAL'), [(3, 2024), (3, 2025)])
+        self.assertEqual(
+            self.meses_com(projecao, 'MENSAL'), [(1, 2024), (2, 2024), (3, 2024)])
+        self.assertEqual(projecao[1]['transacoes'][0]['data'], date(2024, 2, 29))
+
+    def test_ignora_consolidadas_com_consultas_constantes(self):
+        recorrente = self.recorrencia('MENSAL', date(2024, 1, 1))
+        recorrente.gerar_transacao_mes(2, 2024).save()
+
+        with self.assertNumQueries(2):
+            projecao = projetar_recorrencias(self.usuario, 2024, 1, meses=24)
+
+        self.assertNotIn((2, 2024), self.meses_com(projecao, 'MENSAL'))
+        self.assertEqual(projecao[0]['despesas'], Decimal('10.00'))
+        self.assertEqual(projecao[0]['saldo'], Decimal('-10.00'))
+
+    def test_geracao_idempotente(self):
+        self.recorrencia('MENSAL', date(2024, 1, 1))
+        self.recorrencia('TRIMESTRAL', date(2024, 1, 1))
+        recorrentes = TransacaoRecorrente.objects.all()
+        primeiro, ultimo = 2024 * 12, 2024 * 12 + 11
+
+        self.assertEqual(
+            gerar_transacoes_recorrentes(recorrentes, primeiro, ultimo),
+            (16, 0))
+        self.assertEqual(
+            gerar_transacoes_recorrentes(recorrentes, primeiro, ultimo),
+            (0, 16))
+
+        self.assertEqual(Transacao.objects.count(), 16)
+        resumo = ResumoMensal.objects.get(ano=2024, mes=1)
+        self.assertEqual(resumo.quantidade, 2)
+        self.assertEqual(resumo.total, Decimal('20.00'))
+
+
+class LeitorOFXTest(TestCase):
+
+    XML = '''<?xml version="1.0" encoding="UTF-8"?>
+<?OFX OFXHEADER="200" VERSION="211" SECURITY="NONE"?>
+<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><CURDEF>BRL</CURDEF>
+<BANKACCTFROM><BANKID>0341</BANKID><ACCTID>9876-5</ACCTID></BANKACCTFROM>
+<BANKTRANLIST>
+<STMTTRN><TRNTYPE>DEBIT</TRNTYPE><DTPOSTED>20240305120000[-3:BRT]</DTPOSTED>
+<TRNAMT>-12,50</TRNAMT><FITID>A1</FITID><MEMO>Padaria São João &amp; Cia</MEMO>
+</STMTTRN>
+<STMTTRN><TRNTYPE>CREDIT</TRNTYPE><DTPOSTED>20240306</DTPOSTED>
+<TRNAMT>1500.00</TRNAMT><FITID>A2</FITID><NAME>Salário</NAME></STMTTRN>
+</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>
+'''
+
+    def test_sgml_igual_ao_ofxparse(self):
+        ofx = ofxparse.OfxParser.parse(gerar_ofx_sintetico(120))
+        esperados = [
+            f"{account.account_id}_{t.id}_{t.date}_{t.amount}"
+            for account in ofx.accounts
+            for t in account.statement.transactions
+        ]
+
+        # Blocos pequenos forçam tags cortadas entre leituras
+        lidos = [
+            gerar_identificador_ofx(lancamento)
+            for lancamento in ler_transacoes_ofx(
+                gerar_ofx_sintetico(120), tamanho_bloco=37)
+        ]
+        self.assertEqual(lidos, esperados)
+
+    def test_xml_utf8(self):
+        lancamentos = list(ler_transacoes_ofx(
+            io.BytesIO(self.XML.encode('utf-8')), tamanho_bloco=50))
+
+        self.assertEqual(len(lancamentos), 2)
+        padaria, salario = lancamentos
+        self.assertEqual(padaria.account_id, '9876-5')
+        self.assertEqual(padaria.amount, Decimal('-12.50'))
+        self.assertEqual(padaria.memo, 'Padaria São João & Cia')
+        self.assertEqual(padaria.date.isoformat(), '2024-03-05T15:00:00')
+        self.assertEqual(salario.payee, 'Salário')
+        self.assertEqual(salario.type, 'credit')
+
+
+class LeitorCSVTest(TestCase):
+
+    # Extrato no formato comum dos bancos brasileiros, em Windows-1252
+    CSV_BANCO = (
+        'Extrato Conta Corrente\r\n'
+        'Agência: 1234;Conta: 12345-6\r\n'
+        '\r\n'
+        'Data Lançamento;Histórico;Descrição;Valor (R$);Saldo (R$)\r\n'
+        '01/03/2024;SALDO ANTERIOR;;;1.000,00\r\n'
+        '05/03/2024;Pix enviado;"Padaria; São João";-12,50;987,50\r\n'
+        '05/03/2024;Pix enviado;"Padaria; São João";-12,50;975,00\r\n'
+        '06/03/2024;Salário;;1.500,00;2.475,00\r\n'
+        'Total;;;;\r\n'
+    ).encode('cp1252')
+
+    def test_formato_brasileiro_em_blocos(self):
+        lancamentos = list(ler_transacoes_csv(
+            io.BytesIO(self.CSV_BANCO), tamanho_bloco=16))
+
+        self.assertEqual(
+            [(l.date.date(), l.amount, l.memo) for l in lancamentos], [
+                (date(2024, 3, 5), Decimal('-12.50'),
+                 'Pix enviado - Padaria; São João'),
+                (date(2024, 3, 5), Decimal('-12.50'),
+                 'Pix enviado - Padaria; São João'),
+                (date(2024, 3, 6), Decimal('1500.00'), 'Salário'),
+            ])
+        # Linhas iguais recebem identificadores diferentes e estáveis
+        identificadores = [gerar_identificador_ofx(l) for l in lancamentos]
+        self.assertEqual(len(set(identificadores)), 3)
+        self.assertEqual(identificadores, [
+            gerar_identificador_ofx(l)
+            for l in ler_transacoes_csv(io.BytesIO(self.CSV_BANCO))])
+
+    def test_ponto_decimal_e_mapeamento(self):
+        conteudo = (
+            'quando,o que,quanto,entrada\n'
+            '2024-03-05,Mercado,"1,234.56",\n'
+            '2024-03-07,Estorno,-10.00,x\n'
+        ).encode()
+
+        lancamentos = list(ler_transacoes_csv(io.BytesIO(conteudo), {
+            'data': 'Quando', 'descricao': 'O que', 'valor': 'Quanto'}))
+
+        self.assertEqual(
+            [(l.memo, l.amount) for l in lancamentos],
+            [('Mercado', Decimal('1234.56')), ('Estorno', Decimal('-10.00'))])
+        with self.assertRaises(ErroLeituraCSV):
+            list(ler_transacoes_csv(io.BytesIO(conteudo)))
+
+    @override_settings(CHATGPT_ENABLED=False, JOBS_ASSINCRONOS=False)
+    def test_importacao_pela_pagina_ignora_reimportacao(self):
+        usuario = User.objects.create_user('teste', password='senha')
+        Categoria.objects.create(
+            nome='Outras Despesas', tipo='DESPESA', usuario=usuario)
+        self.client.login(username='teste', password='senha')
+
+        for _ in range(2):
+            self.client.post(reverse('transacoes:importar_ofx'), {
+                'arquivo_ofx': SimpleUploadedFile(
+                    'extrato.csv', self.CSV_BANCO)})
+            self.client.post(
+                reverse('transacoes:confirmar_importacao_ofx') +
+                f'?job={Job.objects.filter(tipo="PREVIEW_OFX").first().pk}',
+                {'confirmar': 'sim'})
+
+        self.assertEqual(Transacao.objects.filter(usuario=usuario).count(), 3)
+        preview = Job.objects.filter(tipo='PREVIEW_OFX').first()
+        self.assertEqual(
+            (preview.resultado['novas'], preview.resultado['duplicadas']),
+            (0, 3))
+
+    @override_settings(CHATGPT_ENABLED=False, JOBS_ASSINCRONOS=False)
+    def test_mesmo_extrato_em_contas_diferentes(self):
+        usuario = User.objects.create_user('teste', password='senha')
+        Categoria.objects.create(
+            nome='Outras Despesas', tipo='DESPESA', usuario=usuario)
+        contas = [
+            ContaBancaria.objects.create(
+                nome=nome, banco='Banco', usuario=usuario)
+            for nome in ('Corrente', 'Cartão')
+        ]
+        self.client.login(username='teste', password='senha')
+
+        # A segunda importação na primeira conta só tem duplicatas
+        for conta in contas + contas[:1]:
+            self.client.post(reverse('transacoes:importar_ofx'), {
+                'arquivo_ofx': SimpleUploadedFile(
+                    'extrato.csv', self.CSV_BANCO),
+                'conta_bancaria': conta.id})
+            self.client.post(
+                reverse('transacoes:confirmar_importacao_ofx') +
+                f'?job={Job.objects.filter(tipo="PREVIEW_OFX").first().pk}',
+                {'confirmar': 'sim'})
+
+        for conta in contas:
+            self.assertEqual(
+                Transacao.objects.filter(conta_bancaria=conta).count(), 3)
+
+
+class ImportacaoStagingTest(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('teste', password='senha')
+        self.mercado = Categoria.objects.create(
+            nome='Alimentação', tipo='DESPESA', usuario=self.usuario)
+        self.conta = ContaBancaria.objects.create(
+            nome='Corrente', banco='Banco', usuario=self.usuario)
+
+    def preview(self, quantidade, prefixo='id'):
+        return [
+            {
+                'descricao': f'Mercado {i}', 'valor': 10.0 + i,
+                'tipo': 'DESPESA', 'data': f'2024-02-{i % 28 + 1:02d}',
+                'categoria_id': self.mercado.id,
+                'identificador_ofx': f'{prefixo}_{i}',
+            }
+            for i in range(quantidade)
+        ]
+
+    def test_promocao_ignora_duplicatas(self):
+        Transacao.objects.create(
+            descricao='Já importada', valor=Decimal('10.00'), tipo='DESPESA',
+            data=date(2024, 2, 1), categoria=self.mercado,
+            usuario=self.usuario, identificador_ofx='id_0')
+
+        transacoes = self.preview(5)
+        transacoes.append(dict(transacoes[1]))  # repetida no arquivo
+        token = gravar_staging(
+            transacoes, self.usuario, self.conta, 'extrato.ofx')
+        self.assertEqual(ImportacaoStaging.objects.count(), 6)
+
+        resultado = promover_staging(token, self.usuario)
+
+        self.assertEqual(resultado['importadas'], 4)
+        self.assertEqual(resultado['duplicadas'], 2)
+        self.assertFalse(ImportacaoStaging.objects.exists())
+        importadas = Transacao.objects.filter(importada_ofx=True)
+        self.assertEqual(importadas.count(), 4)
+        self.assertEqual(
+            set(importadas.values_list('conta_bancaria', flat=True)),
+            {self.conta.id})
+
+        importacao = ImportacaoOFX.objects.get()
+        self.assertEqual(
+            (importacao.total_transacoes, importacao.transacoes_importadas,
+             importacao.transacoes_duplicadas), (6, 4, 2))
+
+        # Resumo e saldo acompanham a cópia feita fora do ORM
+        resumo = ResumoMensal.objects.get(
+            usuario=self.usuario, ano=2024, mes=2)
+        self.assertEqual(resumo.quantidade, 5)
+        self.assertEqual(resumo.total, Decimal('60.00'))
+        self.conta.refresh_from_db()
+        self.assertEqual(self.conta.saldo_cache, Decimal('-50.00'))
+
+    def test_promocao_concorrente_nao_duplica(self):
+        token = gravar_staging(
+            self.preview(3), self.usuario, self.conta, 'extrato.ofx')
+        # Outra importação do mesmo arquivo grava antes da promoção
+        Transacao.objects.create(
+            descricao='Mercado 2', valor=Decimal('12.00'), tipo='DESPESA',
+            data=date(2024, 2, 3), categoria=self.mercado,
+            usuario=self.usuario, conta_bancaria=self.conta,
+            identificador_ofx='id_2')
+
+        resultado = promover_staging(token, self.usuario)
+
+        self.assertEqual(
+            (resultado['importadas'], resultado['duplicadas']), (2, 1))
+        self.assertEqual(Transacao.objects.count(), 3)
+        resumo = ResumoMensal.objects.get(
+            usuario=self.usuario, ano=2024, mes=2)
+        self.assertEqual(
+            (resumo.quantidade, resumo.total), (3, Decimal('33.00')))
+
+    def test_promocao_sem_returning(self):
+        agora = timezone.now()
+        Transacao.objects.create(
+            descricao='Já importada', valor=Decimal('10.00'), tipo='DESPESA',
+            data=date(2024, 2, 1), categoria=self.mercado,
+            usuario=self.usuario, identificador_ofx='id_0')
+        # Outra importação gravada no mesmo instante
+        outra = Transacao.objects.create(
+            descricao='Outra importação', valor=Decimal('5.00'),
+            tipo='DESPESA', data=date(2024, 2, 1), categoria=self.mercado,
+            usuario=self.usuario, identificador_ofx='outra_0',
+            importada_ofx=True)
+        Transacao.objects.filter(pk=outra.pk).update(criado_em=agora)
+        transacoes = self.preview(4)
+        transacoes[3]['identificador_ofx'] = ''
+        token = gravar_staging(
+            transacoes, self.usuario, self.conta, 'extrato.ofx')
+
+        with mock.patch.object(
+                type(connection.features), 'can_return_rows_from_bulk_insert',
+                False), \
+                mock.patch('transacoes.staging.timezone.now',
+                           return_value=agora):
+            resultado = promover_staging(token, self.usuario)
+
+        self.assertEqual(
+            (resultado['importadas'], resultado['duplicadas']), (3, 1))
+        resumo = ResumoMensal.objects.get(
+            usuario=self.usuario, ano=2024, mes=2)
+        self.assertEqual(
+            (resumo.quantidade, resumo.total), (5, Decimal('51.00')))
+
+    def test_token_de_outro_usuario(self):
+        outro = User.objects.create_user('outro', password='senha')
+        token = gravar_staging(self.preview(3), self.usuario, None, 'a.ofx')
+
+        resultado = promover_staging(token, outro)
+
+        self.assertFalse(resultado['sucesso'])
+        self.assertEqual(ImportacaoStaging.objects.count(), 3)
+
+    def test_limpeza_de_expirados(self):
+        gravar_staging(self.preview(3), self.usuario, None, 'a.ofx')
+        self.assertEqual(limpar_staging_expirado(), 0)
+        self.assertEqual(limpar_staging_expirado(timedelta(0)), 3)
+
+    @override_settings(CHATGPT_ENABLED=False)
+    def test_fluxo_pela_sessao_guarda_apenas_token(self):
+        self.client.login(username='teste', password='senha')
+        arquivo = gerar_ofx_sintetico(250)
+
+        resposta = self.client.post(reverse('transacoes:importar_ofx'), {
+            'arquivo_ofx': arquivo, 'conta_bancaria': self.conta.id})
+        job = Job.objects.get()
+        self.assertRedirects(
+            resposta, f"{reverse('transacoes:importar_ofx')}?job={job.pk}")
+
+        call_command('run_jobs', '--ate-esvaziar', stdout=io.StringIO())
+        progresso = self.client.get(
+            reverse('transacoes:progresso_job', args=[job.pk])).json()
+        self.assertEqual(progresso['status'], 'CONCLUIDO')
+        self.assertEqual(progresso['resultado']['novas'], 250)
+
+        pagina = self.client.get(progresso['redirecionar'] + '&page=3')
+        self.assertNotIn('preview_transacoes', self.client.session)
+        self.assertEqual(ImportacaoStaging.objects.count(), 250)
+        self.assertEqual(len(pagina.context['transacoes']), 50)
+        self.assertEqual(pagina.context['total_transacoes'], 250)
+
+        self.client.post(
+            reverse('transacoes:confirmar_importacao_ofx'),
+            {'confirmar': 'sim'})
+        self.assertNotIn('importacao_token', self.client.session)
+        call_command('run_jobs', '--ate-esvaziar', stdout=io.StringIO())
+        self.assertEqual(Transacao.objects.count(), 250)
+
+
+class DeduplicacaoOFXTest(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('teste', password='senha')
+        self.mercado = Categoria.objects.create(
+            nome='Alimentação', tipo='DESPESA', usuario=self.usuario)
+
+    def dados(self, quantidade, inicio=0):
+        return [
+            {
+                'descricao': f'Compra {i}', 'valor': 10.0, 'tipo': 'DESPESA',
+                'data': '2024-03-01', 'categoria_id': self.mercado.id,
+                'identificador_ofx': f'ofx_{i}',
+            }
+            for i in range(inicio, inicio + quantidade)
+        ]
+
+    def test_busca_identificadores_em_blocos(self):
+        salvar_transacoes_ofx(self.dados(5), self.usuario, None, 'a.ofx')
+        outro = User.objects.create_user('outro')
+        Transacao.objects.create(
+            descricao='Outro', valor=Decimal('1.00'), tipo='DESPESA',
+            data=date(2024, 3, 1), categoria=self.mercado, usuario=outro,
+            identificador_ofx='ofx_9')
+        candidatos = [f'ofx_{i}' for i in range(3, 10)] + ['ofx_3', '']
+
+        with CaptureQueriesContext(connection) as consultas:
+            existentes = buscar_identificadores_existentes(
+                self.usuario, candidatos, chunk_size=3)
+
+        self.assertEqual(existentes, {'ofx_3', 'ofx_4'})
+        # 7 identificadores distintos em blocos de 3
+        self.assertEqual(len(consultas), 3)
+
+    def test_salvar_grava_em_lotes(self):
+        with CaptureQueriesContext(connection) as consultas:
+            resultado = salvar_transacoes_ofx(
+                self.dados(25), self.usuario, None, 'a.ofx', batch_size=10)
+
+        self.assertEqual(resultado, {
+            'sucesso': True, 'importadas': 25, 'duplicadas': 0})
+        self.assertEqual(Transacao.objects.count(), 25)
+        insercoes = [
+            c['sql'] for c in consultas
+            if c['sql'].startswith('INSERT')
+            and 'INTO "transacoes_transacao" ' in c['sql']]
+        self.assertEqual(len(insercoes), 3)
+        # Categorias carregadas uma vez, não por transação
+        self.assertEqual(len([
+            c['sql'] for c in consultas
+            if c['sql'].startswith('SELECT')
+            and 'FROM "transacoes_categoria"' in c['sql']]), 1)
+
+
+class IdentificadorUnicoTest(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('teste', password='senha')
+        self.mercado = Categoria.objects.create(
+            nome='Alimentação', tipo='DESPESA', usuario=self.usuario)
+
+    def criar(self, identificador, usuario=None):
+        return Transacao.objects.create(
+            descricao='Mercado', valor=Decimal('10.00'), tipo='DESPESA',
+            data=date(2024, 3, 1), categoria=self.mercado,
+            usuario=usuario or self.usuario, identificador_ofx=identificador)
+
+    def test_identificador_repetido_e_recusado(self):
+        self.criar('abc')
+        self.criar('abc', User.objects.create_user('outro'))
+        self.criar('')
+        self.criar('')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            self.criar('abc')
+
+    def test_inserir_devolve_apenas_as_gravadas(self):
+        self.assertInsereApenasNovas(batch_size=2)
+
+    def test_inserir_sem_returning(self):
+        with mock.patch.object(
+                type(connection.features), 'can_return_rows_from_bulk_insert',
+                False):
+            self.assertInsereApenasNovas()
+
+    def assertInsereApenasNovas(self, batch_size=None):
+        existente = self.criar('b')
+
+        def nova(identificador, valor='5.00'):
+            return Transacao(
+                descricao=identificador, valor=Decimal(valor),
+                tipo='DESPESA', data=date(2024, 3, 2),
+                categoria=self.mercado, usuario=self.usuario,
+                identificador_ofx=identificador)
+
+        inseridas = inserir_transacoes(
+            [nova('a'), nova('b'), nova('c'), nova('a', '7.00'), nova('')],
+            batch_size=batch_size)
+
+        self.assertEqual(
+            sorted(t.identificador_ofx for t in inseridas), ['', 'a', 'c'])
+        gravadas = dict(Transacao.objects.values_list(
+            'identificador_ofx', 'id').exclude(identificador_ofx=''))
+        for t in inseridas:
+            if t.identificador_ofx:
+                self.assertFalse(t._state.adding)
+                self.assertIsNotNone(t.criado_em)
+                self.assertEqual(t.pk, gravadas[t.identificador_ofx])
+        self.assertEqual(gravadas['b'], existente.pk)
+        self.assertEqual(
+            Transacao.objects.get(identificador_ofx='a').valor,
+            Decimal('5.00'))
+
+    def test_reimportacao_conta_duplicatas_pelo_banco(self):
+        dados = [
+            {
+                'descricao': f'Compra {i}', 'valor': 10.0, 'tipo': 'DESPESA',
+                'data': '2024-03-01', 'categoria_id': self.mercado.id,
+                'identificador_ofx': f'ofx_{i}',
+            }
+            for i in range(4)
+        ]
+        salvar_transacoes_ofx(dados[:2], self.usuario, None, 'a.ofx')
+
+        resultado = salvar_transacoes_ofx(dados, self.usuario, None, 'b.ofx')
+
+        self.assertEqual(
+            (resultado['importadas'], resultado['duplicadas']), (2, 2))
+        self.assertEqual(Transacao.objects.count(), 4)
+        self.assertEqual(
+            ResumoMensal.objects.get(usuario=self.usuario).quantidade, 4)
+
+
+class ImportacaoLoteTest(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('teste', password='senha')
+        Categoria.objects.create(
+            nome='Outras Despesas', tipo='DESPESA', usuario=self.usuario)
+        self.corrente = ContaBancaria.objects.create(
+            nome='Corrente', banco='001 - Banco do Brasil', agencia='1234',
+            conta='12345-6', usuario=self.usuario)
+        self.poupanca = ContaBancaria.objects.create(
+            nome='Poupança', banco='Banco do Brasil', conta='99999-0',
+            usuario=self.usuario)
+
+    def test_mapear_conta(self):
+        outro_banco = ContaBancaria(
+            nome='Outra', banco='341 - Itaú', conta='12345-6')
+        contas = [self.corrente, self.poupanca]
+
+        self.assertEqual(mapear_conta(contas, '0001', '123456'), self.corrente)
+        self.assertEqual(
+            mapear_conta(contas, '', '1234123456'), self.corrente)
+        self.assertIsNone(mapear_conta(contas, '0001', '55555'))
+        self.assertIsNone(mapear_conta(contas, '0001', ''))
+        # Mesmo número em dois bancos: o BANKID desempata
+        self.assertEqual(
+            mapear_conta(contas + [outro_banco], '341', '12345-6'),
+            outro_banco)
+        self.assertIsNone(
+            mapear_conta(contas + [outro_banco], '', '12345-6'))
+
+    def test_comando_importa_diretorio(self):
+        with tempfile.TemporaryDirectory() as diretorio:
+            os.mkdir(os.path.join(diretorio, 'poupanca'))
+            for nome, linhas, conta in (
+                    ('corrente.ofx', 30, '12345-6'),
+                    ('poupanca/extrato.OFX', 20, '99999-0'),
+                    ('desconhecida.ofx', 10, '55555')):
+                with open(os.path.join(diretorio, nome), 'wb') as arquivo:
+                    arquivo.write(
+                        gerar_ofx_sintetico(linhas, conta).getvalue())
+            with open(os.path.join(diretorio, 'quebrado.ofx'), 'w') as arquivo:
+                arquivo.write('<OFX><STMTTRN><TRNAMT>abc</STMTTRN>')
+
+            saida = io.StringIO()
+            call_command('importar_ofx_lote', diretorio, '--user', 'teste',
+                         '--processos', '2', stdout=saida)
+            call_command('importar_ofx_lote', diretorio, '--user', 'teste',
+                         stdout=io.StringIO())
+
+        self.assertIn('Total: 4 arquivos, 60 lançamentos', saida.getvalue())
+        self.assertIn('60 importadas, 0 duplicadas, 1 arquivos com erro',
+                      saida.getvalue())
+        self.assertEqual(Transacao.objects.count(), 60)
+        self.assertEqual(
+            Transacao.objects.filter(conta_bancaria=self.corrente).count(), 30)
+        self.assertEqual(
+            Transacao.objects.filter(conta_bancaria=self.poupanca).count(), 20)
+        self.assertEqual(
+            Transacao.objects.filter(conta_bancaria=None).count(), 10)
+
+        # Um registro por arquivo em cada execução; a segunda só duplicatas
+        self.assertEqual(ImportacaoOFX.objects.count(), 8)
+        self.assertEqual(
+            ImportacaoOFX.objects.filter(sucesso=False).count(), 2)
+        segunda = ImportacaoOFX.objects.get(
+            arquivo_nome='corrente.ofx', transacoes_importadas=0)
+        self.assertEqual(segunda.transacoes_duplicadas, 30)
+
+    @override_settings(JOBS_ASSINCRONOS=False, OFX_LOTE_PROCESSOS=2)
+    def test_upload_zip(self):
+        self.client.login(username='teste', password='senha')
+        conteudo = io.BytesIO()
+        with zipfile.ZipFile(conteudo, 'w') as pacote:
+            pacote.writestr(
+                'a.ofx', gerar_ofx_sintetico(15, '12345-6').getvalue())
+            pacote.writestr(
+                'b.ofx', gerar_ofx_sintetico(5, '77777').getvalue())
+            pacote.writestr('leiame.txt', 'ignorado')
+
+        self.client.post(reverse('transacoes:importar_ofx'), {
+            'arquivo_ofx': SimpleUploadedFile('extratos.zip',
+                                              conteudo.getvalue()),
+            'conta_bancaria': self.poupanca.id})
+
+        job = Job.objects.get()
+        self.assertEqual(
+            (job.tipo, job.status), ('IMPORTAR_LOTE_OFX', 'CONCLUIDO'))
+        self.assertEqual(job.resultado['importadas'], 20)
+        self.assertEqual(len(job.resultado['arquivos']), 2)
+        self.assertEqual(ImportacaoOFX.objects.count(), 2)
+        # Sem conta correspondente, o extrato vai para a conta escolhida
+        self.assertEqual(
+            Transacao.objects.filter(conta_bancaria=self.poupanca).count(), 5)
+        self.assertFalse(ImportacaoStaging.objects.exists())
+
+    @override_settings(JOBS_ASSINCRONOS=False)
+    def test_upload_zip_acima_dos_limites(self):
+        self.client.login(username='teste', password='senha')
+        conteudo = io.BytesIO()
+        with zipfile.ZipFile(conteudo, 'w') as pacote:
+            for nome in ('a.ofx', 'b.ofx', 'c.ofx'):
+                pacote.writestr(
+                    nome, gerar_ofx_sintetico(5, '12345-6').getvalue())
+        tamanho = sum(
+            info.file_size
+            for info in zipfile.ZipFile(conteudo).infolist())
+
+        for limites, mensagem in (
+                ({'OFX_ZIP_MAX_ARQUIVOS': 2}, 'limite é 2'),
+                ({'OFX_ZIP_MAX_BYTES': tamanho - 1}, 'descompactados')):
+            with self.subTest(limites), override_settings(**limites):
+                self.client.post(reverse('transacoes:importar_ofx'), {
+                    'arquivo_ofx': SimpleUploadedFile(
+                        'extratos.zip', conteudo.getvalue())})
+
+                job = Job.objects.latest('id')
+                self.assertEqual(job.status, 'ERRO')
+                self.assertIn(mensagem, job.erro)
+
+        self.assertFalse(Transacao.objects.exists())
+        self.assertFalse(ImportacaoOFX.objects.exists())
+
+
+class JobTest(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('teste', password='senha')
+
+    def test_reserva_cada_job_uma_vez(self):
+        primeiro = enfileirar_job('SALVAR_OFX', self.usuario, {'token': ''})
+        segundo = enfileirar_job('SALVAR_OFX', self.usuario, {'token': ''})
+
+        self.assertEqual(reservar_proximo_job('w1').pk, primeiro.pk)
+        self.assertEqual(reservar_proximo_job('w2').pk, segundo.pk)
+        self.assertIsNone(reservar_proximo_job('w3'))
+        self.assertEqual(
+            list(Job.objects.order_by('id').values_list('worker', flat=True)),
+            ['w1', 'w2'])
+
+    def test_erro_do_executor_fica_registrado(self):
+        enfileirar_job('SALVAR_OFX', self.usuario, {'token': ''})
+        job = reservar_proximo_job('w1')
+
+        self.assertFalse(executar_job(job))
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'ERRO')
+        self.assertIn('não encontrados', job.erro)
+
+    def test_job_travado_volta_para_fila(self):
+        enfileirar_job('SALVAR_OFX', self.usuario, {'token': ''})
+        job = reservar_proximo_job('w1')
+        Job.objects.filter(pk=job.pk).update(
+            iniciado_em=job.iniciado_em - timedelta(hours=1))
+
+        # Job longo com sinal de vida recente continua com o worker
+        self.assertEqual(liberar_jobs_travados(timedelta(minutes=30)), (0, 0))
+
+        Job.objects.filter(pk=job.pk).update(
+            sinal_vida_em=job.sinal_vida_em - timedelta(hours=1))
+        self.assertEqual(liberar_jobs_travados(timedelta(minutes=30)), (1, 0))
+        self.assertEqual(reservar_proximo_job('w2').tentativas, 2)
+
+    @override_settings(JOB_MAX_TENTATIVAS=1)
+    def test_tentativas_esgotadas(self):
+        enfileirar_job('SALVAR_OFX', self.usuario, {'token': ''})
+        job = reservar_proximo_job('w1')
+        Job.objects.filter(pk=job.pk).update(
+            sinal_vida_em=job.sinal_vida_em - timedelta(hours=1))
+
+        self.assertEqual(liberar_jobs_travados(timedelta(minutes=30)), (0, 1))
+        self.assertEqual(Job.objects.get().status, 'ERRO')
+
+    def test_worker_antigo_nao_sobrescreve_resultado(self):
+        enfileirar_job('SALVAR_OFX', self.usuario, {'token': ''})
+        antigo = reservar_proximo_job('w1')
+        Job.objects.filter(pk=antigo.pk).update(status='PENDENTE', worker='')
+        reservar_proximo_job('w2')
+
+        with self.assertLogs('transacoes.jobs', 'WARNING'):
+            executar_job(antigo)
+
+        job = Job.objects.get()
+        self.assertEqual((job.status, job.worker), ('EXECUTANDO', 'w2'))
+
+
+class SinalDeVidaTest(TransactionTestCase):
+
+    def test_renova_enquanto_executa(self):
+        usuario = User.objects.create_user('teste', password='senha')
+        enfileirar_job('SALVAR_OFX', usuario, {'token': ''})
+        job = reservar_proximo_job('w1')
+
+        with SinalDeVida(job, intervalo=0.01):
+            time.sleep(0.2)
+
+        self.assertGreater(
+            Job.objects.get().sinal_vida_em, job.sinal_vida_em)
+
+
+class ClienteChatGPTFalso:
+    """Imita openai.AsyncOpenAI com latência fixa por requisição"""
+
+    def __init__(self, latencia=0.05, falhas_429=0, categoria=None,
+                 truncadas=0):
+        self.latencia = latencia
+        self.categoria = categoria
+        self.falhas_429 = falhas_429
+        self.truncadas = truncadas
+        self.chamadas = 0
+        self.prompts = []
+        self.em_andamento = 0
+        self.pico = 0
+        self.chat = SimpleNamespace(
+            completions=SimpleNamespace(create=self.create))
+
+    async def close(self):
+        pass
+
+    async def create(self, **kwargs):
+        self.chamadas += 1
+        self.em_andamento += 1
+        self.pico = max(self.pico, self.em_andamento)
+        try:
+            await asyncio.sleep(self.latencia)
+            if self.falhas_429:
+                self.falhas_429 -= 1
+                raise openai.RateLimitError(
+                    'limite', body=None, response=httpx.Response(
+                        429, request=httpx.Request('POST', 'https://api')))
+
+            prompt = kwargs['messages'][1]['content']
+            self.prompts.append(prompt)
+            if 'FALHA' in prompt:
+                raise RuntimeError('resposta inválida')
+
+            codigos = dict(
+                reversed(linha.split('=', 1)) for linha in prompt.splitlines()
+                if re.match(r'^[DR]\d+=', linha))
+            codigo = codigos.get(self.categoria, next(iter(codigos.values())))
+            itens = [
+                [int(linha.split('|')[0]), codigo, 0.9]
+                for linha in prompt.splitlines() if re.match(r'^\d+\|', linha)
+            ]
+            finish_reason = 'stop'
+            if self.truncadas:
+                # Resposta cortada pelo max_tokens: falta a última transação
+                self.truncadas -= 1
+                itens = itens[:-1]
+                finish_reason = 'length'
+
+            return SimpleNamespace(
+                choices=[SimpleNamespace(
+                    finish_reason=finish_reason,
+                    message=SimpleNamespace(content=json.dumps({'r': itens})))],
+                usage=SimpleNamespace(
+                    prompt_tokens=len(prompt) // 4,
+                    completion_tokens=8 * len(itens)))
+        finally:
+            self.em_andamento -= 1
+
+
+class ChatGPTAssincronoTest(SimpleTestCase):
+
+    CATEGORIAS = [
+        {'id': 1, 'nome': 'Alimentação', 'tipo': 'DESPESA', 'cor': '#f00'},
+        {'id': 2, 'nome': 'Mercado', 'tipo': 'DESPESA', 'cor': '#0f0'},
+    ]
+
+    def transacoes(self, quantidade):
+        return [
+            {'descricao': f'Compra {i}', 'valor': 10.0, 'tipo': 'DESPESA',
+             'categoria_id': 2}
+            for i in range(quantidade)
+        ]
+
+    def categorizar(self, transacoes, client, **kwargs):
+        kwargs.setdefault('requisicoes_por_minuto', 60000)
+        kwargs.setdefault('max_linhas', 10)
+        return asyncio.run(categorizar_com_chatgpt_async(
+            transacoes, self.CATEGORIAS, client=client, **kwargs))
+
+    def test_lotes_em_paralelo(self):
+        inicio = time.perf_counter()
+        self.categorizar(
+            self.transacoes(200), ClienteChatGPTFalso(), concorrencia=1)
+        sequencial = time.perf_counter() - inicio
+
+        cliente = ClienteChatGPTFalso()
+        inicio = time.perf_counter()
+        resultado = self.categorizar(
+            self.transacoes(200), cliente, concorrencia=10)
+        paralelo = time.perf_counter() - inicio
+
+        self.assertEqual(cliente.chamadas, 20)
+        self.assertEqual(cliente.pico, 10)
+        self.assertGreater(sequencial / paralelo, 4)
+        self.assertEqual(
+            [t['descricao'] for t in resultado],
+            [f'Compra {i}' for i in range(200)])
+        self.assertTrue(all(t['categoria_id'] == 1 for t in resultado))
+
+    def test_repete_apos_429(self):
+        cliente = ClienteChatGPTFalso(latencia=0, falhas_429=2)
+
+        with self.assertLogs('transacoes.chatgpt_service', 'WARNING'):
+            resultado = self.categorizar(
+                self.transacoes(30), cliente, concorrencia=1,
+                espera_base=0.001)
+
+        self.assertEqual(cliente.chamadas, 5)
+        self.assertTrue(all(t['melhorada_chatgpt'] for t in resultado))
+
+    def test_fallback_local_apenas_no_lote_com_erro(self):
+        transacoes = self.transacoes(30)
+        transacoes[15]['descricao'] = 'FALHA supermercado'
+
+        with self.assertLogs('transacoes.chatgpt_service', 'ERROR'):
+            resultado = self.categorizar(
+                transacoes, ClienteChatGPTFalso(latencia=0), concorrencia=3)
+
+        self.assertEqual(
+            [t.get('confianca_ia') for t in resultado[10:20]], [None] * 10)
+        self.assertEqual(resultado[15]['categoria_id'], 2)
+        self.assertTrue(all(
+            t['confianca_ia'] == 0.9 for t in resultado[:10] + resultado[20:]))
+
+    def test_limitador_de_taxa(self):
+        async def consumir():
+            limitador = LimitadorTaxa(taxa=50, capacidade=1)
+            inicio = time.perf_counter()
+            for _ in range(6):
+                await limitador.aguardar()
+            return time.perf_counter() - inicio
+
+        self.assertGreaterEqual(asyncio.run(consumir()), 0.09)
+
+
+@override_settings(CHATGPT_ENABLED=True, OPENAI_API_KEY='teste')
+class CacheCategorizacaoTest(TestCase):
+
+    def setUp(self):
+        zerar_cache_memoria()
+        self.usuario = User.objects.create_user('teste', password='senha')
+        self.categoria = Categoria.objects.create(
+            nome='Transporte', tipo='DESPESA', usuario=self.usuario)
+        self.cliente = ClienteChatGPTFalso(latencia=0)
+
+    def importar(self, dia):
+        transacoes = [
+            {'descricao': f'{nome} {dia:02d}/03', 'valor': 10.0,
+             'tipo': 'DESPESA', 'categoria_id': None}
+            for nome in ['UBER *TRIP', 'IFOOD *PEDIDO 81234', 'POSTO SHELL']
+            for _ in range(10)
+        ]
+        with mock.patch('openai.AsyncOpenAI', return_value=self.cliente):
+            return categorizar_transacoes_chatgpt(transacoes, self.usuario)
+
+    def test_normalizacao(self):
+        self.assertEqual(normalizar_descricao('UBER *TRIP 12/03'),
+                         normalizar_descricao('Uber *Trip 15/04'))
+        self.assertEqual(
+            normalizar_descricao('MAGAZINE LUIZA PARC 02/10 ****1234'),
+            'magazine luiza')
+        self.assertEqual(normalizar_descricao('99 TAXI'), '99 taxi')
+
+    def test_segunda_importacao_nao_chama_chatgpt(self):
+        # As 30 transações cabem em uma requisição
+        self.importar(1)
+        self.assertEqual(self.cliente.chamadas, 1)
+        self.assertEqual(CategorizacaoCache.objects.count(), 3)
+
+        # Mesmos estabelecimentos com outras datas: banco e depois LRU
+        zerar_cache_memoria()
+        resultado = self.importar(15)
+        self.importar(28)
+
+        self.assertEqual(self.cliente.chamadas, 1)
+        self.assertTrue(all(
+            t['categoria_id'] == self.categoria.id for t in resultado))
+        estatisticas = estatisticas_cache()
+        self.assertEqual(estatisticas['acertos_banco'], 30)
+        self.assertEqual(estatisticas['acertos_lru'], 30)
+        self.assertEqual(estatisticas['taxa_acerto'], 1.0)
+
+    def test_validade_e_limite_por_usuario(self):
+        self.importar(1)
+        CategorizacaoCache.objects.filter(
+            descricao_normalizada='posto shell'
+        ).update(atualizado_em=timezone.now() - timedelta(days=365))
+        zerar_cache_memoria()
+
+        self.importar(2)
+        self.assertEqual(self.cliente.chamadas, 2)
+
+        CategorizacaoCache.objects.filter(
+            descricao_normalizada='uber trip'
+        ).update(usado_em=timezone.now() - timedelta(days=1))
+        self.assertEqual(limpar_cache_expirado(maximo_por_usuario=2), (0, 1))
+        self.assertFalse(CategorizacaoCache.objects.filter(
+            descricao_normalizada='uber trip').exists())
+
+
+@override_settings(CHATGPT_ENABLED=True, OPENAI_API_KEY='teste',
+                   CLASSIFICADOR_MINIMO_EXEMPLOS=10)
+class ClassificadorTest(TestCase):
+
+    def setUp(self):
+        zerar_cache_memoria()
+        self.usuario = User.objects.create_user('teste', password='senha')
+        self.transporte = Categoria.objects.create(
+            nome='Transporte', tipo='DESPESA', usuario=self.usuario)
+        self.alimentacao = Categoria.objects.create(
+            nome='Alimentação', tipo='DESPESA', usuario=self.usuario)
+        self.outras = Categoria.objects.create(
+            nome='Outras Despesas', tipo='DESPESA', usuario=self.usuario)
+        self.historico([
+            ('UBER *TRIP {dia:02d}/03', self.transporte),
+            ('99 TAXI CORRIDA {dia:02d}', self.transporte),
+            ('IFOOD *PEDIDO {dia}4321', self.alimentacao),
+            ('RESTAURANTE SABOR CASEIRO', self.alimentacao),
+            ('PIX ENVIADO FULANO', self.outras),
+        ])
+
+    def historico(self, modelos, dias=range(1, 11)):
+        Transacao.objects.bulk_create(
+            Transacao(
+                descricao=descricao.format(dia=dia), valor=Decimal('10'),
+                tipo='DESPESA', data=date(2024, 3, dia), categoria=categoria,
+                usuario=self.usuario
+            )
+            for descricao, categoria in modelos for dia in dias
+        )
+
+    def test_treino_ignora_categoria_generica(self):
+        self.assertEqual(treinar_classificador(self.usuario), 40)
+        registro = ClassificadorCategoria.objects.get(usuario=self.usuario)
+        self.assertEqual(registro.exemplos, 40)
+
+        modelo = NaiveBayes.carregar(registro.dados)
+        self.assertEqual(
+            set(modelo.classes), {self.transporte.id, self.alimentacao.id})
+
+        # Incremental: só as transações novas são somadas
+        self.assertEqual(treinar_classificador(self.usuario), 0)
+        self.historico([('UBER *EATS', self.alimentacao)], dias=[1, 2])
+        self.assertEqual(treinar_classificador(self.usuario), 2)
+        self.assertEqual(
+            treinar_classificador(self.usuario, completo=True), 42)
+
+    def test_apenas_baixa_confianca_vai_ao_chatgpt(self):
+        treinar_classificador(self.usuario)
+        cliente = ClienteChatGPTFalso(
+            latencia=0, categoria='Outras Despesas')
+        transacoes = [
+            {'descricao': 'UBER *TRIP 28/04', 'tipo': 'DESPESA',
+             'valor': 12.0, 'categoria_id': None},
+            {'descricao': 'IFOOD *PEDIDO 998877', 'tipo': 'DESPESA',
+             'valor': 40.0, 'categoria_id': None},
+            {'descricao': 'LIVRARIA CULTURA', 'tipo': 'DESPESA',
+             'valor': 80.0, 'categoria_id': None},
+        ]
+
+        with mock.patch('openai.AsyncOpenAI', return_value=cliente):
+            resultado = categorizar_transacoes_chatgpt(
+                transacoes, self.usuario)
+
+        self.assertEqual(cliente.chamadas, 1)
+        self.assertEqual(
+            [t['categoria_id'] for t in resultado],
+            [self.transporte.id, self.alimentacao.id, self.outras.id])
+        self.assertTrue(resultado[0]['classificada_modelo'])
+        self.assertGreaterEqual(resultado[0]['confianca_ia'], 0.9)
+        self.assertNotIn('classificada_modelo', resultado[2])
+
+    def test_importacao_atualiza_modelo(self):
+        treinar_classificador(self.usuario)
+        transacoes = [{
+            'descricao': 'POSTO SHELL', 'valor': 100.0, 'tipo': 'DESPESA',
+            'data': '2024-04-01', 'categoria_id': self.transporte.id,
+            'identificador_ofx': f'conta_{i}'
+        } for i in range(3)]
+
+        salvar_transacoes_ofx(transacoes, self.usuario, None, 'extrato.ofx')
+
+        registro = ClassificadorCategoria.objects.get(usuario=self.usuario)
+        self.assertEqual(registro.exemplos, 43)
+        self.assertEqual(registro.ultima_transacao_id,
+                         Transacao.objects.latest('id').id)
+
+
+class PromptCategorizacaoTest(SimpleTestCase):
+
+    CATEGORIAS = [
+        {'id': 10 + i, 'nome': f'Despesa {i:02d}', 'tipo': 'DESPESA',
+         'cor': '#000'}
+        for i in range(60)
+    ] + [{'id': 99, 'nome': 'Salário', 'tipo': 'RECEITA', 'cor': '#0f0'}]
+
+    def transacoes(self, quantidade, tipo='DESPESA'):
+        return [
+            {'descricao': f'COMPRA CARTAO LOJA {i}', 'valor': 10.0 + i,
+             'tipo': tipo, 'categoria_id': None}
+            for i in range(quantidade)
+        ]
+
+    def test_lotes_por_tipo_dentro_do_orcamento(self):
+        transacoes = self.transacoes(200) + self.transacoes(5, 'RECEITA')
+        lotes, sem_categoria = montar_lotes(
+            transacoes, self.CATEGORIAS, orcamento=1200, max_linhas=100)
+
+        self.assertEqual(sem_categoria, [])
+        self.assertEqual(sum(len(lote) for lote in lotes), 205)
+        for lote in lotes:
+            self.assertLessEqual(
+                estimar_tokens(MENSAGEM_SISTEMA) + estimar_tokens(lote.prompt),
+                1200)
+
+        receitas = [lote for lote in lotes if lote.tipo == 'RECEITA']
+        self.assertEqual(len(receitas), 1)
+        self.assertIn('R1=Salário', receitas[0].prompt)
+        self.assertNotIn('Despesa 00', receitas[0].prompt)
+
+    def test_resposta_limitada_por_max_tokens(self):
+        with self.settings(CHATGPT_MAX_TOKENS=250):
+            lotes, _ = montar_lotes(
+                self.transacoes(50), self.CATEGORIAS[:3], orcamento=100000)
+            self.assertTrue(all(lote.max_tokens <= 250 for lote in lotes))
+        self.assertEqual([len(lote) for lote in lotes], [10] * 5)
+
+    def test_reenvia_transacoes_ausentes_da_resposta(self):
+        cliente = ClienteChatGPTFalso(latencia=0, truncadas=1)
+        consumo = ConsumoChatGPT()
+
+        with self.assertLogs('transacoes.chatgpt_service', 'WARNING'):
+            resultado = asyncio.run(categorizar_com_chatgpt_async(
+                self.transacoes(20), self.CATEGORIAS, client=cliente,
+                requisicoes_por_minuto=60000, consumo=consumo))
+
+        self.assertEqual(cliente.chamadas, 2)
+        self.assertIn('\n1|COMPRA CARTAO LOJA 19|29.00\n', cliente.prompts[1])
+        self.assertTrue(all(t['melhorada_chatgpt'] for t in resultado))
+        self.assertEqual(consumo.requisicoes, 2)
+        self.assertEqual(consumo.tokens_resposta, 8 * 20)
+
+
+class ConsumoImportacaoTest(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('teste', password='senha')
+        self.categoria = Categoria.objects.create(
+            nome='Alimentação', tipo='DESPESA', usuario=self.usuario)
+
+    @override_settings(JOBS_ASSINCRONOS=False)
+    def test_consumo_do_preview_gravado_na_importacao(self):
+        token = gravar_staging([{
+            'descricao': 'Mercado', 'valor': 10.0, 'tipo': 'DESPESA',
+            'data': '2024-03-01', 'categoria_id': self.categoria.id,
+            'identificador_ofx': 'conta_1'
+        }], self.usuario, None, 'extrato.ofx')
+        consumo = {
+            'requisicoes': 3, 'tokens_prompt': 1200, 'tokens_resposta': 90}
+        Job.objects.create(
+            tipo='PREVIEW_OFX', status='CONCLUIDO', usuario=self.usuario,
+            resultado={'token': str(token), 'consumo_chatgpt': consumo})
+
+        job = enfileirar_job('SALVAR_OFX', self.usuario, {'token': str(token)})
+
+        self.assertEqual(job.status, 'CONCLUIDO')
+        importacao = ImportacaoOFX.objects.get()
+        self.assertEqual(
+            (importacao.chatgpt_requisicoes, importacao.chatgpt_tokens_prompt,
+             importacao.chatgpt_tokens_resposta),
+            (3, 1200, 90))
+
+
+class PaginacaoCursorTest(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('teste', password='senha')
+        self.categoria = Categoria.objects.create(
+            nome='Alimentação', tipo='DESPESA', usuario=self.usuario)
+        self.conta = ContaBancaria.objects.create(
+            nome='Corrente', banco='Banco', usuario=self.usuario)
+        Transacao.objects.bulk_create(
+            Transacao(
+                descricao=f'Compra {i}', valor=Decimal('10'), tipo='DESPESA',
+                data=date(2024, 3, 1 + i % 3), categoria=self.categoria,
+                conta_bancaria=self.conta, usuario=self.usuario
+            )
+            for i in range(45)
+        )
+        # Mesmo criado_em para todas: o desempate fica com o id
+        Transacao.objects.update(criado_em=timezone.now())
+        reconstruir_resumo(self.usuario)
+        self.ordem = list(
+            Transacao.objects.order_by('-data', '-criado_em', '-id')
+            .values_list('id', flat=True))
+        self.client.login(username='teste', password='senha')
+
+    def test_percorre_todas_as_paginas_sem_repetir(self):
+        ids, cursor, paginas = [], None, []
+        while True:
+            pagina = pagina_por_cursor(
+                Transacao.objects.filter(usuario=self.usuario), cursor)
+            paginas.append(pagina)
+            ids.extend(t.id for t in pagina)
+            cursor = pagina.proximo
+            if cursor is None:
+                break
+
+        self.assertEqual(ids, self.ordem)
+        self.assertEqual([len(p) for p in paginas], [20, 20, 5])
+
+        # Voltando da terceira página chega-se à segunda
+        anterior = pagina_por_cursor(
+            Transacao.objects.filter(usuario=self.usuario),
+            antes=paginas[2].anterior)
+        self.assertEqual([t.id for t in anterior], self.ordem[20:40])
+        self.assertIsNotNone(anterior.anterior)
+
+    def test_pagina_sem_n_mais_1(self):
+        with self.assertNumQueries(1):
+            pagina = pagina_por_cursor(
+                Transacao.objects.filter(usuario=self.usuario))
+            [(t.categoria.nome, t.conta_bancaria.nome) for t in pagina]
+
+    def test_api_json(self):
+        resposta = self.client.get(reverse('transacoes:lista_json'))
+        dados = resposta.json()
+        self.assertEqual(dados['total'], 45)
+        self.assertEqual(len(dados['transacoes']), 20)
+        self.assertEqual(dados['transacoes'][0]['categoria']['nome'],
+                         'Alimentação')
+
+        resposta = self.client.get(
+            reverse('transacoes:lista_json'), {'apos': dados['proximo']})
+        self.assertEqual(
+            [t['id'] for t in resposta.json()['transacoes']],
+            self.ordem[20:40])
+        self.assertNotIn('total', resposta.json())
+
+        resposta = self.client.get(
+            reverse('transacoes:lista_json'), {'apos': 'invalido'})
+        self.assertEqual(resposta.status_code, 400)
+
+    def test_lista_com_busca(self):
+        resposta = self.client.get(
+            reverse('transacoes:lista'), {'busca': 'Compra 1'})
+        self.assertEqual(resposta.context['total_transacoes'], 11)
+        self.assertEqual(len(resposta.context['transacoes']), 11)
+        self.assertContains(resposta, '11 no total')
+
+
+class ExportacaoTest(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('teste', password='senha')
+        mercado = Categoria.objects.create(
+            nome='Alimentação', tipo='DESPESA', usuario=self.usuario)
+        salario = Categoria.objects.create(
+            nome='Salário', tipo='RECEITA', usuario=self.usuario)
+        conta = ContaBancaria.objects.create(
+            nome='Corrente', banco='Banco', usuario=self.usuario)
+        Transacao.objects.create(
+            descricao='Padaria "Pão & Cia"; centro', valor=Decimal('12.50'),
+            tipo='DESPESA', data=date(2024, 3, 5), categoria=mercado,
+            conta_bancaria=conta, usuario=self.usuario)
+        Transacao.objects.create(
+            descricao='Salário', valor=Decimal('1500.00'), tipo='RECEITA',
+            data=date(2024, 3, 1), categoria=salario, usuario=self.usuario,
+            identificador_ofx='ofx_1')
+        outro = User.objects.create_user('outro')
+        Transacao.objects.create(
+            descricao='De outro usuário', valor=Decimal('1.00'),
+            tipo='DESPESA', data=date(2024, 3, 1),
+            categoria=Categoria.objects.create(
+                nome='X', tipo='DESPESA', usuario=outro),
+            usuario=outro)
+        self.client.login(username='teste', password='senha')
+
+    def exportar(self, formato, **filtros):
+        resposta = self.client.get(
+            reverse('transacoes:exportar', args=[formato]), filtros)
+        self.assertTrue(resposta.streaming)
+        self.assertIn('attachment', resposta['Content-Disposition'])
+        return b''.join(resposta.streaming_content)
+
+    def test_csv_relido_pela_importacao(self):
+        conteudo = self.exportar('csv')
+
+        lancamentos = list(ler_transacoes_csv(io.BytesIO(conteudo)))
+        self.assertEqual(
+            [(l.date.date(), l.amount, l.memo) for l in lancamentos], [
+                (date(2024, 3, 1), Decimal('1500.00'), 'Salário'),
+                (date(2024, 3, 5), Decimal('-12.50'),
+                 'Padaria "Pão & Cia"; centro'),
+            ])
+
+    def test_csv_nao_exporta_formulas(self):
+        categoria = Categoria.objects.create(
+            nome='@Compras', tipo='DESPESA', usuario=self.usuario)
+        Transacao.objects.create(
+            descricao='=HYPERLINK("http://x","y")', valor=Decimal('3.00'),
+            tipo='DESPESA', data=date(2024, 3, 9), categoria=categoria,
+            usuario=self.usuario)
+
+        linhas = self.exportar('csv').decode('utf-8-sig').splitlines()
+
+        self.assertEqual(
+            linhas[-1],
+            '09/03/2024;"\'=HYPERLINK(""http://x"",""y"")";-3,00;DESPESA;'
+            "'@Compras;;")
+        # O valor negativo continua numérico
+        self.assertIn(';-12,50;', linhas[2])
+
+    def test_ofx_e_filtros_da_lista(self):
+        conteudo = self.exportar('ofx', tipo='DESPESA')
+
+        ofx = ofxparse.OfxParser.parse(io.BytesIO(conteudo))
+        transacoes = ofx.account.statement.transactions
+        self.assertEqual(len(transacoes), 1)
+        self.assertEqual(transacoes[0].amount, Decimal('-12.50'))
+        self.assertEqual(transacoes[0].memo, 'Padaria "Pão & Cia"; centro')
+        self.assertEqual(ofx.account.statement.balance, Decimal('-12.50'))
+
+    def test_jsonl_em_uma_consulta(self):
+        with CaptureQueriesContext(connection) as consultas:
+            conteudo = self.exportar('jsonl')
+
+        linhas = [json.loads(linha) for linha in conteudo.splitlines()]
+        self.assertEqual(
+            [(l['data'], l['valor'], l['categoria'], l['identificador_ofx'])
+             for l in linhas],
+            [('2024-03-01', '1500.00', 'Salário', 'ofx_1'),
+             ('2024-03-05', '12.50', 'Alimentação', '')])
+        self.assertEqual(linhas[1]['conta_bancaria'], 'Corrente')
+        consultas_transacoes = [
+            c['sql'] for c in consultas.captured_queries
+            if 'transacoes_transacao' in c['sql']]
+        self.assertEqual(len(consultas_transacoes), 1)
+
+    def test_formato_desconhecido(self):
+        resposta = self.client.get(
+            reverse('transacoes:exportar', args=['xls']))
+        self.assertEqual(resposta.status_code, 404)
+
+
+class BuscaTextualTest(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('teste', password='senha')
+        self.saude = Categoria.objects.create(
+            nome='Saúde', tipo='DESPESA', usuario=self.usuario)
+        self.mercado = Categoria.objects.create(
+            nome='Mercado', tipo='DESPESA', usuario=self.usuario)
+
+    def criar(self, descricao, categoria=None):
+        return Transacao.objects.create(
+            descricao=descricao, valor=Decimal('10'), tipo='DESPESA',
+            data=date(2024, 3, 1), categoria=categoria or self.mercado,
+            usuario=self.usuario)
+
+    def buscar(self, busca):
+        return set(filtrar_busca(
+            Transacao.objects.filter(usuario=self.usuario), self.usuario,
+            busca
+        ).values_list('descricao', flat=True))
+
+    def test_sem_acentos_e_por_prefixo(self):
+        self.criar('FARMÁCIA São João')
+        self.criar('Pão de Açúcar')
+        self.criar('Supermercado Extra')
+
+        self.assertEqual(self.buscar('farmacia'), {'FARMÁCIA São João'})
+        self.assertEqual(self.buscar('sao jo'), {'FARMÁCIA São João'})
+        self.assertEqual(self.buscar('ACUCAR'), {'Pão de Açúcar'})
+        self.assertEqual(self.buscar('pa acu'), {'Pão de Açúcar'})
+        self.assertEqual(self.buscar('"extra'), {'Supermercado Extra'})
+        self.assertEqual(self.buscar('inexistente'), set())
+
+    def test_indice_acompanha_gravacoes(self):
+        transacao = self.criar('Padaria')
+        Transacao.objects.bulk_create([Transacao(
+            descricao='Padaria Central', valor=Decimal('5'), tipo='DESPESA',
+            data=date(2024, 3, 2), categoria=self.mercado,
+            usuario=self.usuario)])
+        self.assertEqual(self.buscar('padaria'), {'Padaria', 'Padaria Central'})
+
+        transacao.descricao = 'Açougue'
+        transacao.save()
+        self.assertEqual(self.buscar('padaria'), {'Padaria Central'})
+        self.assertEqual(self.buscar('acougue'), {'Açougue'})
+
+        Transacao.objects.filter(descricao='Padaria Central').delete()
+        self.assertEqual(self.buscar('padaria'), set())
+
+    def test_categoria_e_relevancia(self):
+        self.criar('Consulta médica', self.saude)
+        self.criar('Drogaria consulta de preço consulta')
+        self.criar('Drogaria')
+
+        self.assertEqual(
+            self.buscar('saude'), {'Consulta médica'})
+
+        ordenadas = list(ordenar_por_relevancia(
+            filtrar_busca(
+                Transacao.objects.filter(usuario=self.usuario),
+                self.usuario, 'consulta'),
+            'consulta'
+        ).values_list('descricao', flat=True))
+        self.assertEqual(ordenadas[0], 'Consulta médica')
+        self.assertEqual(len(ordenadas), 2)
+
+
+class PeriodoTest(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('teste', password='senha')
+        self.categoria = Categoria.objects.create(
+            nome='Mercado', tipo='DESPESA', usuario=self.usuario)
+        for dia in (date(2024, 2, 29), date(2024, 3, 1), date(2024, 3, 31),
+                    date(2024, 4, 1)):
+            Transacao.objects.create(
+                descricao=f'Compra {dia}', valor=Decimal('10'),
+                tipo='DESPESA', data=dia, categoria=self.categoria,
+                usuario=self.usuario)
+
+    def test_intervalo_semiaberto(self):
+        dezembro = Periodo.mes(2024, 12)
+
+        self.assertEqual(dezembro, (date(2024, 12, 1), date(2025, 1, 1)))
+        self.assertIn(date(2024, 12, 31), dezembro)
+        self.assertNotIn(date(2025, 1, 1), dezembro)
+        self.assertEqual(Periodo.da_data(date(2024, 2, 10)).fim,
+                         date(2024, 3, 1))
+        with self.assertRaises(ValueError):
+            Periodo.mes(2024, 13)
+
+    def test_no_mes_filtra_pelos_limites(self):
+        transacoes = Transacao.objects.filter(usuario=self.usuario)
+
+        self.assertEqual(
+            sorted(transacoes.no_mes(2024, 3).values_list('data', flat=True)),
+            [date(2024, 3, 1), date(2024, 3, 31)])
+
+    def test_no_mes_usa_faixa_do_indice(self):
+        transacoes = Transacao.objects.filter(usuario=self.usuario)
+
+        plano = transacoes.no_mes(2024, 3).explain()
+        self.assertRegex(
+            plano, r'INDEX \w+ \(usuario_id=\? AND data>\? AND data<\?\)')
+        self.assertNotIn(
+            'django_date_extract', str(transacoes.no_mes(2024, 3).query))
+
+        # O filtro antigo percorre o ano inteiro extraindo o mês de cada linha
+        antigo = transacoes.filter(data__month=3, data__year=2024)
+        self.assertIn('django_date_extract', str(antigo.query))
+
+    def test_hierarquia_de_datas_do_admin_usa_indice(self):
+        admin = User.objects.create_superuser('admin', password='senha')
+        self.client.force_login(admin)
+
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(
+                reverse('admin:transacoes_transacao_changelist'),
+                {'data__year': 2024, 'data__month': 3})
+
+        self.assertEqual(response.status_code, 200)
+        sql = ' '.join(c['sql'] for c in consultas)
+        self.assertNotIn('django_date_extract', sql)
+
+        plano = Transacao.objects.no_periodo(Periodo.mes(2024, 3)).explain()
+        self.assertIn('transacao_data_idx', plano)
@@ -6,6 +6,9 @@ app_name = 'transacoes'
 urlpatterns = [
     # Transações
     path('', views.lista_transacoes, name='lista'),
+    path('api/', views.lista_transacoes_json, name='lista_json'),
+    path('exportar/<str:formato>/', views.exportar_transacoes,
+         name='exportar'),
     path('nova/', views.criar_transacao, name='criar'),
     path('<int:pk>/editar/', views.editar_transacao, name='editar'),
     path('<int:pk>/excluir/', views.excluir_transacao, name='excluir'),
@@ -14,10 +17,14 @@ urlpatterns = [
     path('categorias/', views.lista_categorias, name='categorias'),
     path('categorias/nova/', views.criar_categoria, name='criar_categoria'),
 
+    # Contas bancárias
+    path('contas/saldo-diario/', views.saldo_diario, name='saldo_diario'),
+
     # Importação OFX
     path('importar-ofx/', views.importar_ofx, name='importar_ofx'),
     path('confirmar-importacao-ofx/', views.confirmar_importacao_ofx,
          name='confirmar_importacao_ofx'),
+    path('jobs/<int:pk>/', views.progresso_job, name='progresso_job'),
 
     # Transações Recorrentes
     path('recorrentes/', views.lista_transacoes_recorrentes,
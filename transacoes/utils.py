@@ -1,12 +1,272 @@
-import ofxparse
+from datetime import date
 from decimal import Decimal
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models.constants import OnConflict
 from django.utils import timezone
 from django.shortcuts import get_object_or_404
 from .models import Transacao, ImportacaoOFX, Categoria, ContaBancaria
-from .chatgpt_service import categorizar_transacoes_chatgpt
+from .categorizacao import CategorizadorAutomatico
+from .chatgpt_service import ConsumoChatGPT, categorizar_transacoes_chatgpt
+from .classificador import atualizar_classificador
+from .contadores import Contadores
+from .leitor_csv import ler_transacoes_planilha
+from .leitor_ofx import ler_transacoes_ofx
+from .resumo import registrar_no_resumo
+from .saldos import registrar_no_saldo
+from .versao import invalidar_dados_usuario
 
+# Quantidade máxima de identificadores por consulta IN na deduplicação
+# (mantém cada consulta abaixo do limite de variáveis do SQLite)
+DEDUP_CHUNK_SIZE = 500
 
-def preview_arquivo_ofx(arquivo, usuario, conta_bancaria=None):
+# Quantidade padrão de registros por INSERT na gravação em lote
+OFX_BULK_BATCH_SIZE = 500
+
+# Contadores do processo atual
+_estatisticas = Contadores('lancamentos_lidos', 'transacoes_inseridas')
+
+
+def registrar_importacao(lidos=0, inseridas=0):
+    """Soma lançamentos lidos de extratos e transações gravadas em lote"""
+    _estatisticas.somar(
+        lancamentos_lidos=lidos, transacoes_inseridas=inseridas)
+
+
+def estatisticas_importacao():
+    """Contadores de importação desde o início do processo"""
+    return _estatisticas.valores()
+
+
+def gerar_identificador_ofx(lancamento):
+    """Cria identificador único baseado nos dados da transação"""
+    return f"{lancamento.account_id}_{lancamento.id}_{lancamento.date}_{lancamento.amount}"
+
+
+def campos_consumo_chatgpt(consumo):
+    """Campos de ImportacaoOFX com o uso do ChatGPT registrado no preview"""
+    consumo = consumo or {}
+    return {
+        'chatgpt_requisicoes': consumo.get('requisicoes', 0),
+        'chatgpt_tokens_prompt': consumo.get('tokens_prompt', 0),
+        'chatgpt_tokens_resposta': consumo.get('tokens_resposta', 0),
+    }
+
+
+def lotes_transacoes_ofx(arquivo, tamanho=DEDUP_CHUNK_SIZE):
+    """
+    Lê o arquivo OFX em fluxo e agrupa os lançamentos em lotes
+
+    Apenas um lote fica em memória por vez, o que permite verificar as
+    duplicatas de cada lote com uma única consulta.
+
+    Yields:
+        list: Tuplas (identificador, lancamento) na ordem do arquivo
+    """
+    return agrupar_em_lotes(ler_transacoes_ofx(arquivo), tamanho)
+
+
+def agrupar_em_lotes(lancamentos, tamanho=DEDUP_CHUNK_SIZE):
+    """Agrupa lançamentos lidos em fluxo em lotes (identificador, lancamento)"""
+    lote = []
+    for lancamento in lancamentos:
+        lote.append((gerar_identificador_ofx(lancamento), lancamento))
+        if len(lote) >= tamanho:
+            registrar_importacao(lidos=len(lote))
+            yield lote
+            lote = []
+
+    if lote:
+        registrar_importacao(lidos=len(lote))
+        yield lote
+
+
+def buscar_identificadores_existentes(usuario, identificadores,
+                                      chunk_size=DEDUP_CHUNK_SIZE):
+    """
+    Verifica em lote quais identificadores OFX já foram importados
+
+    Args:
+        usuario: Usuário proprietário das transações (None para todos)
+        identificadores: Iterável com os identificadores candidatos
+        chunk_size: Quantidade de identificadores por consulta
+
+    Returns:
+        set: Identificadores que já existem para o usuário
+    """
+    candidatos = list(dict.fromkeys(i for i in identificadores if i))
+    existentes = set()
+
+    transacoes = Transacao.objects.all()
+    if usuario is not None:
+        transacoes = transacoes.filter(usuario=usuario)
+
+    for inicio in range(0, len(candidatos), chunk_size):
+        lote = candidatos[inicio:inicio + chunk_size]
+        existentes.update(
+            transacoes.filter(
+                identificador_ofx__in=lote
+            ).values_list('identificador_ofx', flat=True)
+        )
+
+    return existentes
+
+
+def inserir_transacoes(transacoes, batch_size=None):
+    """
+    Grava transações em lote ignorando as que já existem no banco
+
+    Transações com identificador (importações e recorrências), cobertas
+    pela restrição de unicidade (usuario, identificador_ofx), são gravadas
+    ignorando conflitos; as ignoradas pelo banco são duplicatas. As inseridas entram no resumo mensal e no saldo das contas
+    na mesma transação.
+
+    Args:
+        transacoes: Lista de instâncias de Transacao ainda não gravadas
+        batch_size: Registros por INSERT (padrão: settings.OFX_BULK_BATCH_SIZE)
+
+    Returns:
+        list: Transações efetivamente inseridas
+    """
+    batch_size = batch_size or getattr(
+        settings, 'OFX_BULK_BATCH_SIZE', OFX_BULK_BATCH_SIZE)
+
+    protegidas = [t for t in transacoes if t.identificador_ofx]
+    livres = [t for t in transacoes if not t.identificador_ofx]
+
+    with transaction.atomic():
+        inseridas = Transacao.objects.bulk_create(
+            livres, batch_size=batch_size)
+        inseridas += _inserir_ignorando_conflitos(protegidas, batch_size)
+
+        registrar_no_resumo(inseridas)
+        registrar_no_saldo(inseridas)
+        for usuario_id in {t.usuario_id for t in inseridas}:
+            invalidar_dados_usuario(usuario_id)
+
+    registrar_importacao(inseridas=len(inseridas))
+    return inseridas
+
+
+def ids_por_identificador(usuario, identificadores,
+                          chunk_size=DEDUP_CHUNK_SIZE):
+    """
+    Transações do usuário com os identificadores OFX informados
+
+    Returns:
+        dict: {identificador_ofx: id}
+    """
+    ids = {}
+    for inicio in range(0, len(identificadores), chunk_size):
+        ids.update(Transacao.objects.filter(
+            usuario=usuario,
+            identificador_ofx__in=identificadores[inicio:inicio + chunk_size]
+        ).values_list('identificador_ofx', 'id'))
+    return ids
+
+
+def _inserir_ignorando_conflitos(transacoes, batch_size):
+    """
+    Insere ignorando conflitos e devolve as linhas gravadas
+
+    Com RETURNING (SQLite 3.35+, PostgreSQL) o próprio INSERT devolve as
+    linhas gravadas, como em staging._copiar_para_transacoes(). Sem ele o
+    bulk_create(ignore_conflicts=True) não devolve as pks: as gravadas são
+    os identificadores do lote que não existiam antes do INSERT, lidos de
+    novo em seguida (a restrição garante um id por identificador).
+    """
+    if not transacoes:
+        return []
+
+    por_usuario = {}
+    for t in transacoes:
+        por_usuario.setdefault(t.usuario_id, {}).setdefault(
+            t.identificador_ofx, t)
+
+    alias = router.db_for_write(Transacao)
+    conexao = connections[alias]
+
+    if conexao.features.can_return_rows_from_bulk_insert:
+        gravadas = _inserir_com_retorno(transacoes, batch_size, conexao)
+    else:
+        existentes = {
+            usuario_id: ids_por_identificador(
+                usuario_id, list(por_identificador))
+            for usuario_id, por_identificador in por_usuario.items()
+        }
+
+        Transacao.objects.bulk_create(
+            transacoes, batch_size=batch_size, ignore_conflicts=True)
+
+        gravadas = []
+        for usuario_id, por_identificador in por_usuario.items():
+            novos = [i for i in por_identificador
+                     if i not in existentes[usuario_id]]
+            gravadas.extend(
+                (pk, usuario_id, identificador)
+                for identificador, pk in ids_por_identificador(
+                    usuario_id, novos).items()
+            )
+
+    inseridas = []
+    for pk, usuario_id, identificador in gravadas:
+        t = por_usuario[usuario_id][identificador]
+        t.pk = pk
+        t._state.adding = False
+        t._state.db = alias
+        inseridas.append(t)
+
+    return sorted(inseridas, key=lambda t: t.pk)
+
+
+def _inserir_com_retorno(transacoes, batch_size, conexao):
+    """
+    INSERT ... VALUES em lotes ignorando conflitos, com RETURNING
+
+    Dentro de um lote, uma linha repetida conflita com a primeira, que é
+    a gravada; em por_usuario a primeira também é a que fica.
+
+    Returns:
+        list: (id, usuario_id, identificador_ofx) das linhas gravadas
+    """
+    qn = conexao.ops.quote_name
+    campos = [f for f in Transacao._meta.concrete_fields if not f.primary_key]
+    batch_size = min(
+        batch_size, conexao.ops.bulk_batch_size(campos, transacoes))
+
+    # INSERT OR IGNORE no SQLite, ON CONFLICT DO NOTHING no PostgreSQL
+    insert = conexao.ops.insert_statement(on_conflict=OnConflict.IGNORE)
+    sufixo = conexao.ops.on_conflict_suffix_sql(
+        campos, OnConflict.IGNORE, None, None)
+    colunas = ', '.join(qn(f.column) for f in campos)
+    linha = '(' + ', '.join(['%s'] * len(campos)) + ')'
+    retorno = (
+        f'RETURNING {qn("id")}, {qn("usuario_id")}, '
+        f'{qn("identificador_ofx")}'
+    )
+
+    gravadas = []
+    with conexao.cursor() as cursor:
+        for inicio in range(0, len(transacoes), batch_size):
+            lote = transacoes[inicio:inicio + batch_size]
+            sql = (
+                f'{insert} {qn(Transacao._meta.db_table)} ({colunas}) '
+                f'VALUES {", ".join([linha] * len(lote))}'
+            )
+            if sufixo:
+                sql += f' {sufixo}'
+            # pre_save() preenche criado_em/atualizado_em como o bulk_create
+            cursor.execute(f'{sql} {retorno}', [
+                f.get_db_prep_save(f.pre_save(t, True), conexao)
+                for t in lote for f in campos
+            ])
+            gravadas.extend(cursor.fetchall())
+
+    return gravadas
+
+
+def preview_arquivo_ofx(arquivo, usuario, conta_bancaria=None,
+                        progresso=None):
     """
     Processa um arquivo OFX e retorna preview das transações para confirmação
 
@@ -14,33 +274,59 @@ def preview_arquivo_ofx(arquivo, usuario, conta_bancaria=None):
         arquivo: Arquivo OFX enviado
         usuario: Usuário que está importando
         conta_bancaria: Conta bancária associada (opcional)
+        progresso: Função progresso(etapa, transacoes) chamada após cada
+            lote lido ('leitura') e após o ChatGPT ('categorizacao')
 
     Returns:
-        dict: Resultado com lista de transações para preview
+        dict: Resultado com lista de transações para preview e o consumo
+        do ChatGPT ('consumo_chatgpt')
     """
-    try:
-        # Parse do arquivo OFX
-        ofx = ofxparse.OfxParser.parse(arquivo)
+    return _preview_lotes(
+        lotes_transacoes_ofx(arquivo), usuario, conta_bancaria, progresso)
+
+
+def preview_arquivo_csv(arquivo, usuario, conta_bancaria=None,
+                        progresso=None, formato='csv', mapeamento=None):
+    """
+    Processa um extrato CSV ou XLSX e retorna o preview das transações
+
+    Mesmo resultado de preview_arquivo_ofx(); a partir da leitura, o
+    extrato segue o caminho da importação OFX (deduplicação pelo
+    identificador, categorização e staging).
 
+    Args:
+        formato: 'csv' ou 'xlsx'
+        mapeamento: Dicionário campo -> coluna ('data', 'descricao',
+            'valor', 'credito', 'debito', 'documento'); os campos omitidos
+            são detectados pelo cabeçalho
+    """
+    lancamentos = ler_transacoes_planilha(
+        arquivo, formato, mapeamento,
+        conta=str(conta_bancaria.pk) if conta_bancaria else '')
+    return _preview_lotes(
+        agrupar_em_lotes(lancamentos), usuario, conta_bancaria, progresso)
+
+
+def _preview_lotes(lotes, usuario, conta_bancaria, progresso):
+    """Deduplica e categoriza os lotes lidos e monta o preview"""
+    try:
         transacoes_preview = []
+        consumo = ConsumoChatGPT()
         transacoes_duplicadas = 0
         total_transacoes = 0
 
-        # Processa cada conta no arquivo OFX
-        for account in ofx.accounts:
-            for transaction in account.statement.transactions:
-                total_transacoes += 1
-
-                # Cria identificador único baseado nos dados da transação
-                identificador = f"{account.account_id}_{transaction.id}_{transaction.date}_{transaction.amount}"
+        # Categorias compiladas uma vez para toda a importação
+        categorizador = CategorizadorAutomatico(usuario)
 
-                # Verifica se já existe uma transação com esse identificador
-                is_duplicada = Transacao.objects.filter(
-                    usuario=usuario,
-                    identificador_ofx=identificador
-                ).exists()
+        # O arquivo é lido em fluxo; cada lote é verificado com uma consulta
+        for lote in lotes:
+            total_transacoes += len(lote)
+            existentes = buscar_identificadores_existentes(
+                usuario, (identificador for identificador, _ in lote)
+            )
 
-                if is_duplicada:
+            for identificador, transaction in lote:
+                if identificador in existentes:
                     transacoes_duplicadas += 1
                     continue
 
@@ -51,7 +337,7 @@ def preview_arquivo_ofx(arquivo, usuario, conta_bancaria=None):
 
                 # Tenta encontrar categoria baseada na descrição
                 categoria = obter_categoria_automatica(
-                    descricao, tipo, usuario)
+                    descricao, tipo, usuario, categorizador)
 
                 transacao_data = {
                     'descricao': descricao,
@@ -67,17 +353,23 @@ def preview_arquivo_ofx(arquivo, usuario, conta_bancaria=None):
 
                 transacoes_preview.append(transacao_data)
 
+            if progresso:
+                progresso('leitura', total_transacoes)
+
         # Processa com ChatGPT para melhorar categorização
         if transacoes_preview:
             transacoes_preview = categorizar_transacoes_chatgpt(
-                transacoes_preview, usuario
+                transacoes_preview, usuario, consumo
             )
+            if progresso:
+                progresso('categorizacao', len(transacoes_preview))
 
         return {
             'sucesso': True,
             'transacoes': transacoes_preview,
             'duplicadas': transacoes_duplicadas,
-            'total': total_transacoes
+            'total': total_transacoes,
+            'consumo_chatgpt': consumo.como_dict()
         }
 
     except Exception as e:
@@ -88,85 +380,89 @@ def preview_arquivo_ofx(arquivo, usuario, conta_bancaria=None):
         }
 
 
-def salvar_transacoes_ofx(transacoes_data, usuario, conta_id, arquivo_nome):
+def salvar_transacoes_ofx(transacoes_data, usuario, conta_id, arquivo_nome,
+                          batch_size=None, consumo_chatgpt=None):
     """
     Salva as transações confirmadas pelo usuário
 
+    As transações são montadas em memória e gravadas em lotes com INSERT
+    ... ON CONFLICT DO NOTHING, dentro de uma única transação do banco. As
+    duplicatas (já importadas, repetidas no arquivo ou gravadas ao mesmo
+    tempo por outra importação) são as linhas que o banco ignorou.
+
     Args:
         transacoes_data: Lista com dados das transações
         usuario: Usuário que está importando
         conta_id: ID da conta bancária
         arquivo_nome: Nome do arquivo original
+        batch_size: Registros por INSERT (padrão: settings.OFX_BULK_BATCH_SIZE)
+        consumo_chatgpt: 'consumo_chatgpt' devolvido pelo preview (opcional)
 
     Returns:
         dict: Resultado da importação
     """
-    try:
-        # Cria registro de importação
-        importacao = ImportacaoOFX.objects.create(
-            arquivo_nome=arquivo_nome,
-            usuario=usuario,
-            total_transacoes=len(transacoes_data),
-            transacoes_importadas=0,
-            transacoes_duplicadas=0
-        )
+    batch_size = batch_size or getattr(
+        settings, 'OFX_BULK_BATCH_SIZE', OFX_BULK_BATCH_SIZE)
 
+    try:
         conta_bancaria = None
         if conta_id:
             conta_bancaria = get_object_or_404(
                 ContaBancaria, pk=conta_id, usuario=usuario
             )
 
-        transacoes_importadas = 0
-        transacoes_duplicadas = 0
+        # Carrega as categorias do usuário uma única vez
+        categorias = Categoria.objects.filter(usuario=usuario).in_bulk()
+
+        novas_transacoes = []
+        categorizador = None
 
         for transacao_data in transacoes_data:
-            # Verifica novamente se não é duplicata
-            if Transacao.objects.filter(
-                usuario=usuario,
-                identificador_ofx=transacao_data['identificador_ofx']
-            ).exists():
-                transacoes_duplicadas += 1
-                continue
-
-            # Busca a categoria
-            try:
-                categoria = Categoria.objects.get(
-                    id=transacao_data['categoria_id'],
-                    usuario=usuario
-                )
-            except Categoria.DoesNotExist:
+            categoria = categorias.get(transacao_data['categoria_id'])
+            if categoria is None:
                 # Categoria padrão caso não encontre
+                if categorizador is None:
+                    categorizador = CategorizadorAutomatico(usuario)
                 categoria = obter_categoria_automatica(
                     transacao_data['descricao'],
                     transacao_data['tipo'],
-                    usuario
+                    usuario,
+                    categorizador
                 )
+                categorias[categoria.id] = categoria
 
-            # Cria a transação
-            from datetime import datetime
-            Transacao.objects.create(
+            novas_transacoes.append(Transacao(
                 descricao=transacao_data['descricao'],
                 valor=Decimal(str(transacao_data['valor'])),
                 tipo=transacao_data['tipo'],
-                data=datetime.fromisoformat(transacao_data['data']).date(),
+                data=date.fromisoformat(transacao_data['data'][:10]),
                 categoria=categoria,
                 conta_bancaria=conta_bancaria,
                 usuario=usuario,
-                identificador_ofx=transacao_data['identificador_ofx'],
+                identificador_ofx=transacao_data['identificador_ofx'] or '',
                 importada_ofx=True
-            )
+            ))
 
-            transacoes_importadas += 1
+        with transaction.atomic():
+            inseridas = inserir_transacoes(novas_transacoes, batch_size)
+            transacoes_duplicadas = len(novas_transacoes) - len(inseridas)
 
-        # Atualiza registro de importação
-        importacao.transacoes_importadas = transacoes_importadas
-        importacao.transacoes_duplicadas = transacoes_duplicadas
-        importacao.save()
+            # Registra a importação já com os totais finais
+            ImportacaoOFX.objects.create(
+                arquivo_nome=arquivo_nome,
+                usuario=usuario,
+                total_transacoes=len(transacoes_data),
+                transacoes_importadas=len(inseridas),
+                transacoes_duplicadas=transacoes_duplicadas,
+                **campos_consumo_chatgpt(consumo_chatgpt)
+            )
+
+        # As transações novas passam a treinar o classificador do usuário
+        atualizar_classificador(usuario)
 
         return {
             'sucesso': True,
-            'importadas': transacoes_importadas,
+            'importadas': len(inseridas),
             'duplicadas': transacoes_duplicadas
         }
 
@@ -190,9 +486,6 @@ def processar_arquivo_ofx(arquivo, usuario, conta_bancaria=None):
         dict: Resultado da importação com estatísticas
     """
     try:
-        # Parse do arquivo OFX
-        ofx = ofxparse.OfxParser.parse(arquivo)
-
         # Cria registro de importação
         importacao = ImportacaoOFX.objects.create(
             arquivo_nome=arquivo.name,
@@ -204,24 +497,19 @@ def processar_arquivo_ofx(arquivo, usuario, conta_bancaria=None):
 
         transacoes_importadas = 0
         transacoes_duplicadas = 0
-        total_transacoes = 0
 
-        # Processa cada conta no arquivo OFX
-        for account in ofx.accounts:
-            for transaction in account.statement.transactions:
-                total_transacoes += 1
+        # Categorias compiladas uma vez para toda a importação
+        categorizador = CategorizadorAutomatico(usuario)
 
-                # Cria identificador único baseado nos dados da transação
-                identificador = f"{account.account_id}_{transaction.id}_{transaction.date}_{transaction.amount}"
+        total_transacoes = 0
 
-                # Verifica se já existe uma transação com esse identificador
-                if Transacao.objects.filter(
-                    usuario=usuario,
-                    identificador_ofx=identificador
-                ).exists():
-                    transacoes_duplicadas += 1
-                    continue
+        # O arquivo é lido em fluxo e cada lote é gravado com um INSERT que
+        # ignora os identificadores já importados
+        for lote in lotes_transacoes_ofx(arquivo):
+            total_transacoes += len(lote)
+            novas = []
 
+            for identificador, transaction in lote:
                 # Determina tipo da transação
                 valor = abs(Decimal(str(transaction.amount)))
                 tipo = 'RECEITA' if transaction.amount > 0 else 'DESPESA'
@@ -230,11 +518,11 @@ def processar_arquivo_ofx(arquivo, usuario, conta_bancaria=None):
                 categoria = obter_categoria_automatica(
                     transaction.memo or transaction.payee or 'Sem descrição',
                     tipo,
-                    usuario
+                    usuario,
+                    categorizador
                 )
 
-                # Cria a transação
-                Transacao.objects.create(
+                novas.append(Transacao(
                     descricao=transaction.memo or transaction.payee or 'Transação OFX',
                     valor=valor,
                     tipo=tipo,
@@ -244,9 +532,11 @@ def processar_arquivo_ofx(arquivo, usuario, conta_bancaria=None):
                     usuario=usuario,
                     identificador_ofx=identificador,
                     importada_ofx=True
-                )
+                ))
 
-                transacoes_importadas += 1
+            inseridas = inserir_transacoes(novas)
+            transacoes_importadas += len(inseridas)
+            transacoes_duplicadas += len(novas) - len(inseridas)
 
         # Atualiza registro de importação
         importacao.total_transacoes = total_transacoes
@@ -276,7 +566,7 @@ def processar_arquivo_ofx(arquivo, usuario, conta_bancaria=None):
         }
 
 
-def obter_categoria_automatica(descricao, tipo, usuario):
+def obter_categoria_automatica(descricao, tipo, usuario, categorizador=None):
     """
     Tenta associar automaticamente uma categoria baseada na descrição
 
@@ -284,84 +574,13 @@ def obter_categoria_automatica(descricao, tipo, usuario):
         descricao: Descrição da transação
         tipo: Tipo da transação (RECEITA/DESPESA)
         usuario: Usuário proprietário
+        categorizador: CategorizadorAutomatico da importação (sem ele, as
+            categorias são carregadas só para esta descrição)
 
     Returns:
         Categoria: Categoria encontrada ou categoria padrão
     """
-    descricao_lower = descricao.lower()
-
-    # Palavras-chave para categorização automática
-    keywords = {
-        'Alimentação': ['supermercado', 'mercado', 'padaria', 'restaurante', 'lanchonete', 'delivery', 'ifood'],
-        'Transporte': ['combustivel', 'gasolina', 'uber', '99', 'taxi', 'onibus', 'metro', 'posto'],
-        'Saúde': ['farmacia', 'hospital', 'clinica', 'medico', 'consulta', 'drogaria'],
-        'Lazer': ['cinema', 'show', 'teatro', 'parque', 'viagem', 'netflix', 'spotify'],
-        'Moradia': ['condominio', 'agua', 'luz', 'gas', 'telefone', 'internet', 'aluguel'],
-        'Salário': ['salario', 'ordenado', 'pagamento', 'vencimento'],
-        'Educação': ['escola', 'faculdade', 'curso', 'livro', 'material escolar'],
-    }
-
-    # Procura por palavras-chave na descrição
-    for categoria_nome, palavras in keywords.items():
-        for palavra in palavras:
-            if palavra in descricao_lower:
-                try:
-                    categoria = Categoria.objects.get(
-                        nome__iexact=categoria_nome,
-                        tipo=tipo,
-                        usuario=usuario,
-                        ativa=True
-                    )
-                    return categoria
-                except Categoria.DoesNotExist:
-                    # Tenta buscar com nomes similares
-                    try:
-                        categoria = Categoria.objects.filter(
-                            nome__icontains=categoria_nome.lower(),
-                            tipo=tipo,
-                            usuario=usuario,
-                            ativa=True
-                        ).first()
-                        if categoria:
-                            return categoria
-                    except:
-                        pass
-
-    # Se não encontrou categoria específica, retorna ou cria categoria padrão
-    if tipo == 'DESPESA':
-        # Tenta encontrar uma categoria "Outros" existente primeiro
-        try:
-            categoria = Categoria.objects.get(
-                nome__icontains='outros',
-                tipo=tipo,
-                usuario=usuario,
-                ativa=True
-            )
-            return categoria
-        except Categoria.DoesNotExist:
-            pass
-
-        categoria_padrao_nome = 'Outras Despesas'
-    else:
-        # Tenta encontrar uma categoria "Outros" existente primeiro
-        try:
-            categoria = Categoria.objects.get(
-                nome__icontains='outros',
-                tipo=tipo,
-                usuario=usuario,
-                ativa=True
-            )
-            return categoria
-        except Categoria.DoesNotExist:
-            pass
-
-        categoria_padrao_nome = 'Outras Receitas'
-
-    categoria, created = Categoria.objects.get_or_create(
-        nome=categoria_padrao_nome,
-        tipo=tipo,
-        usuario=usuario,
-        defaults={'ativa': True, 'cor': '#6c757d'}
-    )
+    if categorizador is None:
+        categorizador = CategorizadorAutomatico(usuario)
 
-    return categoria
+    return categorizador.categorizar(descricao, tipo)
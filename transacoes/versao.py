@@ -0,0 +1,61 @@
+"""
+Versão dos dados financeiros de cada usuário
+
+Caches derivados das transações (como o contexto do dashboard) incluem a
+versão na chave. Cada gravação gera uma versão nova e as entradas antigas
+simplesmente deixam de ser lidas, expirando no próprio backend de cache,
+sem que quem grava precise conhecer as chaves de quem lê.
+
+Os caminhos em lote (bulk_create, INSERT ... SELECT) não disparam signals
+e chamam invalidar_dados_usuario() explicitamente.
+
+A versão fica no cache do Django, que precisa ser compartilhado entre os
+processos (web, run_jobs, cron) para que uma gravação em um deles
+invalide o que os outros guardaram.
+"""
+import uuid
+
+from django.core.cache import cache
+from django.db import connection, transaction
+
+CHAVE_VERSAO = 'transacoes:versao:{}'
+
+
+def versao_dados(usuario_id):
+    """Versão atual dos dados do usuário"""
+    chave = CHAVE_VERSAO.format(usuario_id)
+    versao = cache.get(chave)
+    if versao is None:
+        # Valor aleatório: se a versão for descartada pelo backend, a nova
+        # nunca coincide com a de uma entrada antiga ainda em cache
+        cache.add(chave, uuid.uuid4().hex, None)
+        versao = cache.get(chave)
+    return versao
+
+
+def nova_versao(usuario_id):
+    """
+    Troca a versão dos dados do usuário
+
+    Um valor novo em vez de incr(): no cache em arquivo (ou no banco) o
+    incr() lê e grava sem trava, e dois processos incrementando ao mesmo
+    tempo gravariam o mesmo número.
+    """
+    versao = uuid.uuid4().hex
+    cache.set(CHAVE_VERSAO.format(usuario_id), versao, None)
+    return versao
+
+
+def invalidar_dados_usuario(usuario_id):
+    """
+    Descarta os caches derivados dos dados do usuário
+
+    Dentro de uma transação a versão é trocada também no commit: uma
+    leitura concorrente feita antes do commit poderia gravar em cache, com a
+    versão nova, dados que ainda não incluem a alteração.
+    """
+    if usuario_id is None:
+        return
+    nova_versao(usuario_id)
+    if connection.in_atomic_block:
+        transaction.on_commit(lambda: nova_versao(usuario_id))
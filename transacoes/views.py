@@ -3,24 +3,46 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.core.paginator import Paginator
 from django.db.models import Q
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
 from django.conf import settings
 from .models import (
-    Transacao, Categoria, ContaBancaria, ImportacaoOFX, TransacaoRecorrente
+    Transacao, Categoria, ContaBancaria, ImportacaoOFX, Job,
+    TransacaoRecorrente
 )
 from .forms import (
     TransacaoForm, CategoriaForm, ContaBancariaForm, TransacaoRecorrenteForm
 )
-from .utils import (
-    processar_arquivo_ofx, preview_arquivo_ofx, salvar_transacoes_ofx
+from .utils import processar_arquivo_ofx
+from .jobs import enfileirar_job
+from .saldos import serie_saldo_diario
+from .staging import descartar_staging, staging_do_usuario, totais_staging
+from .paginacao import (
+    TRANSACOES_POR_PAGINA, CursorInvalido, PaginaCursor, contar_transacoes,
+    pagina_por_cursor
 )
+from .busca import filtrar_busca, ordenar_por_relevancia
+from .exportacao import FORMATOS_EXPORTACAO
+from .previsao import gerar_transacoes_recorrentes
+from datetime import date, timedelta
 import json
 
+# Maior período aceito pela série de saldo diário
+SALDO_DIARIO_MAX_DIAS = 3660
 
-@login_required
-def lista_transacoes(request):
-    """Lista todas as transações do usuário com filtros"""
+# Transações exibidas por página na confirmação da importação OFX
+OFX_PREVIEW_POR_PAGINA = 100
+
+
+def filtrar_transacoes(request):
+    """
+    Transações do usuário com os filtros da lista (tipo, categoria, busca)
+
+    Returns:
+        tuple: (QuerySet filtrado, dicionário com os filtros aplicados)
+    """
     transacoes = Transacao.objects.filter(usuario=request.user)
 
     # Filtros
@@ -28,33 +50,129 @@ def lista_transacoes(request):
     categoria_id = request.GET.get('categoria')
     busca = request.GET.get('busca')
 
+    if categoria_id and not categoria_id.isdigit():
+        categoria_id = None
+
     if tipo:
         transacoes = transacoes.filter(tipo=tipo)
     if categoria_id:
         transacoes = transacoes.filter(categoria_id=categoria_id)
     if busca:
-        transacoes = transacoes.filter(
-            Q(descricao__icontains=busca) | Q(categoria__nome__icontains=busca)
-        )
+        transacoes = filtrar_busca(transacoes, request.user, busca)
 
-    # Paginação
-    paginator = Paginator(transacoes, 20)
-    page = request.GET.get('page')
-    transacoes = paginator.get_page(page)
+    return transacoes, {
+        'tipo': tipo, 'categoria_id': categoria_id, 'busca': busca
+    }
+
+
+@login_required
+def lista_transacoes(request):
+    """Lista todas as transações do usuário com filtros"""
+    transacoes, filtros = filtrar_transacoes(request)
+
+    # Paginação por cursor
+    try:
+        pagina = pagina_por_cursor(
+            transacoes, request.GET.get('apos'), request.GET.get('antes'))
+    except CursorInvalido:
+        pagina = pagina_por_cursor(transacoes)
 
     categorias = Categoria.objects.filter(usuario=request.user, ativa=True)
 
+    # Parâmetros dos filtros repetidos nos links de paginação
+    parametros = request.GET.copy()
+    for nome in ('apos', 'antes', 'page'):
+        parametros.pop(nome, None)
+
     context = {
-        'transacoes': transacoes,
+        'transacoes': pagina,
+        'total_transacoes': contar_transacoes(
+            request.user, transacoes, **filtros),
+        'filtros_url': parametros.urlencode(),
         'categorias': categorias,
-        'filtro_tipo': tipo,
-        'filtro_categoria': categoria_id,
-        'busca': busca,
+        'filtro_tipo': filtros['tipo'],
+        'filtro_categoria': filtros['categoria_id'],
+        'busca': filtros['busca'],
     }
 
     return render(request, 'transacoes/lista.html', context)
 
 
+@login_required
+def lista_transacoes_json(request):
+    """
+    Páginas da lista de transações em JSON (rolagem infinita)
+
+    Com busca e ordem=relevancia devolve apenas as transações mais
+    relevantes, sem cursor.
+    """
+    transacoes, filtros = filtrar_transacoes(request)
+
+    if filtros['busca'] and request.GET.get('ordem') == 'relevancia':
+        # Mais relevantes primeiro, em uma única página
+        pagina = PaginaCursor(list(ordenar_por_relevancia(
+            transacoes.select_related('categoria', 'conta_bancaria'),
+            filtros['busca']
+        )[:TRANSACOES_POR_PAGINA]))
+    else:
+        try:
+            pagina = pagina_por_cursor(
+                transacoes, request.GET.get('apos'), request.GET.get('antes'))
+        except CursorInvalido as e:
+            return JsonResponse({'erro': str(e)}, status=400)
+
+    dados = {
+        'transacoes': [
+            {
+                'id': t.pk,
+                'data': t.data.isoformat(),
+                'descricao': t.descricao,
+                'valor': str(t.valor),
+                'tipo': t.tipo,
+                'importada_ofx': t.importada_ofx,
+                'categoria': {
+                    'id': t.categoria_id,
+                    'nome': t.categoria.nome,
+                    'cor': t.categoria.cor,
+                },
+                'conta_bancaria': {
+                    'id': t.conta_bancaria_id,
+                    'nome': t.conta_bancaria.nome,
+                } if t.conta_bancaria_id else None,
+                'url_editar': reverse('transacoes:editar', args=[t.pk]),
+                'url_excluir': reverse('transacoes:excluir', args=[t.pk]),
+            }
+            for t in pagina
+        ],
+        'proximo': pagina.proximo,
+        'anterior': pagina.anterior,
+    }
+
+    # O total só é calculado na primeira página
+    if not request.GET.get('apos') and not request.GET.get('antes'):
+        dados['total'] = contar_transacoes(request.user, transacoes, **filtros)
+
+    return JsonResponse(dados)
+
+
+@login_required
+def exportar_transacoes(request, formato):
+    """Exporta as transações filtradas da lista em CSV, OFX ou JSON Lines"""
+    if formato not in FORMATOS_EXPORTACAO:
+        raise Http404('Formato de exportação desconhecido')
+
+    transacoes, _ = filtrar_transacoes(request)
+    gerar, content_type, extensao = FORMATOS_EXPORTACAO[formato]
+
+    # O conteúdo é gerado à medida que é enviado
+    resposta = StreamingHttpResponse(
+        gerar(transacoes), content_type=content_type)
+    resposta['Content-Disposition'] = (
+        f'attachment; filename="transacoes_{timezone.localdate():%Y%m%d}.'
+        f'{extensao}"')
+    return resposta
+
+
 @login_required
 def criar_transacao(request):
     """Cria uma nova transação"""
@@ -155,19 +273,39 @@ def importar_ofx(request):
                 conta = get_object_or_404(
                     ContaBancaria, pk=conta_id, usuario=request.user)
 
-            # Processa o arquivo sem salvar as transações
-            resultado = preview_arquivo_ofx(arquivo, request.user, conta)
-
-            if resultado['sucesso']:
-                # Armazena os dados na sessão para confirmação
-                request.session['preview_transacoes'] = resultado['transacoes']
-                request.session['preview_conta_id'] = conta_id
-                request.session['preview_arquivo_nome'] = arquivo.name
-
-                return redirect('transacoes:confirmar_importacao_ofx')
-            else:
-                messages.error(
-                    request, f'Erro no processamento: {resultado["erro"]}')
+            if arquivo.name.lower().endswith('.zip'):
+                # Vários extratos: importados direto, um registro por arquivo
+                job = enfileirar_job('IMPORTAR_LOTE_OFX', request.user, {
+                    'conta_id': conta.id if conta else None,
+                    'arquivo_nome': arquivo.name,
+                }, arquivo)
+                return redirect(
+                    f"{reverse('transacoes:importar_ofx')}?job={job.pk}")
+
+            # Descarta um preview anterior ainda não confirmado
+            descartar_staging(
+                request.session.pop('importacao_token', None), request.user)
+
+            parametros = {
+                'conta_id': conta.id if conta else None,
+                'arquivo_nome': arquivo.name,
+            }
+            extensao = arquivo.name.rsplit('.', 1)[-1].lower()
+            if extensao in ('csv', 'xlsx'):
+                # Colunas informadas no formulário; as demais são detectadas
+                parametros['formato'] = extensao
+                parametros['mapeamento'] = {
+                    campo: request.POST[f'coluna_{campo}'].strip()
+                    for campo in ('data', 'descricao', 'valor')
+                    if request.POST.get(f'coluna_{campo}', '').strip()
+                }
+
+            # Leitura, deduplicação e categorização rodam no worker
+            job = enfileirar_job(
+                'PREVIEW_OFX', request.user, parametros, arquivo)
+
+            return redirect(
+                f"{reverse('transacoes:importar_ofx')}?job={job.pk}")
 
         except Exception as e:
             messages.error(request, f'Erro ao processar arquivo: {str(e)}')
@@ -177,20 +315,38 @@ def importar_ofx(request):
     contas = ContaBancaria.objects.filter(usuario=request.user, ativa=True)
     importacoes = ImportacaoOFX.objects.filter(usuario=request.user)[:10]
 
+    # Job em andamento acompanhado pela página
+    job = None
+    job_id = request.GET.get('job')
+    if job_id and job_id.isdigit():
+        job = Job.objects.filter(pk=job_id, usuario=request.user).first()
+
     return render(request, 'transacoes/importar_ofx.html', {
         'contas': contas,
-        'importacoes': importacoes
+        'importacoes': importacoes,
+        'job': job
     })
 
 
 @login_required
 def confirmar_importacao_ofx(request):
     """Confirma importação OFX - Etapa 2: Preview e confirmação"""
-    transacoes_preview = request.session.get('preview_transacoes')
-    conta_id = request.session.get('preview_conta_id')
-    arquivo_nome = request.session.get('preview_arquivo_nome')
-
-    if not transacoes_preview:
+    # Preview recém-concluído pelo worker
+    job_id = request.GET.get('job')
+    if job_id and job_id.isdigit():
+        job = Job.objects.filter(
+            pk=job_id, usuario=request.user, tipo='PREVIEW_OFX',
+            status='CONCLUIDO'
+        ).first()
+        if job and job.resultado.get('token'):
+            request.session['importacao_token'] = job.resultado['token']
+
+    token = request.session.get('importacao_token')
+    staging = staging_do_usuario(token, request.user)
+    totais = totais_staging(staging)
+
+    if not totais['total']:
+        request.session.pop('importacao_token', None)
         messages.error(
             request,
             'Dados de importação não encontrados. Tente novamente.'
@@ -198,51 +354,63 @@ def confirmar_importacao_ofx(request):
         return redirect('transacoes:importar_ofx')
 
     if request.method == 'POST':
-        if request.POST.get('confirmar') == 'sim':
-            # Salva as transações confirmadas
-            resultado = salvar_transacoes_ofx(
-                transacoes_preview,
-                request.user,
-                conta_id,
-                arquivo_nome
-            )
+        request.session.pop('importacao_token', None)
 
-            if resultado['sucesso']:
-                messages.success(
-                    request,
-                    f'Importação concluída! {resultado["importadas"]} '
-                    f'transações importadas, {resultado["duplicadas"]} '
-                    f'duplicatas ignoradas.'
-                )
-            else:
-                messages.error(
-                    request, f'Erro na importação: {resultado["erro"]}')
-
-        # Limpa dados da sessão
-        request.session.pop('preview_transacoes', None)
-        request.session.pop('preview_conta_id', None)
-        request.session.pop('preview_arquivo_nome', None)
+        if request.POST.get('confirmar') == 'sim':
+            # Move as transações confirmadas do staging no worker
+            job = enfileirar_job('SALVAR_OFX', request.user, {'token': token})
+            return redirect(
+                f"{reverse('transacoes:importar_ofx')}?job={job.pk}")
 
+        descartar_staging(token, request.user)
         return redirect('transacoes:importar_ofx')
 
+    # Paginação do preview
+    paginator = Paginator(
+        staging.select_related('categoria', 'conta_bancaria'),
+        OFX_PREVIEW_POR_PAGINA
+    )
+    page_obj = paginator.get_page(request.GET.get('page'))
+    primeira = page_obj[0] if page_obj else None
+
     # Busca categorias para possível edição
     categorias = Categoria.objects.filter(usuario=request.user, ativa=True)
-    conta = None
-    if conta_id:
-        conta = get_object_or_404(
-            ContaBancaria, pk=conta_id, usuario=request.user
-        )
 
     return render(request, 'transacoes/confirmar_importacao_ofx.html', {
-        'transacoes': transacoes_preview,
+        'transacoes': page_obj,
         'categorias': categorias,
-        'conta': conta,
-        'arquivo_nome': arquivo_nome,
-        'total_transacoes': len(transacoes_preview),
+        'conta': primeira.conta_bancaria if primeira else None,
+        'arquivo_nome': primeira.arquivo_nome if primeira else '',
+        'total_transacoes': totais['total'],
+        'total_receitas': totais['receitas'],
+        'total_despesas': totais['despesas'],
+        'saldo_liquido': totais['receitas'] - totais['despesas'],
         'chatgpt_enabled': getattr(settings, 'CHATGPT_ENABLED', False)
     })
 
 
+@login_required
+def progresso_job(request, pk):
+    """Estado de um job em segundo plano, consultado pela página de importação"""
+    job = get_object_or_404(Job, pk=pk, usuario=request.user)
+
+    dados = {
+        'id': job.pk,
+        'tipo': job.tipo,
+        'status': job.status,
+        'progresso': job.progresso,
+        'mensagem': job.mensagem,
+        'erro': job.erro,
+        'resultado': job.resultado,
+        'finalizado': job.finalizado,
+    }
+    if job.tipo == 'PREVIEW_OFX' and job.status == 'CONCLUIDO':
+        dados['redirecionar'] = (
+            f"{reverse('transacoes:confirmar_importacao_ofx')}?job={job.pk}")
+
+    return JsonResponse(dados)
+
+
 @login_required
 def lista_transacoes_recorrentes(request):
     """Lista todas as transações recorrentes do usuário"""
@@ -362,12 +530,10 @@ def gerar_transacoes_mes(request):
             usuario=request.user, ativa=True
         )
 
-        total_geradas = 0
-        for recorrente in recorrentes:
-            transacao = recorrente.gerar_transacao_mes(mes_atual, ano_atual)
-            if transacao:
-                transacao.save()
-                total_geradas += 1
+        indice_mes = ano_atual * 12 + mes_atual - 1
+        total_geradas, _ = gerar_transacoes_recorrentes(
+            recorrentes, indice_mes, indice_mes, request.user
+        )
 
         if total_geradas > 0:
             messages.success(
@@ -384,3 +550,39 @@ def gerar_transacoes_mes(request):
         return redirect('transacoes:recorrentes')
 
     return redirect('transacoes:recorrentes')
+
+
+@login_required
+def saldo_diario(request):
+    """Série de saldo diário das contas do usuário em JSON"""
+    conta = None
+    conta_id = request.GET.get('conta')
+    if conta_id:
+        if not conta_id.isdigit():
+            return JsonResponse({'erro': 'Conta inválida'}, status=400)
+        conta = get_object_or_404(
+            ContaBancaria, pk=conta_id, usuario=request.user)
+
+    try:
+        fim = date.fromisoformat(request.GET['fim']) \
+            if request.GET.get('fim') else timezone.localdate()
+        inicio = date.fromisoformat(request.GET['inicio']) \
+            if request.GET.get('inicio') else fim - timedelta(days=29)
+    except ValueError:
+        return JsonResponse(
+            {'erro': 'Datas devem estar no formato AAAA-MM-DD'}, status=400)
+
+    if inicio > fim or (fim - inicio).days > SALDO_DIARIO_MAX_DIAS:
+        return JsonResponse({'erro': 'Período inválido'}, status=400)
+
+    serie = serie_saldo_diario(request.user, inicio, fim, conta)
+
+    return JsonResponse({
+        'conta': conta.id if conta else None,
+        'inicio': inicio.isoformat(),
+        'fim': fim.isoformat(),
+        'serie': [
+            {'data': item['data'].isoformat(), 'saldo': float(item['saldo'])}
+            for item in serie
+        ]
+    })